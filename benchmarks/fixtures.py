@@ -0,0 +1,368 @@
+"""synthetic Titanfall 2 (v37) .bsp + .ent fixtures for benchmarks/suite.py
+
+usage:
+  python benchmarks/fixtures.py FOLDER [TIER ...]
+
+only needs numpy & bsp_tool (bundled in io_import_rbsp/wheels/)
+every tier is a heightfield worldspawn + boxes for brush entities,
+trigger brushes, assorted point entities & static props (w/o .mdl files)
+NOTE: "olympus" matches Olympus' scale, but is still a v37 .bsp
+"""
+import glob
+import json
+import math
+import os
+import struct
+import sys
+from typing import Dict, List, NamedTuple
+
+import numpy as np
+
+# run from a source checkout; deps come from the bundled wheels
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.extend(glob.glob(os.path.join(repo_dir, "io_import_rbsp/wheels/*.whl")))
+
+from bsp_tool.branches.respawn import titanfall, titanfall2  # noqa E402
+
+
+# NOTE: bump whenever generated fixtures change; stale fixtures are rebuilt
+GENERATOR_VERSION = 2
+
+
+class Tier(NamedTuple):
+    triangles: int  # worldspawn
+    brush_models: int  # func_brush, 12 triangles each
+    triggers: int  # trigger_multiple etc., 1-2 box brushes each
+    entities: int  # point entities
+    props: int
+    prop_models: int
+    materials: int
+
+
+tiers = {
+    "tiny": Tier(2_048, 4, 8, 64, 64, 8, 4),
+    "small": Tier(32_768, 16, 64, 512, 1_024, 64, 16),
+    "medium": Tier(262_144, 64, 256, 4_096, 8_192, 256, 64),
+    "large": Tier(1_048_576, 256, 1_024, 16_384, 32_768, 1_024, 256),
+    "olympus": Tier(4_194_304, 512, 4_096, 32_768, 65_535, 4_096, 1_024)}
+# ^ {"name": Tier(...)}
+
+
+# NOTE: MESH_INDICES are u16 offsets from MaterialSort.vertex_offset
+# -- 64x64 cells (65x65 vertices) keeps every patch in range
+patch_cells = 64
+cell_size = 64.0  # units
+box_size = 128.0
+
+point_entities = (
+    {"classname": "info_node", "editorclass": "info_node_safe_hint"},
+    {"classname": "light", "_light": "255 240 200 400", "_zero_percent_distance": "512"},
+    {"classname": "light_spot", "_light": "200 220 255 800", "_cone": "60", "_inner_cone": "30"},
+    {"classname": "ambient_generic", "message": "Ambient.Benchmark"},
+    {"classname": "info_target", "editorclass": "info_target_benchmark"},
+    {"classname": "info_spawnpoint_human"})
+point_blocks = ("bsp", "env", "fx", "snd", "spawn")
+trigger_classnames = (
+    "trigger_multiple", "trigger_once", "trigger_hurt",
+    "trigger_out_of_bounds", "trigger_soundscape")
+
+# lump entry layouts (see bsp_tool.branches.respawn.titanfall & titanfall2)
+vertex_lit_bump = np.dtype([
+    ("position_index", "<u4"), ("normal_index", "<u4"),
+    ("albedo_uv", "<f4", 2), ("colour", "u1", 4),
+    ("lightmap", "<f4", 4), ("tangent", "<i4", 2)])
+mesh_entry = np.dtype([
+    ("first_mesh_index", "<u4"), ("num_triangles", "<u2"),
+    ("first_vertex", "<u2"), ("num_vertices", "<u2"), ("vertex_type", "<u2"),
+    ("styles", "i1", 4), ("luxel_origin", "<i2", 2),
+    ("luxel_offset_max", "u1", 2), ("material_sort", "<u2"), ("flags", "<u4")])
+material_sort = np.dtype([
+    ("texture_data", "<i2"), ("lightmap_header", "<i2"), ("cubemap", "<i2"),
+    ("last_vertex", "<i2"), ("vertex_offset", "<i4")])
+mesh_bounds = np.dtype([
+    ("origin", "<f4", 3), ("radius", "<f4"), ("extents", "<f4", 3), ("tan_yaw", "<f4")])
+static_prop = np.dtype([
+    ("origin", "<f4", 3), ("angles", "<f4", 3), ("scale", "<f4"),
+    ("model_name", "<u2"), ("solid_mode", "u1"), ("flags", "u1"),
+    ("skin", "<u2"), ("cubemap", "<u2"), ("forced_fade_scale", "<f4"),
+    ("lighting_origin", "<f4", 3), ("cpu_level", "i1", 2), ("gpu_level", "i1", 2),
+    ("diffuse_modulation", "u1", 4), ("collision_flags", "<u2", 2)])
+
+lump_versions = {"TEXTURE_DATA": 1, "VERTEX_LIT_BUMP": 1}
+# ^ {"LUMP_NAME": version}; default 0
+VERTEX_LIT_BUMP = int(titanfall.MeshFlags.VERTEX_LIT_BUMP)
+
+
+class Geometry:
+    """worldspawn & brush model lumps, built one mesh at a time"""
+
+    def __init__(self, materials: List[str]):
+        self.materials = materials
+        self.positions = list()
+        self.vertices = list()
+        self.indices = list()
+        self.meshes = list()
+        self.bounds = list()
+        self.sorts = list()
+        self.models = list()
+        self.num_positions = 0
+        self.num_vertices = 0
+        self.num_indices = 0
+
+    def add_mesh(self, positions: np.ndarray, uvs: np.ndarray, triangles: np.ndarray, material: int):
+        """positions: (N, 3); uvs: (N, 2); triangles: (T, 3) in 0..N-1"""
+        num_vertices = len(positions)
+        vertices = np.zeros(num_vertices, dtype=vertex_lit_bump)
+        vertices["position_index"] = self.num_positions + np.arange(num_vertices)
+        vertices["albedo_uv"] = uvs
+        vertices["colour"] = 255
+        vertices["lightmap"][:, :2] = uvs / 64
+        sort = np.zeros(1, dtype=material_sort)
+        sort["texture_data"] = material
+        sort["last_vertex"] = min(num_vertices - 1, 2 ** 15 - 1)
+        sort["vertex_offset"] = self.num_vertices
+        mesh = np.zeros(1, dtype=mesh_entry)
+        mesh["first_mesh_index"] = self.num_indices
+        mesh["num_triangles"] = len(triangles)
+        mesh["num_vertices"] = num_vertices
+        mesh["material_sort"] = len(self.sorts)
+        mesh["flags"] = VERTEX_LIT_BUMP
+        mins, maxs = positions.min(axis=0), positions.max(axis=0)
+        bounds = np.zeros(1, dtype=mesh_bounds)
+        bounds["origin"] = (mins + maxs) / 2
+        bounds["extents"] = (maxs - mins) / 2
+        bounds["radius"] = np.linalg.norm((maxs - mins) / 2) + 0.001
+        self.positions.append(positions.astype("<f4"))
+        self.vertices.append(vertices)
+        self.indices.append(triangles.astype("<u2").ravel())
+        self.meshes.append(mesh)
+        self.bounds.append(bounds)
+        self.sorts.append(sort)
+        self.num_positions += num_vertices
+        self.num_vertices += num_vertices
+        self.num_indices += triangles.size
+        return mins, maxs
+
+    def add_model(self, meshes: List[tuple]):
+        """meshes: [add_mesh(...) return values]"""
+        mins = np.min([mins for mins, maxs in meshes], axis=0)
+        maxs = np.max([maxs for mins, maxs in meshes], axis=0)
+        first_mesh = len(self.meshes) - len(meshes)
+        self.models.append(struct.pack("<6f2I", *mins, *maxs, first_mesh, len(meshes)))
+
+    def lumps(self) -> Dict[str, bytes]:
+        num_materials = len(self.materials)
+        string_data = b"".join(name.encode("ascii") + b"\0" for name in self.materials)
+        string_table = np.cumsum([0] + [len(name) + 1 for name in self.materials[:-1]])
+        texture_data = b"".join(
+            struct.pack("<3f6i", 0.5, 0.5, 0.5, i, 512, 512, 512, 512, VERTEX_LIT_BUMP)
+            for i in range(num_materials))
+        return {
+            "TEXTURE_DATA": texture_data,
+            "VERTICES": np.concatenate(self.positions).tobytes(),
+            "MODELS": b"".join(self.models),
+            "VERTEX_NORMALS": struct.pack("<3f", 0, 0, 1),
+            "TEXTURE_DATA_STRING_DATA": string_data,
+            "TEXTURE_DATA_STRING_TABLE": string_table.astype("<u4").tobytes(),
+            "VERTEX_LIT_BUMP": np.concatenate(self.vertices).tobytes(),
+            "MESH_INDICES": np.concatenate(self.indices).tobytes(),
+            "MESHES": np.concatenate(self.meshes).tobytes(),
+            "MESH_BOUNDS": np.concatenate(self.bounds).tobytes(),
+            "MATERIAL_SORTS": np.concatenate(self.sorts).tobytes()}
+
+
+def heightfield(width: int, height: int, offset: tuple) -> tuple:
+    """-> positions, uvs, triangles for width x height cells"""
+    x, y = np.meshgrid(np.arange(width + 1), np.arange(height + 1))
+    x = x.ravel() + offset[0]
+    y = y.ravel() + offset[1]
+    z = np.sin(x / 7) * np.cos(y / 11) * 96 + np.sin((x + y) / 29) * 256
+    positions = np.stack([x * cell_size, y * cell_size, z], axis=1)
+    uvs = np.stack([x / 4, y / 4], axis=1)
+    corner = (np.arange(height)[:, None] * (width + 1) + np.arange(width)).ravel()
+    # 2 triangles per cell
+    a, b, c, d = corner, corner + 1, corner + width + 2, corner + width + 1
+    triangles = np.concatenate([
+        np.stack([a, b, c], axis=1),
+        np.stack([a, c, d], axis=1)])
+    return positions, uvs, triangles
+
+
+def box(origin: tuple, size: float = box_size) -> tuple:
+    """-> positions, uvs, triangles (24 vertices, 12 triangles)"""
+    corners = np.array([
+        (x, y, z) for z in (-1, 1) for y in (-1, 1) for x in (-1, 1)], dtype=float)
+    faces = ((0, 2, 3, 1), (4, 5, 7, 6), (0, 1, 5, 4), (2, 6, 7, 3), (0, 4, 6, 2), (1, 3, 7, 5))
+    positions = np.array([corners[i] for face in faces for i in face]) * size / 2 + origin
+    uvs = np.tile([(0, 0), (1, 0), (1, 1), (0, 1)], (6, 1)).astype(float)
+    quads = np.arange(24).reshape(6, 4)
+    triangles = np.concatenate([quads[:, [0, 1, 2]], quads[:, [0, 2, 3]]])
+    return positions, uvs, triangles
+
+
+def trigger_planes(origin: tuple, size: float, brush_index: int) -> Dict[str, str]:
+    """6 axial planes -> *trigger_brush_N_plane_N keyvalues"""
+    keyvalues = dict()
+    for plane_index, (axis, sign) in enumerate([(a, s) for s in (1, -1) for a in range(3)]):
+        normal = [0, 0, 0]
+        normal[axis] = sign
+        distance = sign * origin[axis] + size / 2
+        keyvalues[f"*trigger_brush_{brush_index}_plane_{plane_index}"] = " ".join(
+            map(str, (*normal, distance)))
+    return keyvalues
+
+
+def entity_text(entities: List[Dict[str, str]]) -> bytes:
+    return b"\n".join(
+        "\n".join(["{", *[f'"{k}" "{v}"' for k, v in entity.items()], "}"]).encode("ascii")
+        for entity in entities) + b"\n\x00"
+
+
+def game_lump(tier: Tier, rng: np.random.Generator, extent: float, offset: int) -> bytes:
+    """sprp v13 child lump; offset is where GAME_LUMP starts in the .bsp"""
+    props = np.zeros(tier.props, dtype=static_prop)
+    props["origin"][:, :2] = rng.uniform(0, extent, (tier.props, 2))
+    props["angles"][:, 1] = rng.uniform(0, 360, tier.props)
+    props["scale"] = rng.uniform(0.75, 1.25, tier.props)
+    props["model_name"] = rng.integers(0, tier.prop_models, tier.props)
+    props["lighting_origin"] = props["origin"]
+    props["cpu_level"] = -1
+    props["gpu_level"] = -1
+    props["diffuse_modulation"] = 255
+    model_names = b"".join(
+        struct.pack("128s", f"models/benchmark/prop_{i:04d}.mdl".encode("ascii"))
+        for i in range(tier.prop_models))
+    sprp = b"".join([
+        struct.pack("<I", tier.prop_models), model_names,
+        struct.pack("<3I", tier.props, 0, 0), props.tobytes(),
+        struct.pack("<I", 0)])  # no Unknown3
+    header_size = struct.calcsize("<4s2H2i")
+    header = struct.pack("<4s2H2i", b"prps", 0, 13, offset + 4 + header_size, len(sprp))
+    return struct.pack("<I", 1) + header + sprp
+
+
+def generate(folder: str, name: str, tier: Tier, seed: int = 0) -> Dict:
+    """writes mp_bench_{name}.bsp & .ent files to folder; -> manifest"""
+    rng = np.random.default_rng(seed)
+    materials = [f"world/benchmark/material_{i:04d}" for i in range(tier.materials)]
+    # NOTE: bsp_tool lower-cases & swaps "\\" for "/"; MappedBsp must match
+    materials[0] = "WORLD\\Benchmark\\Material_0000"
+    geometry = Geometry(materials)
+
+    # worldspawn: square grid of heightfield patches
+    side = min(patch_cells, max(1, int(math.sqrt(tier.triangles / 2))))
+    num_patches = max(1, round(tier.triangles / (2 * side * side)))
+    patches_per_row = math.ceil(math.sqrt(num_patches))
+    worldspawn = list()
+    for i in range(num_patches):
+        row, column = divmod(i, patches_per_row)
+        positions, uvs, triangles = heightfield(side, side, (column * side, row * side))
+        worldspawn.append(geometry.add_mesh(positions, uvs, triangles, i % tier.materials))
+    geometry.add_model(worldspawn)
+    extent = patches_per_row * side * cell_size
+
+    # brush entities
+    bsp_entities = [{"classname": "worldspawn", "mapversion": "0"}]
+    for i in range(tier.brush_models):
+        origin = (*rng.uniform(0, extent, 2), 512.0)
+        # NOTE: box is local to the model; entity origin moves it
+        bounds = geometry.add_mesh(*box((0, 0, 0)), i % tier.materials)
+        geometry.add_model([bounds])
+        bsp_entities.append({
+            "classname": "func_brush", "model": f"*{i + 1}",
+            "targetname": f"brush_{i:04d}", "origin": " ".join(map(str, origin))})
+
+    # triggers (Titanfall 2 keeps these in _script.ent)
+    blocks = {block: list() for block in (*point_blocks, "script")}
+    for i in range(tier.triggers):
+        origin = (*rng.uniform(0, extent, 2), 256.0)
+        trigger = {
+            "classname": trigger_classnames[i % len(trigger_classnames)],
+            "targetname": f"trigger_{i:04d}", "origin": " ".join(map(str, origin))}
+        for brush_index in range(1 + i % 2):
+            brush_origin = (brush_index * box_size, 0, 0)
+            trigger.update(trigger_planes(brush_origin, box_size, brush_index))
+        blocks["script"].append(trigger)
+
+    # point entities
+    for i in range(tier.entities):
+        entity = dict(point_entities[i % len(point_entities)])
+        origin = (*rng.uniform(0, extent, 2), rng.uniform(0, 1024))
+        entity["origin"] = " ".join(map(str, origin))
+        entity["angles"] = f"0 {rng.uniform(0, 360):.1f} 0"
+        if i % 3 == 0:
+            entity["targetname"] = f"entity_{i:05d}"
+        block = point_blocks[i % len(point_blocks)]
+        (bsp_entities if block == "bsp" else blocks[block]).append(entity)
+
+    # lumps -> .bsp
+    lumps = geometry.lumps()
+    lumps["ENTITIES"] = entity_text(bsp_entities)
+    header_size = 16 + 16 * 128
+    offset = header_size
+    headers = dict()
+    order = sorted([*lumps, "GAME_LUMP"], key=lambda lump: titanfall2.LUMP[lump].value)
+    for lump_name in order:
+        if lump_name == "GAME_LUMP":  # child lump headers need an absolute offset
+            lumps["GAME_LUMP"] = game_lump(tier, rng, extent, offset)
+        data = lumps[lump_name]
+        headers[lump_name] = (offset, len(data), lump_versions.get(lump_name, 0), 0)
+        offset += len(data) + (-len(data) % 4)
+    os.makedirs(folder, exist_ok=True)
+    bsp_path = os.path.join(folder, f"mp_bench_{name}.bsp")
+    with open(bsp_path, "wb") as bsp_file:
+        bsp_file.write(struct.pack("<4s3I", b"rBSP", titanfall2.BSP_VERSION, 0, 127))
+        for lump in titanfall2.LUMP:
+            bsp_file.write(struct.pack("<4I", *headers.get(lump.name, (0, 0, 0, 0))))
+        for lump_name in order:
+            data = lumps[lump_name]
+            bsp_file.write(data + b"\0" * (-len(data) % 4))
+    for block, entities in blocks.items():
+        ent_path = os.path.join(folder, f"mp_bench_{name}_{block}.ent")
+        with open(ent_path, "wb") as ent_file:
+            ent_file.write(b"ENTITIES01\n" + entity_text(entities))
+
+    manifest = {
+        "generator_version": GENERATOR_VERSION,
+        "tier": name,
+        "filepath": bsp_path,
+        "triangles": int(geometry.num_indices // 3),
+        "vertices": int(geometry.num_vertices),
+        "meshes": len(geometry.meshes),
+        "models": len(geometry.models),
+        "materials": tier.materials,
+        "triggers": tier.triggers,
+        "entities": len(bsp_entities) + sum(map(len, blocks.values())),
+        "props": tier.props,
+        "prop_models": tier.prop_models,
+        "filesize": os.path.getsize(bsp_path)}
+    with open(os.path.join(folder, f"mp_bench_{name}.json"), "w") as json_file:
+        json.dump(manifest, json_file, indent=2)
+    return manifest
+
+
+def fixture(folder: str, name: str) -> Dict:
+    """cached generate(); -> manifest"""
+    json_path = os.path.join(folder, f"mp_bench_{name}.json")
+    if os.path.exists(json_path):
+        with open(json_path) as json_file:
+            manifest = json.load(json_file)
+        if manifest.get("generator_version") == GENERATOR_VERSION:
+            if os.path.exists(manifest["filepath"]):
+                return manifest
+    return generate(folder, name, tiers[name])
+
+
+def main(argv):
+    if len(argv) == 0:
+        print(__doc__)
+        print("tiers:", ", ".join(tiers))
+        return
+    folder, *names = argv
+    for name in names or tiers:
+        manifest = fixture(folder, name)
+        print(f"{manifest['filepath']}: {manifest['triangles']} triangles, {manifest['filesize']} bytes")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,65 @@
+"""WorldMaterial.make_nodes: per-material nodes vs. shared node groups
+
+usage:
+  blender --background --factory-startup --python benchmarks/materials.py -- MAP.bsp RSX_FOLDER
+
+MAP.bsp: every TEXTURE_DATA material becomes a "wld" placeholder
+RSX_FOLDER: contains exported_files/ (MATL .json & .dds)
+"""
+import glob
+import os
+import sys
+import time
+
+import bpy
+
+# run from a source checkout; deps come from the bundled wheels
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+sys.path.extend(glob.glob(os.path.join(repo_dir, "io_import_rbsp/wheels/*.whl")))
+
+import bsp_tool  # noqa E402
+
+import io_import_rbsp  # noqa E402
+from io_import_rbsp.load.materials import MATL, WorldMaterial  # noqa E402
+
+
+def time_make_nodes(matls, use_node_groups):
+    WorldMaterial.use_node_groups = use_node_groups
+    materials = list()
+    start = time.perf_counter()
+    for i, matl in enumerate(matls):
+        maker = WorldMaterial()
+        maker.material = bpy.data.materials.new(f"material_{i}")
+        maker.textures = matl.textures
+        maker.make_nodes()
+        materials.append(maker.material)
+    duration = time.perf_counter() - start
+    for material in materials:
+        bpy.data.materials.remove(material)
+    return duration
+
+
+def main(argv):
+    if len(argv) < 2:
+        print(__doc__)
+        return
+    io_import_rbsp.register()
+    bpy.context.scene.rbsp_prefs.rsx_folder = argv[1]
+    bsp = bsp_tool.load_bsp(argv[0])
+    asset_paths = sorted({
+        bsp.TEXTURE_DATA_STRING_DATA[texture_data.name_index].lower().replace("\\", "/")
+        for texture_data in bsp.TEXTURE_DATA})
+    # load every texture up front, so we only time node setup
+    matls = [MATL.from_path(asset_path, "wld") for asset_path in asset_paths]
+    matls = [matl for matl in matls if matl is not None]
+    print(f"{bsp.filename}: {len(matls)} / {len(asset_paths)} MATL .json found")
+    old = time_make_nodes(matls, use_node_groups=False)
+    new = time_make_nodes(matls, use_node_groups=True)
+    print(f"  per-material nodes: {old:8.3f}s")
+    print(f"  shared node groups: {new:8.3f}s  ({old / max(new, 1e-9):.1f}x)")
+
+
+if __name__ == "__main__":
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else list()
+    main(argv)
@@ -0,0 +1,147 @@
+"""load.soup.TriangleSoup vs. the old per-vertex python mesh pipeline
+
+usage:
+  blender --background --factory-startup --python benchmarks/soup.py -- MAP.bsp [MODELS_FOLDER]
+
+MAP.bsp: a large map (e.g. Olympus) for worldspawn & brush models
+MODELS_FOLDER: searched recursively for .mdl files (heavy prop set)
+"""
+import glob
+import itertools
+import os
+import sys
+import time
+
+import bpy
+
+# run from a source checkout; deps come from the bundled wheels
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+sys.path.extend(glob.glob(os.path.join(repo_dir, "io_import_rbsp/wheels/*.whl")))
+
+import bsp_tool  # noqa E402
+from ass.scene.valve import Mdl  # noqa E402
+
+from io_import_rbsp.load.materials import placeholder  # noqa E402
+from io_import_rbsp.load.soup import TriangleSoup  # noqa E402
+
+
+# v1.4.0 load.geometry.all_models & load.props.load_model mesh construction
+def get_base_uv(vertices, index):
+    u, v = vertices[index].uv0
+    return (u, 1 - v)
+
+
+def get_lightmap_uv(vertices, index):
+    vertex = vertices[index]
+    if len(vertex.uv) >= 2:
+        u, v = vertex.uv1
+    else:
+        u, v = 0, 0
+    return (u, 1 - v)
+
+
+def legacy_mesh(name, model, shader_type, lightmap=True):
+    vertex_materials = [
+        (vertex, mesh.material)
+        for mesh in model.meshes
+        for polygon in mesh.polygons
+        for vertex in polygon.vertices]
+    if len(vertex_materials) != 0:
+        vertices, materials = zip(*vertex_materials)
+    else:
+        vertices, materials = list(), list()
+    indices = list(itertools.chain([
+        (i + 2, i + 1, i + 0)
+        for i in range(0, len(vertices), 3)]))
+    mesh = bpy.data.meshes.new(name)
+    mesh.from_pydata(
+        [vertex.position for vertex in vertices], list(), indices,
+        shade_flat=False)
+    base_uv = mesh.uv_layers.new(name="base")
+    base_uv.data.foreach_set("uv", list(itertools.chain(*[
+        get_base_uv(vertices, index)
+        for tri in indices
+        for index in tri])))
+    if lightmap:
+        lightmap_uv = mesh.uv_layers.new(name="lightmap")
+        lightmap_uv.data.foreach_set("uv", list(itertools.chain(*[
+            get_lightmap_uv(vertices, index)
+            for tri in indices
+            for index in tri])))
+        vertex_colour = mesh.vertex_colors.new(name="Colour")
+        vertex_colour.data.foreach_set("color", list(itertools.chain(*[
+            vertices[index].colour
+            for tri in indices
+            for index in tri])))
+    material_indices = dict()
+    for material in {sub_mesh.material for sub_mesh in model.meshes}:
+        mesh.materials.append(placeholder(material.name, shader_type))
+        material_indices[material.name] = len(mesh.materials) - 1
+    mesh.polygons.foreach_set("material_index", [
+        material_indices[materials[tri[0]].name]
+        for tri in indices])
+    mesh.update()
+    return mesh
+
+
+def soup_mesh(name, model, shader_type, lightmap=True):
+    if lightmap:
+        soup = TriangleSoup.from_model(model, num_uvs=2, colours=True)
+        return soup.as_mesh(name, shader_type, ("base", "lightmap"))
+    return TriangleSoup.from_model(model).as_mesh(name, shader_type)
+
+
+def clear_meshes():
+    for mesh in list(bpy.data.meshes):
+        bpy.data.meshes.remove(mesh)
+
+
+def time_builder(builder, models, shader_type, lightmap):
+    clear_meshes()
+    start = time.perf_counter()
+    for i, model in enumerate(models):
+        builder(f"model_{i}", model, shader_type, lightmap)
+    duration = time.perf_counter() - start
+    clear_meshes()
+    return duration
+
+
+def compare(label, models, shader_type, lightmap):
+    num_triangles = sum(
+        len(mesh.polygons)
+        for model in models
+        for mesh in model.meshes)
+    old = time_builder(legacy_mesh, models, shader_type, lightmap)
+    new = time_builder(soup_mesh, models, shader_type, lightmap)
+    print(f"{label}: {len(models)} models, {num_triangles} triangles")
+    print(f"  legacy: {old:8.3f}s")
+    print(f"  soup:   {new:8.3f}s  ({old / max(new, 1e-9):.1f}x)")
+
+
+def main(argv):
+    if len(argv) == 0:
+        print(__doc__)
+        return
+    bsp = bsp_tool.load_bsp(argv[0])
+    models = [bsp.model(i) for i in range(len(bsp.MODELS))]
+    compare(bsp.filename, models, "wld", lightmap=True)
+    del bsp, models
+
+    if len(argv) > 1:
+        models = list()
+        pattern = os.path.join(argv[1], "**", "*.mdl")
+        for filepath in glob.glob(pattern, recursive=True):
+            mdl = Mdl.from_file(filepath)
+            try:
+                mdl.parse()
+            except Exception:
+                continue  # same as load.props.load_model
+            base_name = os.path.splitext(mdl.filename)[0]
+            models.append(mdl.models[f"{base_name}.lod0"])
+        compare(argv[1], models, "fix", lightmap=False)
+
+
+if __name__ == "__main__":
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else list()
+    main(argv)
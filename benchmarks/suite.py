@@ -0,0 +1,232 @@
+"""headless import benchmarks against synthetic fixtures (see benchmarks/fixtures.py)
+
+usage:
+  blender --background --factory-startup --python benchmarks/suite.py -- [options]
+
+options:
+  --tiers TIER,...   tiny, small, medium, large, olympus (default: tiny,small,medium)
+  --cases CASE,...   import, geometry, geometry_stream, geometry_mapped, triggers,
+                     entities, props_empties, props_models, props_instances (default: all)
+  --repeat N         runs per case (default: 1)
+  --output FOLDER    fixtures & results.jsonl (default: benchmarks/output/)
+
+each case runs in a fresh blender process, so peak RSS is per-case
+results.jsonl gets one line per run, tagged w/ git revision & addon version
+runs are compared against the last run of the same case from another revision
+NOTE: fixtures have no .mdl files; props_models & props_instances time empties
+"""
+import argparse
+import collections
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import bpy
+
+# run from a source checkout; deps come from the bundled wheels
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.extend(glob.glob(os.path.join(repo_dir, "io_import_rbsp/wheels/*.whl")))
+
+import bsp_tool  # noqa E402
+
+import fixtures  # noqa E402
+import io_import_rbsp  # noqa E402
+from io_import_rbsp import load, make_entity_collections  # noqa E402
+from io_import_rbsp.load.profiler import Profiler, peak_rss  # noqa E402
+
+
+def geometry(bsp, collection):
+    load.geometry.all_models(bsp, collection)
+
+
+def geometry_stream(bsp, collection):
+    load.geometry.all_models(bsp, collection, memory_limit=1024)
+
+
+def geometry_mapped(bsp, collection):
+    load.geometry.all_models(bsp, collection)
+
+
+def triggers(bsp, collection):
+    load.triggers.all_triggers(bsp, make_entity_collections(collection))
+
+
+def entities(bsp, collection):
+    load.entities.all_entities(bsp, make_entity_collections(collection))
+
+
+def props_empties(bsp, collection):
+    load.props.as_empties(bsp, collection)
+
+
+def props_models(bsp, collection):
+    load.props.static_props(bsp, collection, max_workers=1)
+
+
+def props_instances(bsp, collection):
+    load.props.instances(bsp, collection, max_workers=1)
+
+
+loaders = {
+    "geometry": geometry,
+    "geometry_stream": geometry_stream,
+    "geometry_mapped": geometry_mapped,
+    "triggers": triggers,
+    "entities": entities,
+    "props_empties": props_empties,
+    "props_models": props_models,
+    "props_instances": props_instances}
+# ^ {"case": loader(bsp, collection)}
+cases = ("import", *loaders)
+mapped_cases = {"geometry_mapped"}
+# ^ cases opened w/ load.mapped.MappedBsp instead of bsp_tool.load_bsp
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "-C", repo_dir, "describe", "--always", "--dirty"],
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_import(filepath: str) -> dict:
+    """the whole ImportRBSP operator; stages come from its Save Timings .json"""
+    bpy.ops.io_import_rbsp.rbsp_import(
+        filepath=filepath, load_props="Empties", use_mdl_cache=False, save_timings=True)
+    with open(f"{os.path.splitext(filepath)[0]}.import.json") as json_file:
+        result = json.load(json_file)
+    result["seconds"] = result["duration"]
+    return result
+
+
+def run_loader(case: str, filepath: str) -> dict:
+    profiler = Profiler()
+    load.profiler.current = profiler
+    try:
+        with profiler.stage("open bsp"):
+            if case in mapped_cases:
+                bsp = load.mapped.MappedBsp.from_file(filepath)
+            else:
+                bsp = bsp_tool.load_bsp(filepath)
+        collection = bpy.data.collections.new(bsp.filename)
+        bpy.context.scene.collection.children.link(collection)
+        with profiler.stage(case):
+            loaders[case](bsp, collection)
+    finally:
+        load.profiler.current = None
+    profiler.finish()
+    result = profiler.as_json()
+    result["seconds"] = dict(profiler.stages)[case]
+    return result
+
+
+def run_case(tier: str, case: str, session: str, output: str):
+    """runs in a child process; appends one result to results.jsonl"""
+    manifest = fixtures.fixture(os.path.join(output, "fixtures"), tier)
+    io_import_rbsp.register()
+    # empty asset folders; every material & model is a placeholder
+    rbsp_prefs = bpy.context.scene.rbsp_prefs
+    for name in ("rsx_folder", "vpk_folder"):
+        folder = os.path.join(output, "fixtures", name)
+        os.makedirs(folder, exist_ok=True)
+        setattr(rbsp_prefs, name, folder)
+    baseline_rss = peak_rss()
+    if case == "import":
+        result = run_import(manifest["filepath"])
+    else:
+        result = run_loader(case, manifest["filepath"])
+    result.update({
+        "tier": tier,
+        "case": case,
+        "session": session,
+        "revision": git_revision(),
+        "addon_version": ".".join(map(str, io_import_rbsp.bl_info["version"])),
+        "blender_version": bpy.app.version_string,
+        "platform": platform.platform(),
+        "baseline_rss": baseline_rss,
+        "fixture": {
+            key: manifest[key]
+            for key in ("generator_version", "triangles", "entities", "triggers", "props")}})
+    with open(os.path.join(output, "results.jsonl"), "a") as results_file:
+        results_file.write(json.dumps(result) + "\n")
+
+
+def load_results(output: str) -> list:
+    results_path = os.path.join(output, "results.jsonl")
+    if not os.path.exists(results_path):
+        return list()
+    with open(results_path) as results_file:
+        return [json.loads(line) for line in results_file if line.strip()]
+
+
+def report(session: str, output: str):
+    """print this session's results beside the last run from another revision"""
+    results = load_results(output)
+    current = collections.defaultdict(list)
+    previous = dict()
+    for result in results:
+        key = (result["tier"], result["case"])
+        if result["session"] == session:
+            current[key].append(result)
+    revision = git_revision()
+    for result in results:  # latest wins
+        key = (result["tier"], result["case"])
+        if key in current and result["session"] != session and result["revision"] != revision:
+            previous[key] = result
+    print(f"{'tier':8s} {'case':16s} {'seconds':>9s} {'peak RSS':>10s} {'objects':>8s}  vs. previous")
+    for (tier, case), runs in current.items():
+        seconds = min(run["seconds"] for run in runs)
+        rss = max(run["peak_rss"] for run in runs) / 2 ** 30
+        objects = runs[-1]["created"]["objects"]
+        line = f"{tier:8s} {case:16s} {seconds:8.2f}s {rss:7.2f}GiB {objects:8d}"
+        if (tier, case) in previous:
+            old = previous[(tier, case)]
+            change = (seconds - old["seconds"]) / max(old["seconds"], 1e-9)
+            line += f"  {change:+.1%} ({old['revision']}, {old['addon_version']})"
+        print(line)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="suite.py", description="io_import_rbsp benchmarks")
+    parser.add_argument("--tiers", default="tiny,small,medium")
+    parser.add_argument("--cases", default=",".join(cases))
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--output", default=os.path.join(repo_dir, "benchmarks", "output"))
+    parser.add_argument("--case", nargs=3, metavar=("TIER", "CASE", "SESSION"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    output = os.path.abspath(args.output)
+
+    if args.case is not None:  # child process
+        run_case(*args.case, output)
+        return
+
+    tiers = args.tiers.split(",")
+    for tier in tiers:  # generate once, outside of the timed processes
+        manifest = fixtures.fixture(os.path.join(output, "fixtures"), tier)
+        print(f"{tier}: {manifest['triangles']} triangles, {manifest['entities']} entities, {manifest['props']} props")
+    session = time.strftime("%Y%m%d-%H%M%S")
+    for tier in tiers:
+        for case in args.cases.split(","):
+            assert case in cases, f"unknown case: {case}"
+            for i in range(args.repeat):
+                print(f"running {tier} {case} ({i + 1}/{args.repeat})")
+                process = subprocess.run([
+                    bpy.app.binary_path, "--background", "--factory-startup",
+                    "--python-exit-code", "1", "--python", os.path.abspath(__file__), "--",
+                    "--output", output, "--case", tier, case, session])
+                if process.returncode != 0:
+                    print(f"{tier} {case} failed! (exit code {process.returncode})")
+    report(session, output)
+
+
+if __name__ == "__main__":
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else list()
+    main(argv)
@@ -1,8 +1,11 @@
+import cProfile
+import os
+import time
 from typing import Dict
 
 import bpy
 from bpy_extras.io_utils import ImportHelper
-from bpy.props import StringProperty, BoolProperty, EnumProperty
+from bpy.props import BoolProperty, EnumProperty, FloatProperty, IntProperty, StringProperty
 from bpy.types import Collection, Operator
 
 import bsp_tool
@@ -23,6 +26,21 @@ bl_info = {
     "category": "Import-Export"}
 
 
+navigation_events = {
+    "MIDDLEMOUSE", "MOUSEMOVE", "WHEELUPMOUSE", "WHEELDOWNMOUSE",
+    "TRACKPADPAN", "TRACKPADZOOM", "NDOF_MOTION"}
+# ^ passed through while importing
+
+
+def stage_steps(stage: str, steps: load.utils.Steps):
+    """("stage", fraction) for each step"""
+    try:
+        for fraction in steps:
+            yield stage, fraction
+    finally:
+        steps.close()  # if the import was cancelled
+
+
 class ImportRBSP(Operator, ImportHelper):
     """Load Titanfall Engine rBSP"""
     bl_idname = "io_import_rbsp.rbsp_import"
@@ -31,10 +49,52 @@ class ImportRBSP(Operator, ImportHelper):
     filter_glob: StringProperty(
         default="*.bsp", options={"HIDDEN"}, maxlen=255)  # noqa F722
     # importer settings
+    update_existing: BoolProperty(
+        name="Update Existing",  # noqa F722
+        description="Re-importing a map updates its collection in place; only changed models, entities & props are rebuilt",  # noqa F722
+        default=True)
+    use_mmap: BoolProperty(
+        name="Memory-Map Lumps",  # noqa F722
+        description="Read lumps in place from the .bsp & .bsp_lump files, decoding only what is imported",  # noqa F722
+        default=True)
     load_geometry: BoolProperty(
         name="Geometry", description="Load geometry", default=True)  # noqa F722
+    geometry_memory: IntProperty(
+        name="Geometry Memory (MiB)",  # noqa F722
+        description="Decode level geometry in chunks of this size; 0 to decode whole models at once",  # noqa F722
+        default=1024, min=0)
+    chunk_geometry: EnumProperty(
+        name="Split Worldspawn", description="Split worldspawn into smaller objects",  # noqa F722
+        items=(
+            ("None", "Single Object",  # noqa F722
+             "One mesh for the whole level"),  # noqa F722
+            ("Grid", "XY Grid",  # noqa F722
+             "One object per grid cell; see Cell Size"),  # noqa F722
+            ("Octree", "Octree",  # noqa F722
+             "Split cells until each has at most Cell Triangles")),  # noqa F722
+        default="None")  # noqa F722
+    chunk_cell_size: FloatProperty(
+        name="Cell Size",  # noqa F722
+        description="Width of each grid cell, in engine units",  # noqa F722
+        default=4096, min=64)
+    chunk_triangles: IntProperty(
+        name="Cell Triangles",  # noqa F722
+        description="Most triangles in each octree cell",  # noqa F722
+        default=65536, min=1024)
+    load_lightmaps: BoolProperty(
+        name="Lightmaps",  # noqa F722
+        description="Decode lightmap pages into images; cached as .png next to the .bsp",  # noqa F722
+        default=False)
     load_materials: BoolProperty(
         name="Materials", description="Load materials", default=True)  # noqa F722
+    texture_size: IntProperty(
+        name="Texture Size",  # noqa F722
+        description="Largest texture width or height, using smaller mips; 0 for full resolution",  # noqa F722
+        default=0, min=0)
+    texture_budget: IntProperty(
+        name="Texture Budget",  # noqa F722
+        description="MiB of texture pixels; the largest textures use smaller mips until all fit, 0 for no limit",  # noqa F722
+        default=0, min=0)
     load_triggers: BoolProperty(
         name="Triggers", description="Load triggers", default=True)  # noqa F722
     load_entities: BoolProperty(
@@ -51,59 +111,281 @@ class ImportRBSP(Operator, ImportHelper):
             ("Empties", "Use Empties",  # noqa F722
              "Place empties at prop origins"),  # noqa F722
             ("Models", "Textured Models",  # noqa F722
-             "Full props & materials; Very slow")),  # noqa F722
+             "Full props & materials; Very slow"),  # noqa F722
+            ("Instances", "Instanced Models",  # noqa F722
+             "Full props & materials as Geometry Nodes instances")),  # noqa F722
         default="None")  # noqa F722
+    prop_lod: IntProperty(
+        name="Prop LOD",  # noqa F722
+        description="Level of detail to load for prop models; -1 picks by distance from the 3D cursor",  # noqa F722
+        default=0, min=-1, max=7)
+    prop_lod_distance: FloatProperty(
+        name="LOD Distance",  # noqa F722
+        description="Automatic LOD: radius around the 3D cursor that gets lod0, in engine units",  # noqa F722
+        default=2048, min=0)
+    prop_workers: IntProperty(
+        name="Prop Workers",  # noqa F722
+        description="Processes used to parse .mdl files; 0 for 1 per CPU core",  # noqa F722
+        default=0, min=0)
+    use_mdl_cache: BoolProperty(
+        name="Cache Props",  # noqa F722
+        description="Reuse .mdl files converted by previous imports",  # noqa F722
+        default=True)
+    save_timings: BoolProperty(
+        name="Save Timings",  # noqa F722
+        description="Write import timings as .json & .csv next to the .bsp",  # noqa F722
+        default=False)
+    use_cprofile: BoolProperty(
+        name="cProfile",  # noqa F722
+        description="Dump a cProfile .prof next to the .bsp; slower",  # noqa F722
+        default=False)
+    use_modal: BoolProperty(
+        name="Background Import",  # noqa F722
+        description="Keep Blender responsive & show progress while importing; Esc cancels",  # noqa F722
+        default=True)
+    tick_time: IntProperty(
+        name="Tick Time (ms)",  # noqa F722
+        description="Import work done between redraws; lower is more responsive, but slower",  # noqa F722
+        default=100, min=10)
 
     def execute(self, context):
-        bsp = bsp_tool.load_bsp(self.filepath)
-        if not is_titanfall_engine(bsp):
+        load.profiler.current = load.profiler.Profiler()
+        self._profile = cProfile.Profile() if self.use_cprofile else None
+        self._before = load.utils.session_uids()
+        self._steps = self.import_steps(context.scene)
+        self._weights = self.stage_weights()
+        self._stage, self._progress = "open bsp", 0
+        self._timer = None
+        if not self.use_modal or context.window is None:  # e.g. blender --background
+            try:
+                result = self.tick()
+            except Exception:
+                load.utils.remove_new_datablocks(self._before)  # don't leave half an import behind
+                self.finish(context, {"CANCELLED"})
+                raise
+            return self.finish(context, result)
+        window_manager = context.window_manager
+        self._timer = window_manager.event_timer_add(0.01, window=context.window)
+        window_manager.progress_begin(0, 1000)
+        window_manager.modal_handler_add(self)
+        return {"RUNNING_MODAL"}
+
+    def modal(self, context, event):
+        if event.type == "ESC":
+            return self.cancel_import(context)
+        if event.type != "TIMER":
+            # NOTE: only let the user look around; edits could remove datablocks we're using
+            return {"PASS_THROUGH"} if event.type in navigation_events else {"RUNNING_MODAL"}
+        try:
+            result = self.tick(self.tick_time / 1000)
+        except Exception:
+            load.utils.remove_new_datablocks(self._before)  # don't leave half an import behind
+            self.finish(context, {"CANCELLED"})
+            raise
+        if result is not None:
+            return self.finish(context, result)
+        self.show_progress(context)
+        return {"RUNNING_MODAL"}
+
+    def cancel(self, context):
+        """blender ended the modal import; e.g. a new .blend was opened"""
+        self._steps.close()
+        self.finish(context, {"CANCELLED"})
+
+    def cancel_import(self, context):
+        """Esc; remove everything this import has made so far
+        NOTE: objects an update already moved or removed can't be restored"""
+        self._steps.close()  # closes the .bsp & stops worker pools
+        num_removed = load.utils.remove_new_datablocks(self._before)
+        self.report({"WARNING"}, f"import cancelled; removed {num_removed} new datablocks")
+        return self.finish(context, {"CANCELLED"})
+
+    def tick(self, seconds: float = None):
+        """advance the import for about seconds (None for all of it) -> result, once finished"""
+        deadline = None if seconds is None else time.perf_counter() + seconds
+        if self._profile is not None:
+            self._profile.enable()
+        try:
+            while True:
+                try:
+                    self._stage, fraction = next(self._steps)
+                except StopIteration as stop:
+                    return stop.value
+                self._progress = self.progress_of(self._stage, fraction)
+                if deadline is not None and time.perf_counter() > deadline:
+                    return None
+        finally:
+            if self._profile is not None:
+                self._profile.disable()
+
+    def finish(self, context, result):
+        if self._timer is not None:
+            window_manager = context.window_manager
+            window_manager.event_timer_remove(self._timer)
+            window_manager.progress_end()
+            context.workspace.status_text_set(None)
+            self._timer = None
+        profiler = load.profiler.current
+        load.profiler.current = None
+        if result == {"FINISHED"}:
+            profiler.finish()
+            self.report_timings(profiler, self._profile)
+        return result
+
+    def stage_weights(self) -> Dict[str, float]:
+        """rough share of the import each stage takes; for progress & ETA"""
+        weights = {
+            "open bsp": 1,
+            "geometry": 4 if self.load_geometry else 0,
+            "lightmaps": 1 if self.load_lightmaps else 0,
+            "triggers": 1 if self.load_triggers else 0,
+            "entities": 1 if self.load_entities else 0,
+            "props": {"None": 0, "Empties": 1}.get(self.load_props, 8),
+            "materials": 4 if self.load_materials else 0}
+        total = sum(weights.values())
+        return {stage: weight / total for stage, weight in weights.items()}
+
+    def progress_of(self, stage: str, fraction: float) -> float:
+        out = 0
+        for name, weight in self._weights.items():
+            if name == stage:
+                return out + weight * fraction
+            out += weight
+        return out
+
+    def show_progress(self, context):
+        context.window_manager.progress_update(int(self._progress * 1000))
+        status = f"Importing {os.path.basename(self.filepath)}: {self._stage} {self._progress:.0%}"
+        if self._progress > 0.01:
+            elapsed = time.perf_counter() - load.profiler.current.start
+            status += f", ~{elapsed / self._progress * (1 - self._progress):.0f}s left"
+        context.workspace.status_text_set(f"{status} (Esc to cancel)")
+
+    def import_steps(self, scene):
+        """yields ("stage", fraction done); returns the operator result
+        NOTE: stage timings include time spent redrawing between ticks"""
+        with load.profiler.stage("open bsp"):
+            try:
+                if self.use_mmap:
+                    bsp = load.mapped.MappedBsp.from_file(self.filepath)
+                else:
+                    bsp = bsp_tool.load_bsp(self.filepath)
+            except RuntimeError:  # not an rBSP
+                bsp = None
+        if bsp is None or not is_titanfall_engine(bsp):
             self.report(
                 {"ERROR_INVALID_INPUT"}, "Not a Titanfall Engine .bsp!")
+            if isinstance(bsp, load.mapped.MappedBsp):
+                bsp.close()  # release the file now, not whenever it's collected
             del bsp  # cleanup
             return {"CANCELLED"}
+        yield "open bsp", 1
+        try:
+            yield from self.load_steps(scene, bsp)
+        finally:  # also if cancelled
+            load.materials.prefetch.stop()
+            if isinstance(bsp, load.mapped.MappedBsp):
+                bsp.close()
+            del bsp  # don't cache!
+        return {"FINISHED"}
+
+    def load_steps(self, scene, bsp):
+        """import_steps, once the .bsp is open"""
+        with load.profiler.stage("index assets"):
+            # case-insensitive asset lookups
+            rbsp_prefs = scene.rbsp_prefs
+            asset_indices = load.materials.utils.index_assets(
+                rbsp_prefs.rsx_folder, rbsp_prefs.vpk_folder)
+            # existing materials & textures
+            load.materials.utils.seed_registries()
 
         # main collection
-        if bsp.filename not in bpy.data.collections:
-            bsp_collection = bpy.data.collections.new(bsp.filename)
-            context.scene.collection.children.link(bsp_collection)
-        else:
+        update = self.update_existing and bsp.filename in bpy.data.collections
+        if update:
             bsp_collection = bpy.data.collections[bsp.filename]
+        else:  # new, or a side-by-side copy
+            bsp_collection = bpy.data.collections.new(bsp.filename)
+            scene.collection.children.link(bsp_collection)
 
         # level geometry & materials
         if self.load_geometry:
             geo_collection = make_collection(bsp_collection, "geometry")
-            load.geometry.all_models(bsp, geo_collection)
+            with load.profiler.stage("geometry"):
+                yield from stage_steps("geometry", load.geometry.model_steps(
+                    bsp, geo_collection, self.geometry_memory,
+                    self.chunk_geometry, self.chunk_cell_size, self.chunk_triangles, update))
+            if self.load_materials:  # read MATL .json in the background
+                load.materials.prefetch.start("wld")
+        if self.load_lightmaps:
+            with load.profiler.stage("lightmaps"):
+                lightmaps = load.lightmaps.all_lightmaps(bsp, self.filepath)
+            self.report({"INFO"}, f"loaded {len(lightmaps)} lightmap pages")
+            yield "lightmaps", 1
 
         # solid & point entities
         if self.load_triggers or self.load_entities:
             ent_collections = make_entity_collections(bsp_collection)
             if self.load_triggers:
-                load.triggers.all_triggers(bsp, ent_collections)
+                with load.profiler.stage("triggers"):
+                    yield from stage_steps("triggers", load.triggers.trigger_steps(
+                        bsp, ent_collections, update))
             if self.load_entities:
-                load.entities.all_entities(bsp, ent_collections)
+                with load.profiler.stage("entities"):
+                    yield from stage_steps("entities", load.entities.entity_steps(
+                        bsp, ent_collections, update=update))
 
         # props
         if self.load_props != "None":
             prop_collection = make_collection(bsp_collection, "static props")
-        if self.load_props == "Empties":
-            load.props.as_empties(bsp, prop_collection)
-        elif self.load_props == "Models":
-            load.props.static_props(bsp, prop_collection)
+            cache_folder = preferences.mdl_cache_folder() if self.use_mdl_cache else None
+            if update and prop_collection.get("load_props") != self.load_props:
+                load.update.clear_collection(prop_collection)  # nothing to reuse
+            prop_collection["load_props"] = self.load_props
+            with load.profiler.stage("props"):
+                if self.load_props == "Empties":
+                    yield from stage_steps("props", load.props.empty_steps(bsp, prop_collection, update))
+                elif self.load_props == "Models":
+                    yield from stage_steps("props", load.props.static_prop_steps(
+                        bsp, prop_collection, self.prop_workers, cache_folder,
+                        self.prop_lod, self.prop_lod_distance, scene.cursor.location.copy(), update))
+                elif self.load_props == "Instances":
+                    yield from stage_steps("props", load.props.instance_steps(
+                        bsp, prop_collection, self.prop_workers, cache_folder,
+                        self.prop_lod, self.prop_lod_distance, scene.cursor.location.copy(), update))
 
         if self.load_materials:
-            load.materials.all_materials()  # update all placeholders
+            with load.profiler.stage("materials"):
+                # update all placeholders
+                yield from stage_steps("materials", load.materials.complete.material_steps(
+                    max_size=self.texture_size, budget=self.texture_budget))
+        for index in asset_indices:
+            self.report({"INFO"}, " ".join([
+                f"indexed {len(index.paths)} paths in {index.build_time:.2f}s;",
+                f"{index.hits} hits, {index.misses} misses ({index.folder})"]))
         # TODO: report how many materials were loaded from files
         # -- self.report({"INFO"}, "{x} / {total} materials loaded")
 
         # TODO: scale the whole import (Engine Units -> Inches)
         # TODO: override default view clipping (16 near, 102400 far)
-        # TODO: self.report({"INFO"}, "took <X> seconds to import <mapname>")
-        del bsp  # don't cache!
-        return {"FINISHED"}
+
+    def report_timings(self, profiler, profile):
+        map_name = os.path.basename(self.filepath)
+        self.report({"INFO"}, f"took {profiler.duration:.2f}s to import {map_name}")
+        for line in profiler.summary():
+            self.report({"INFO"}, line)
+        base_path = os.path.splitext(self.filepath)[0]
+        try:
+            if self.save_timings:
+                profiler.save_json(f"{base_path}.import.json")
+                profiler.save_csv(f"{base_path}.import.csv")
+            if profile is not None:
+                profile.dump_stats(f"{base_path}.prof")
+        except OSError as exc:
+            self.report({"WARNING"}, f"couldn't save timings: {exc}")
 
 
 def is_titanfall_engine(bsp) -> bool:
-    valid_bspclass = isinstance(bsp, bsp_tool.RespawnBsp)
+    valid_bspclass = isinstance(bsp, (bsp_tool.RespawnBsp, load.mapped.MappedBsp))
     valid_branch = bsp.branch in (
         bsp_tool.branches.respawn.titanfall,
         bsp_tool.branches.respawn.titanfall2,
@@ -114,26 +396,28 @@ def is_titanfall_engine(bsp) -> bool:
     return valid_bspclass and valid_branch
 
 
-# BUG: makes a new collection if map is already loaded?
 def make_collection(parent: Collection, name: str) -> Collection:
-    for child in parent.children:  # doesn't work?
-        if child.name.startswith(name):
+    """reuses the child we made last time, if there is one"""
+    # NOTE: collection names are unique per .blend; a 2nd map gets "geometry.001" etc.
+    for child in parent.children:
+        if child.get("rbsp_collection", None) == name:
+            return child
+    for child in parent.children:  # imported before "rbsp_collection" was tagged
+        if child.name == name or child.name.rpartition(".")[0] == name:
+            child["rbsp_collection"] = name
             return child
     child = bpy.data.collections.new(name)
+    child["rbsp_collection"] = name
     parent.children.link(child)
     return child
 
 
 def make_entity_collections(bsp_collection) -> Dict[str, Collection]:
-    out = dict()
-    entities_collection = bpy.data.collections.new("entities")
-    bsp_collection.children.link(entities_collection)
+    entities_collection = make_collection(bsp_collection, "entities")
     entity_blocks = ("bsp", "env", "fx", "script", "sound", "spawn")
-    for block_name in entity_blocks:
-        entity_collection = bpy.data.collections.new(block_name)
-        entities_collection.children.link(entity_collection)
-        out[block_name] = entity_collection
-    return out
+    return {
+        block_name: make_collection(entities_collection, block_name)
+        for block_name in entity_blocks}
 
 
 class ImportMATL(Operator, ImportHelper):
@@ -145,6 +429,7 @@ class ImportMATL(Operator, ImportHelper):
         default="*.json", options={"HIDDEN"}, maxlen=255)  # noqa F722
 
     def execute(self, context):
+        load.materials.utils.seed_registries()
         matl = load.materials.MATL.from_file(self.filepath)
         # TODO: choose maker for MATL type ("fix", "wld" etc.)
         maker = load.materials.WorldMaterial()
@@ -162,16 +447,20 @@ class ImportMDL(Operator, ImportHelper):
     filter_glob: StringProperty(
         default="*.mdl", options={"HIDDEN"}, maxlen=255)  # noqa F722
 
-    # TODO: importer settings
+    # importer settings
+    lod: IntProperty(
+        name="LOD", description="Level of detail to load",  # noqa F722
+        default=0, min=0, max=7)
+    # TODO: more importer settings
     # -- IntProperty  target body group
-    # -- IntProperty  target lod
     # -- BoolProperty load materials
 
     def execute(self, context):
         # TODO: error msg on unsupported .mdl format:
         # -- self.report({"ERROR_INVALID_INPUT"}, "Not a Titanfall v53 .mdl")
         # -- return {"CANCELLED"}
-        mesh = load.props.load_model(self.filepath)
+        load.materials.utils.seed_registries()
+        mesh = load.props.load_model(self.filepath, lod=self.lod)
         name = mesh.name.partition(".")[0]
         mdl_object = bpy.data.objects.new(name, mesh)
         # link to view layer
@@ -181,22 +470,24 @@ class ImportMDL(Operator, ImportHelper):
         return {"FINISHED"}
 
 
-# NOTE: not yet implemented
-# class ImportVMT(Operator, ImportHelper):
-#     """Load Titanfall Engine .vmt"""
-#     bl_idname = "io_import_rbsp.vmt_import"
-#     bl_label = "Titanfall Engine .vmt"
-#     filename_ext = ".vmt"
-#     filter_glob: StringProperty(
-#         default="*.vmt", options={"HIDDEN"}, maxlen=255)  # noqa F722
-#
-#     def execute(self, context):
-#         maker = load.materials.NodeMaker()
-#         vmt = load.materials.VMT.from_file(self.filepath)
-#         maker.textures = vmt.textures
-#         maker.make_nodes()
-#         del maker, vmt
-#         return {"FINISHED"}
+class ImportVMT(Operator, ImportHelper):
+    """Load Titanfall Engine .vmt"""
+    bl_idname = "io_import_rbsp.vmt_import"
+    bl_label = "Titanfall Engine .vmt"
+    filename_ext = ".vmt"
+    filter_glob: StringProperty(
+        default="*.vmt", options={"HIDDEN"}, maxlen=255)  # noqa F722
+
+    def execute(self, context):
+        load.materials.utils.seed_registries()
+        vmt = load.materials.VMT.from_file(self.filepath)
+        maker = load.materials.WorldMaterial()
+        name = os.path.splitext(os.path.basename(self.filepath))[0]
+        maker.material = bpy.data.materials.new(name)
+        maker.textures = vmt.textures
+        maker.make_nodes()
+        del maker, vmt
+        return {"FINISHED"}
 
 
 def add_operators(self, context):
@@ -204,7 +495,7 @@ def add_operators(self, context):
     self.layout.operator(ImportRBSP.bl_idname, text=ImportRBSP.bl_label)
     self.layout.operator(ImportMDL.bl_idname, text=ImportMDL.bl_label)
     self.layout.operator(ImportMATL.bl_idname, text=ImportMATL.bl_label)
-    # self.layout.operator(ImportVMT.bl_idname, text=ImportVMT.bl_label)
+    self.layout.operator(ImportVMT.bl_idname, text=ImportVMT.bl_label)
 
 
 def register():
@@ -214,7 +505,8 @@ def register():
     bpy.utils.register_class(ImportMATL)
     bpy.utils.register_class(ImportMDL)
     bpy.utils.register_class(ImportRBSP)
-    # bpy.utils.register_class(ImportVMT)
+    bpy.utils.register_class(ImportVMT)
+    load.materials.images.register()
     bpy.types.TOPBAR_MT_file_import.append(add_operators)
 
 
@@ -223,7 +515,8 @@ def unregister():
     bpy.utils.unregister_class(ImportMATL)
     bpy.utils.unregister_class(ImportMDL)
     bpy.utils.unregister_class(ImportRBSP)
-    # bpy.utils.unregister_class(ImportVMT)
+    bpy.utils.unregister_class(ImportVMT)
+    load.materials.images.unregister()
     bpy.types.TOPBAR_MT_file_import.remove(add_operators)
 
 
@@ -1,8 +1,21 @@
-__all__ = ["entities", "geometry", "materials", "props", "triggers", "utils"]
+__all__ = [
+    "brushes", "buffers", "cache", "entities", "geometry", "lightmaps",
+    "mapped", "materials", "mdl", "profiler", "props", "soup", "table",
+    "triggers", "update", "utils"]
 
+from . import brushes
+from . import buffers
+from . import cache
 from . import entities
 from . import geometry
+from . import lightmaps
+from . import mapped
 from . import materials
+from . import mdl
+from . import profiler
 from . import props
+from . import soup
+from . import table
 from . import triggers
+from . import update
 from . import utils
@@ -0,0 +1,179 @@
+# NOTE: no bpy imports! only numpy
+import itertools
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+epsilon = 1e-3  # how far a point can be outside a plane & still be on it
+weld_distance = 0.01  # points closer than this become one vertex
+
+Hulls = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+# ^ (vertices, vertex_brushes, loops, face_sizes, face_brushes)
+
+
+def plane_triples(counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """every combination of 3 planes in each brush -> (plane indices, brush indices)"""
+    firsts = np.cumsum(counts) - counts
+    triples, triple_brushes = [np.empty((0, 3), dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+    for num_planes in np.unique(counts):  # batch brushes w/ the same number of planes
+        if num_planes < 3:
+            continue  # can't enclose a volume
+        combinations = np.array(list(itertools.combinations(range(num_planes), 3)))
+        brushes = np.flatnonzero(counts == num_planes)
+        triples.append((firsts[brushes, np.newaxis, np.newaxis] + combinations).reshape(-1, 3))
+        triple_brushes.append(np.repeat(brushes, len(combinations)))
+    return np.concatenate(triples), np.concatenate(triple_brushes)
+
+
+def brush_sides(points: np.ndarray, point_brushes: np.ndarray, planes: np.ndarray,
+                counts: np.ndarray, firsts: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """signed distance of each point to each plane of its own brush
+    -> (sides, plane_indices, point_starts); flat, grouped by point
+    NOTE: no padding; a brush w/ many planes doesn't cost the others anything"""
+    point_counts = counts[point_brushes]
+    point_starts = np.cumsum(point_counts) - point_counts
+    point_indices = np.repeat(np.arange(len(points)), point_counts)
+    plane_indices = (
+        np.repeat(firsts[point_brushes], point_counts)
+        + np.arange(len(point_indices)) - np.repeat(point_starts, point_counts))
+    sides = (
+        np.einsum("ij,ij->i", planes[plane_indices, :3], points[point_indices])
+        - planes[plane_indices, 3])
+    return sides, plane_indices, point_starts
+
+
+def convex_hulls(planes: np.ndarray, plane_brushes: np.ndarray) -> Hulls:
+    """solve many convex brushes at once
+
+    planes: float (num_planes, 4) normal & distance; inside is dot(normal, point) < distance
+    plane_brushes: int (num_planes,) brush index of each plane, ascending
+    -> vertices & faces of each brush, welded & sorted by brush
+    -- loops index vertices; faces wind counter-clockwise around their plane's normal"""
+    planes = np.asarray(planes, dtype=np.float64).reshape(-1, 4)
+    plane_brushes = np.asarray(plane_brushes, dtype=np.int64)
+    num_brushes = int(plane_brushes.max()) + 1 if len(plane_brushes) > 0 else 0
+    counts = np.bincount(plane_brushes, minlength=num_brushes)
+    firsts = np.cumsum(counts) - counts
+    # every corner lies on at least 3 planes
+    triples, brushes = plane_triples(counts)
+    normals = planes[triples, :3]
+    solvable = np.abs(np.linalg.det(normals)) > 1e-9  # skip parallel planes
+    points = np.linalg.solve(normals[solvable], planes[triples[solvable], 3, np.newaxis])[..., 0]
+    brushes = brushes[solvable]
+    # keep points inside every plane of their brush
+    sides, _, point_starts = brush_sides(points, brushes, planes, counts, firsts)
+    if len(points) > 0:
+        inside = np.maximum.reduceat(sides, point_starts) <= epsilon
+        points, brushes = points[inside], brushes[inside]
+    # weld; sorted by brush
+    grid = np.round(points / weld_distance).astype(np.int64)
+    _, first_points = np.unique(np.column_stack([brushes, grid]), axis=0, return_index=True)
+    vertices, vertex_brushes = points[first_points], brushes[first_points]
+    # faces: vertices on each plane, sorted by angle around the plane's normal
+    sides, plane_indices, _ = brush_sides(vertices, vertex_brushes, planes, counts, firsts)
+    on_plane = np.abs(sides) <= epsilon
+    vertex_indices = np.repeat(np.arange(len(vertices)), counts[vertex_brushes])[on_plane]
+    face_planes = plane_indices[on_plane]
+    num_incidences = np.bincount(face_planes, minlength=len(planes))
+    centres = np.stack([
+        np.bincount(face_planes, weights=vertices[vertex_indices, axis], minlength=len(planes))
+        for axis in range(3)], axis=-1) / np.maximum(num_incidences, 1)[:, np.newaxis]
+    plane_normals = planes[:, :3]
+    non_parallel = np.where(
+        (np.abs(plane_normals[:, 2]) < 0.9)[:, np.newaxis],
+        (0.0, 0.0, -1.0), (0.0, -1.0, 0.0))
+    local_x = np.cross(non_parallel, plane_normals)
+    local_x /= np.linalg.norm(local_x, axis=1, keepdims=True)
+    local_y = np.cross(plane_normals, local_x)
+    offsets = vertices[vertex_indices] - centres[face_planes]
+    angles = np.arctan2(
+        np.einsum("ij,ij->i", offsets, local_y[face_planes]),
+        np.einsum("ij,ij->i", offsets, local_x[face_planes]))
+    order = np.lexsort((angles, face_planes))
+    loops, face_planes = vertex_indices[order], face_planes[order]
+    # drop faces w/ less than 3 vertices (planes that only touch an edge or corner)
+    valid_loops = num_incidences[face_planes] >= 3
+    loops, face_planes = loops[valid_loops], face_planes[valid_loops]
+    faces, face_sizes = np.unique(face_planes, return_counts=True)
+    return vertices, vertex_brushes, loops, face_sizes, plane_brushes[faces]
+
+
+axial_normals = np.array([
+    (+1, 0, 0), (-1, 0, 0),
+    (0, +1, 0), (0, -1, 0),
+    (0, 0, +1), (0, 0, -1)], dtype=np.float64)
+# ^ +X -X +Y -Y +Z -Z
+
+max_brushes = 2 ** 20  # per entity; packs (entity, brush) into one int64
+
+
+def parse_floats(values: List[str], width: int) -> np.ndarray:
+    """["x y z", ...] -> float64 (len(values), width); one split for every value"""
+    return np.array(" ".join(values).split(), dtype=np.float64).reshape(-1, width)
+
+
+def has_bounds(entity: Dict[str, str]) -> bool:
+    return "*trigger_brush_mins" in entity and "*trigger_brush_maxs" in entity
+
+
+def bounds_only(entity: Dict[str, str]) -> bool:
+    """Apex Legends starcoll trigger w/o planes; entity_brushes can only make its bounding box"""
+    return has_bounds(entity) and not any(
+        "_plane_" in key
+        for key in entity
+        if key.startswith("*trigger_brush_"))
+
+
+# TODO: decode STAR_COLL BVH leaves (BVH_LEAF_DATA) for the actual volume of starcoll triggers
+# -- bsp_tool doesn't map their layout yet, so only the entity's bounds are used
+def entity_brushes(entities: List[Dict[str, str]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """bulk decode "*trigger_brush_*" keyvalues of many entities
+
+    Titanfall: "*trigger_brush_B_plane_P" "x y z distance"
+    Apex Legends (starcoll): "*trigger_brush_mins" & "*trigger_brush_maxs" bound every brush
+    NOTE: a starcoll trigger w/o planes becomes its bounding box, not its volume; see bounds_only
+    -> (planes, plane_brushes, entity_brush_ranges) for convex_hulls
+    -- entity_brush_ranges: int (len(entities), 2) first & end brush of each entity"""
+    plane_entities, plane_brushes, plane_indices, plane_values = list(), list(), list(), list()
+    bound_entities, bound_values = list(), list()
+    for i, entity in enumerate(entities):
+        for key, value in entity.items():
+            if key.startswith("*trigger_brush_"):
+                brush_index, _, plane_index = key[15:].partition("_plane_")
+                if plane_index != "":
+                    plane_entities.append(i)
+                    plane_brushes.append(int(brush_index))
+                    plane_indices.append(int(plane_index))
+                    plane_values.append(value)
+        if has_bounds(entity):  # Apex Legends
+            bound_entities.append(i)
+            bound_values.append(f"{entity['*trigger_brush_mins']} {entity['*trigger_brush_maxs']}")
+    codes = np.array(plane_entities, dtype=np.int64) * max_brushes + np.array(plane_brushes, dtype=np.int64)
+    plane_indices = np.array(plane_indices, dtype=np.int64)
+    planes = parse_floats(plane_values, 4)
+    # starcoll bounds: 6 axial planes for each brush of the entity (1 brush if it has no planes)
+    if len(bound_entities) > 0:
+        bound_entities = np.array(bound_entities, dtype=np.int64)
+        mins, maxs = parse_floats(bound_values, 6).reshape(-1, 2, 3).transpose(1, 0, 2)
+        bound_distances = np.stack([maxs, -mins], axis=-1).reshape(-1, 6)
+        # ^ +X -X +Y -Y +Z -Z
+        brush_codes = np.unique(codes)
+        bounded = brush_codes[np.isin(brush_codes // max_brushes, bound_entities)]
+        bare = np.setdiff1d(bound_entities, brush_codes // max_brushes) * max_brushes
+        bounded = np.concatenate([bounded, bare])
+        bounds = np.searchsorted(bound_entities, bounded // max_brushes)
+        codes = np.concatenate([codes, np.repeat(bounded, 6)])
+        plane_indices = np.concatenate([plane_indices, np.tile(np.arange(-6, 0), len(bounded))])
+        planes = np.concatenate([planes, np.column_stack([
+            np.tile(axial_normals, (len(bounded), 1)),
+            bound_distances[bounds].ravel()])])
+    # sort by entity, brush & plane
+    order = np.lexsort((plane_indices, codes))
+    brush_codes, plane_brushes = np.unique(codes[order], return_inverse=True)
+    entity_brush_ranges = np.searchsorted(
+        brush_codes // max_brushes, np.arange(len(entities) + 1))
+    return (
+        planes[order],
+        plane_brushes.ravel(),
+        np.column_stack([entity_brush_ranges[:-1], entity_brush_ranges[1:]]))
@@ -0,0 +1,65 @@
+# NOTE: no bpy imports! worker processes import this module
+import itertools
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+
+no_uv = (0.0, 0.0)
+
+Buffers = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, List[str]]
+# ^ (positions, uvs, colours, material_ids, materials)
+
+
+def packed_width(num_uvs: int = 1, colours: bool = False) -> int:
+    """floats per vertex: position, uvs & colour"""
+    return 3 + num_uvs * 2 + (4 if colours else 0)
+
+
+def pack_vertices(vertices: Iterable, num_vertices: int, num_uvs: int = 1, colours: bool = False) -> np.ndarray:
+    """-> float32 (num_vertices, packed_width); consumes vertices lazily"""
+    assert num_uvs >= 1, "uv0 is always packed"
+    width = packed_width(num_uvs, colours)
+
+    def pack(vertex) -> tuple:
+        uvs = [
+            vertex.uv[i] if i < len(vertex.uv) else no_uv
+            for i in range(num_uvs)]
+        colour = vertex.colour if colours else ()
+        return (*vertex.position, *itertools.chain(*uvs), *colour)
+
+    return np.fromiter(
+        itertools.chain.from_iterable(map(pack, vertices)),
+        dtype=np.float32,
+        count=num_vertices * width).reshape(-1, width)
+
+
+def unpack(packed: np.ndarray, num_uvs: int = 1, colours: bool = False) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """pack_vertices output -> (positions, uvs, colours)"""
+    width = packed_width(num_uvs, colours)
+    uvs = np.stack([
+        packed[:, 3 + i * 2:5 + i * 2]
+        for i in range(num_uvs)])
+    return (
+        np.ascontiguousarray(packed[:, 0:3]),
+        uvs,
+        np.ascontiguousarray(packed[:, width - 4:]) if colours else None)
+
+
+def pack_model(model, num_uvs: int = 1, colours: bool = False) -> Buffers:
+    """pack every vertex of a bsp_tool / ass Model in one pass"""
+    vertices = [
+        vertex
+        for mesh in model.meshes
+        for polygon in mesh.polygons
+        for vertex in polygon.vertices]
+    assert len(vertices) % 3 == 0, "not a triangle soup"
+    packed = pack_vertices(vertices, len(vertices), num_uvs, colours)
+    # NOTE: Model.merge_meshes gives us one mesh per material
+    material_ids = np.repeat(
+        np.arange(len(model.meshes), dtype=np.int32),
+        [len(mesh.polygons) for mesh in model.meshes])
+    return (
+        *unpack(packed, num_uvs, colours),
+        material_ids,
+        [mesh.material.name for mesh in model.meshes])
@@ -0,0 +1,99 @@
+# NOTE: no bpy imports! worker processes import this module
+import hashlib
+import importlib.metadata
+import os
+from typing import Tuple
+import zipfile
+
+import numpy as np
+
+
+# NOTE: bump whenever load.buffers.pack_model or load.mdl.parse_model output changes
+FORMAT_VERSION = 2
+
+MISS = object()  # sentinel; None is a cached parse failure
+
+
+def parser_version() -> str:
+    try:
+        ass_version = importlib.metadata.version("ass")
+    except importlib.metadata.PackageNotFoundError:
+        ass_version = "unknown"
+    return f"{FORMAT_VERSION}-ass-{ass_version}"
+
+
+def cache_path(cache_folder: str, filepath: str, lod: int = 0) -> str:
+    """{path, mtime, size, lod, parser version} -> unique filename"""
+    stat = os.stat(filepath)
+    key = "|".join(map(str, (
+        os.path.abspath(filepath), stat.st_mtime_ns, stat.st_size, lod, parser_version())))
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    return os.path.join(cache_folder, f"{digest}.npz")
+
+
+def load_payload(cache_folder: str, filepath: str, lod: int = 0) -> Tuple:
+    """cached load.mdl.parse_model result, or MISS"""
+    path = cache_path(cache_folder, filepath, lod)
+    if not os.path.exists(path):
+        return MISS
+    try:
+        with np.load(path) as npz:
+            if npz["failed"]:
+                return None
+            model_name, asset_path = map(str, npz["names"])
+            buffers = (
+                npz["positions"], npz["uvs"], None, npz["material_ids"],
+                list(map(str, npz["materials"])))
+    except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+        return MISS  # corrupt / half-written / outdated; will be overwritten
+    return (model_name, asset_path, buffers)
+
+
+def save_payload(cache_folder: str, filepath: str, lod: int, payload: Tuple):
+    """best effort; a failed write (disk full, read-only folder) just skips the cache"""
+    path = cache_path(cache_folder, filepath, lod)
+    if payload is None:  # remember failures too
+        arrays = {"failed": np.bool_(True)}
+    else:
+        model_name, asset_path, buffers = payload
+        positions, uvs, colours, material_ids, materials = buffers
+        arrays = {
+            "failed": np.bool_(False),
+            "names": np.array([model_name, asset_path]),
+            "positions": positions,
+            "uvs": uvs,
+            "material_ids": material_ids,
+            "materials": np.array(materials, dtype=str)}
+    # NOTE: write & rename, since multiple workers share the cache
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "wb") as npz_file:
+            np.savez(npz_file, **arrays)
+        os.replace(temp_path, path)
+    except OSError:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass  # never created
+
+
+def cached_files(cache_folder: str):
+    if not os.path.isdir(cache_folder):
+        return
+    for entry in os.scandir(cache_folder):
+        if entry.is_file() and entry.name.endswith((".npz", ".tmp")):
+            yield entry
+
+
+def stats(cache_folder: str) -> Tuple[int, int]:
+    """-> (num_files, num_bytes)"""
+    sizes = [entry.stat().st_size for entry in cached_files(cache_folder)]
+    return len(sizes), sum(sizes)
+
+
+def clear(cache_folder: str) -> int:
+    """-> num_files deleted"""
+    paths = [entry.path for entry in cached_files(cache_folder)]
+    for path in paths:
+        os.remove(path)
+    return len(paths)
@@ -1,15 +1,13 @@
+import json
 import math
-from typing import Any, Dict, List
+from typing import Any, List
 
 import bpy
 from bpy.types import PointLight
-import mathutils
 
-from .utils import change_collection
-
-
-Entity = Dict[str, str]
-# ^ {"key": "value"}
+from .table import Entity, EntityTable
+from .update import update_entities
+from .utils import ObjectBatch, run, Steps
 
 
 def editorclass_of(entity: Entity) -> str:
@@ -101,64 +99,72 @@ def set_location(blender_object: Any, entity: Entity):
     blender_object.location = location
 
 
-def all_entities(bsp, ent_collections, converters=converters):
-    entity_blocks = {
-        "bsp": bsp.ENTITIES,
-        "env": bsp.ENTITIES_env,
-        "fx": bsp.ENTITIES_fx,
-        "script": bsp.ENTITIES_script,
-        "sound": bsp.ENTITIES_snd,
-        "spawn": bsp.ENTITIES_spawn}
-    for block_name, entities in entity_blocks.items():
+def keyvalues_of(blender_object: Any) -> Entity:
+    """entity keyvalues saved by all_entities / all_triggers"""
+    return json.loads(blender_object.get("keyvalues", "{}"))
+
+
+def all_entities(*args, **kwargs):
+    """entity_steps, all at once"""
+    run(entity_steps(*args, **kwargs))
+
+
+def entity_steps(bsp, ent_collections, converters=converters, update: bool = False,
+                 batch_size: int = 256) -> Steps:
+    """yields after every batch_size entities
+    update: reuse objects from a previous import of this map; only changes are rebuilt"""
+    table = EntityTable.from_bsp(bsp)
+    rotations = table.rotations
+    num_entities = max(1, len(table))
+    for block_name, (first_row, end_row) in table.block_ranges.items():
         entity_collection = ent_collections[block_name]
-        for entity in entities:
-            classname = editorclass_of(entity)
-            blenderify = converters.get(classname, lambda e: None)
-            object_data = blenderify(entity)
-            name = name_of(entity)
-            entity_object = bpy.data.objects.new(name, object_data)
-
-            # default empty
-            if object_data is None:
-                entity_object.empty_display_type = "SPHERE"
-                entity_object.empty_display_size = 16
-                # cubes for ai pathing entities
-                if classname.startswith("info_node"):
-                    entity_object.empty_display_type = "CUBE"
-                    entity_object.empty_display_size = 32
-            entity_collection.objects.link(entity_object)
-
-            # location
-            set_location(entity_object, entity)
-            # update child meshes
-            if entity.get("model", "").startswith("*"):
-                model_index = int(entity["model"][1:])
-                model_collection = bpy.data.collections.get(f"model #{model_index}")
-                if model_collection is not None:
-                    if "targetname" in entity:
-                        targetname = entity["targetname"]
-                        model_collection.name += " " + f"({targetname})"
-                    for mesh_object in model_collection.objects:
-                        mesh_object.location = entity_object.location
-
-            # rotation
+        rows = list(range(first_row, end_row))
+        if update:
+            # NOTE: trigger meshes share the collection & keyvalues
+            rows = update_entities(table, rows, [
+                blender_object
+                for blender_object in entity_collection.objects
+                if "keyvalues" in blender_object and blender_object.type != "MESH"])
+        with ObjectBatch(entity_collection) as batch:
+            for row in rows:
+                if row % batch_size == 0:
+                    yield row / num_entities
+                entity = table.entities[row]
+                classname = table.classnames[row]
+                blenderify = converters.get(classname, lambda e: None)
+                object_data = blenderify(entity)
+                entity_object = batch.new(table.names[row], object_data)
+
+                # default empty
+                if object_data is None:
+                    entity_object.empty_display_type = "SPHERE"
+                    entity_object.empty_display_size = 16
+                    # cubes for ai pathing entities
+                    if classname.startswith("info_node"):
+                        entity_object.empty_display_type = "CUBE"
+                        entity_object.empty_display_size = 32
+
+                # update child meshes
+                if entity.get("model", "").startswith("*"):
+                    model_index = int(entity["model"][1:])
+                    model_collection = bpy.data.collections.get(f"model #{model_index}")
+                    if model_collection is not None:
+                        if "targetname" in entity:
+                            targetname = entity["targetname"]
+                            model_collection.name += " " + f"({targetname})"
+                        for mesh_object in model_collection.objects:
+                            mesh_object.location = table.origins[row]
+
+                # TODO: optimise
+                # -- props with shared worldmodel share mesh data
+                # save entity keyvalues as one custom property; see keyvalues_of
+                entity_object["keyvalues"] = table.keyvalues(row)
+
+            # location & rotation, for the whole block at once
             # NOTE: default orientation is facing east (+X)
             # -- some props will get the wrong rotation?
             # TODO: test entity rotation matches in-game
-            angles = [
-                math.radians(float(axis))
-                for axis in entity.get("angles", "0 0 0").split()]
-            angles[0] = math.radians(
-                -float(entity.get("pitch", -math.degrees(angles[0]))))
-            entity_object.rotation_euler = mathutils.Euler(
-                    (angles[2], *angles[:2]))  # YZX -> XYZ
-
-            # TODO: optimise
-            # -- props with shared worldmodel share mesh data
-            # save entity keyvalues as custom properties
-            for field in entity:
-                entity_object[field] = entity[field]
-
-            change_collection(entity_object, entity_collection)
+            batch.locations = table.origins[rows]
+            batch.rotations = rotations[rows]
     # TODO: connect paths for keyframe_rope / path_track etc.
     # TODO: handle parenting based on entity keyvalues
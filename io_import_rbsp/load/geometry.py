@@ -1,109 +1,282 @@
-import itertools
+from typing import Dict, Iterator, List
 
 import bpy
-from bpy.types import Collection
-# TODO: see if numpy can speed things up a little
+from bpy.types import Collection, Mesh
+import numpy as np
+import numpy.lib.recfunctions as rfn
 
-from .materials import placeholder
-from .entities import name_of
+from . import profiler
+from .buffers import Buffers, pack_model, pack_vertices, packed_width, unpack
+from .entities import Entity, name_of
+from .lightmaps import lightmap_indices
+from .mapped import MappedBsp
+from .soup import TriangleSoup
+from .update import existing_objects, move_objects, remove_objects
+from .utils import run, scaled, Steps
 
 
-def get_base_uv(vertices, index):
-    u, v = vertices[index].uv0
-    return (u, 1 - v)
+# NOTE: measured w/ tracemalloc on bsp.mesh() (VERTEX_LIT_BUMP)
+# -- bsp_tool Vertex, vec3 & vec2 objects cost ~3.7KiB per triangle
+decoded_triangle_bytes = 4096
 
+vertex_lumps = {
+    0x000: "VERTEX_LIT_FLAT",
+    0x200: "VERTEX_LIT_BUMP",
+    0x400: "VERTEX_UNLIT",
+    0x600: "VERTEX_UNLIT_TS"}
+# ^ {Mesh.flags & MeshFlags.MASK_VERTEX: "LUMP_NAME"}
 
-def get_lightmap_uv(vertices, index):
-    vertex = vertices[index]
-    if len(vertex.uv) >= 2:
-        u, v = vertex.uv1
-    else:
-        u, v = 0, 0
-    return (u, 1 - v)
+magenta = (1.0, 0.0, 1.0, 1.0)  # Apex Legends vertices w/o colour
 
 
-def all_models(bsp, geometry_collection: Collection):
+def all_models(*args, **kwargs):
+    """model_steps, all at once"""
+    run(model_steps(*args, **kwargs))
+
+
+def model_steps(bsp, geometry_collection: Collection, memory_limit: int = 0,
+                chunks: str = "None", cell_size: float = 4096, cell_triangles: int = 65536,
+                update: bool = False) -> Steps:
+    """yields after building each model's triangles (& each streamed chunk) and each mesh
+    memory_limit: MiB of bsp_tool meshes decoded at once; 0 decodes whole models
+    NOTE: ignored for a MappedBsp; lumps are read in place
+    chunks: split worldspawn into "Grid" (XY cells of cell_size)
+    -- or "Octree" (cells of at most cell_triangles) objects
+    update: keep objects from a previous import if their model hasn't changed"""
+    entities = brush_entities(bsp)
+    chunk_triangles = memory_limit * 2 ** 20 // decoded_triangle_bytes
+    meshes = dict()
+    # ^ {TriangleSoup.content_hash(): mesh}; identical models share a mesh
+    old_objects = existing_objects(geometry_collection, "model_index") if update else dict()
+    # ^ {model_index: [Object]}
+    num_models = len(bsp.MODELS)
     for i, model in enumerate(bsp.MODELS):
-        model = bsp.model(i)
-        vertex_materials = [
-            (vertex, mesh.material)
-            for mesh in model.meshes
-            for polygon in mesh.polygons
-            for vertex in polygon.vertices]
-        if len(vertex_materials) != 0:
-            vertices, materials = zip(*vertex_materials)
-        else:  # model w/ no geo
-            vertices, materials = list(), list()
-        assert len(vertices) % 3 == 0, "not a triangle soup"
-        indices = list(itertools.chain([
-            (i + 2, i + 1, i + 0)
-            for i in range(0, len(vertices), 3)]))
-
-        model_name = name_of(model.entity)
-        if model_name is None:
-            if i == 0:
-                model_name = "worldspawn"
+        with profiler.stage(f"geometry/model_{i:02d}"):
+            entity = entities.get(i, dict())
+            model_name = name_of(entity)
+            if model_name is None:
+                if i == 0:
+                    model_name = "worldspawn"
+                else:
+                    model_name = f"model_{i:02d}"
+
+            # first half of each model's progress is building triangles, second half meshes
+            start, middle = i / num_models, (i + 0.5) / num_models
+            if isinstance(bsp, MappedBsp):
+                buffers = mapped_model(bsp, i)
+            elif memory_limit == 0:
+                buffers = pack_model(bsp.model(i), num_uvs=2, colours=True)
+            else:
+                buffers = yield from scaled(stream_model_steps(bsp, i, chunk_triangles), start, middle)
+            soup = TriangleSoup(*buffers)
+            del buffers
+            yield middle
+            # NOTE: pack_model triangles are grouped by material
+            merged = not isinstance(bsp, MappedBsp) and memory_limit == 0
+            lightmaps = lightmap_indices(bsp, i, merged)
+            soup.lightmaps = lightmaps if len(lightmaps) == len(soup) else None
+            location = [
+                float(axis)
+                for axis in entity.get("origin", "0 0 0").split()]
+            digest = soup.content_hash()
+            chunking = f"{chunks} {cell_size:g} {cell_triangles}" if i == 0 else "None"
+            fingerprint = f"{digest} {chunking}"
+            model_objects = old_objects.pop(i, list())
+            if len(model_objects) > 0 and all(
+                    model_object.get("fingerprint") == fingerprint
+                    for model_object in model_objects):
+                move_objects(model_objects, [location] * len(model_objects))
+                if len(model_objects) == 1:
+                    meshes.setdefault(digest, model_objects[0].data)
+                yield (i + 1) / num_models
+                continue  # unchanged; the brush entity might have moved
+            remove_objects(model_objects)
+            if i == 0 and chunks == "Grid":
+                cells = grid_cells(soup.centroids, cell_size)
+            elif i == 0 and chunks == "Octree":
+                cells = octree_cells(soup.centroids, cell_triangles)
             else:
-                model_name = f"model_{i:02d}"
-
-        mesh = bpy.data.meshes.new(model_name)
-        mesh.from_pydata(
-            [vertex.position for vertex in vertices],
-            list(),  # auto-generate edges
-            indices,
-            shade_flat=False)
-
-        base_uv = mesh.uv_layers.new(name="base")
-        base_uv.data.foreach_set(
-            "uv",
-            list(itertools.chain(*[
-                get_base_uv(vertices, index)
-                for tri in indices
-                for index in tri])))
-
-        lightmap_uv = mesh.uv_layers.new(name="lightmap")
-        lightmap_uv.data.foreach_set(
-            "uv",
-            list(itertools.chain(*[
-                get_lightmap_uv(vertices, index)
-                for tri in indices
-                for index in tri])))
-
-        vertex_colour = mesh.vertex_colors.new(name="Colour")
-        vertex_colour.data.foreach_set(
-            "color",
-            list(itertools.chain(*[
-                vertices[index].colour
-                for tri in indices
-                for index in tri])))
-
-        material_indices = dict()
-        for material in {sub_mesh.material for sub_mesh in model.meshes}:
-            blender_material = placeholder(material.name, "wld")
-            mesh.materials.append(blender_material)
-            material_indices[material.name] = len(mesh.materials) - 1
-
-        # assign materials
-        mesh.polygons.foreach_set(
-            "material_index", [
-                material_indices[materials[tri[0]].name]
-                for tri in indices])
-
-        # TODO: per-face lightmap index
-        # NOTE: bsp_tool doesn't give us this info atm
-        # lightmap_index = mesh.attributes.new(
-        #     name="Lightmap Index", type="INT", domain="FACE")
-        # lightmap_index.data.foreach_set(
-        #     "value",
-        #     ...)
-
-        # TODO: separate skybox from worldspawn
-        # TODO: separate atmospheric effects from worldspawn
-
-        mesh.update()
-
-        # create object and place in geometry collection
-        blender_mesh = bpy.data.objects.new(mesh.name, mesh)
-        blender_mesh.location = model.origin
-        # TODO: model angles?
-        geometry_collection.objects.link(blender_mesh)
+                cells = None
+            if cells is None:
+                num_meshes = 1
+                model_meshes = [shared_mesh(meshes, soup, model_name, digest)]
+            else:  # one object per cell; blender can cull & evaluate each alone
+                model_meshes = (
+                    soup.subset(triangles).as_mesh(f"{model_name}.{cell}", "wld", ("base", "lightmap"))
+                    for cell, triangles in cells.items())
+                num_meshes = len(cells)
+            for j, mesh in enumerate(model_meshes):
+                # NOTE: "Lightmap Index" face attribute indexes load.lightmaps images
+                # TODO: separate skybox from worldspawn
+                # TODO: separate atmospheric effects from worldspawn
+
+                # create object and place in geometry collection
+                blender_mesh = bpy.data.objects.new(mesh.name, mesh)
+                blender_mesh.location = location
+                # TODO: model angles?
+                blender_mesh["model_index"] = i
+                blender_mesh["fingerprint"] = fingerprint
+                geometry_collection.objects.link(blender_mesh)
+                yield (i + 0.5 + 0.5 * (j + 1) / num_meshes) / num_models
+            del soup
+    # models this map no longer has
+    remove_objects([
+        model_object
+        for model_objects in old_objects.values()
+        for model_object in model_objects])
+
+
+def shared_mesh(meshes: Dict[str, Mesh], soup: TriangleSoup, name: str, digest: str = None) -> Mesh:
+    """reuse the mesh of an identical model, if we've made one"""
+    if digest is None:
+        digest = soup.content_hash()
+    if digest not in meshes:
+        mesh = soup.as_mesh(name, "wld", ("base", "lightmap"))
+        mesh["content_hash"] = digest
+        meshes[digest] = mesh
+    return meshes[digest]
+
+
+def grid_cells(centroids: np.ndarray, cell_size: float) -> Dict[str, np.ndarray]:
+    """{"x_y": triangle_indices}; bins triangles by centroid on an XY grid"""
+    cells = np.floor(centroids[:, :2] / cell_size).astype(np.int64)
+    keys, inverse = np.unique(cells, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    triangles = np.argsort(inverse, kind="stable")
+    splits = np.cumsum(np.bincount(inverse, minlength=len(keys)))[:-1]
+    return {
+        f"{x}_{y}": cell_triangles
+        for (x, y), cell_triangles in zip(keys.tolist(), np.split(triangles, splits))}
+
+
+def octree_cells(centroids: np.ndarray, max_triangles: int, max_depth: int = 8) -> Dict[str, np.ndarray]:
+    """{"octants": triangle_indices}; splits cells w/ more than max_triangles"""
+    out = dict()
+    if len(centroids) == 0:
+        return out  # no bounds to split
+    mins, maxs = centroids.min(axis=0), centroids.max(axis=0)
+    stack = [("0", np.arange(len(centroids)), mins, maxs)]
+    while len(stack) > 0:
+        path, triangles, mins, maxs = stack.pop()
+        if len(triangles) <= max_triangles or len(path) > max_depth:
+            out[path] = triangles
+            continue
+        middle = (mins + maxs) / 2
+        above = centroids[triangles] >= middle
+        octants = above @ np.array([1, 2, 4])
+        for octant in np.unique(octants):
+            octant_above = np.array([octant & 1, octant & 2, octant & 4], dtype=bool)
+            stack.append((
+                f"{path}{octant}",
+                triangles[octants == octant],
+                np.where(octant_above, middle, mins),
+                np.where(octant_above, maxs, middle)))
+    return out
+
+
+def brush_entities(bsp) -> Dict[int, Entity]:
+    """{model_index: entity}; first match, like bsp.model(i).entity"""
+    out = dict()
+    for entities in bsp.search_all_entities().values():
+        for entity in entities:
+            model = entity.get("model", "")
+            if model.startswith("*") and model[1:].isdigit():
+                out.setdefault(int(model[1:]), entity)
+    return out
+
+
+def mesh_chunks(bsp, model_index: int, chunk_triangles: int) -> Iterator[List[int]]:
+    """bsp.MESHES indices, batched by triangle count (at least 1 mesh per batch)"""
+    model = bsp.MODELS[model_index]
+    chunk, num_triangles = list(), 0
+    for i in range(model.first_mesh, model.first_mesh + model.num_meshes):
+        mesh_triangles = bsp.MESHES[i].num_triangles
+        if len(chunk) > 0 and num_triangles + mesh_triangles > chunk_triangles:
+            yield chunk
+            chunk, num_triangles = list(), 0
+        chunk.append(i)
+        num_triangles += mesh_triangles
+    if len(chunk) > 0:
+        yield chunk
+
+
+def stream_model(*args, **kwargs) -> Buffers:
+    """stream_model_steps, all at once"""
+    return run(stream_model_steps(*args, **kwargs))
+
+
+def stream_model_steps(bsp, model_index: int, chunk_triangles: int) -> Steps:
+    """pack_model(bsp.model(i), 2, True), w/o decoding the whole model at once
+    yields after each chunk; returns Buffers"""
+    model = bsp.MODELS[model_index]
+    num_triangles = sum(
+        bsp.MESHES[i].num_triangles
+        for i in range(model.first_mesh, model.first_mesh + model.num_meshes))
+    # NOTE: bpy can't foreach_set part of a mesh, so we stage in numpy
+    packed = np.empty((num_triangles * 3, packed_width(2, True)), dtype=np.float32)
+    material_ids = np.empty(num_triangles, dtype=np.int32)
+    materials = dict()
+    # ^ {"material": material_index}
+    cursor = 0  # triangles packed so far
+    for chunk in mesh_chunks(bsp, model_index, chunk_triangles):
+        meshes = [bsp.mesh(i) for i in chunk]
+        chunk_size = sum(len(mesh.polygons) for mesh in meshes)
+        vertices = (
+            vertex
+            for mesh in meshes
+            for polygon in mesh.polygons
+            for vertex in polygon.vertices)
+        packed[cursor * 3:(cursor + chunk_size) * 3] = pack_vertices(vertices, chunk_size * 3, 2, True)
+        for mesh in meshes:
+            material_index = materials.setdefault(mesh.material.name, len(materials))
+            material_ids[cursor:cursor + len(mesh.polygons)] = material_index
+            cursor += len(mesh.polygons)
+        del meshes, vertices  # free bsp_tool objects before the next chunk
+        yield cursor / max(num_triangles, 1)
+    return (
+        *unpack(packed[:cursor * 3], 2, True),
+        material_ids[:cursor],
+        list(materials))
+
+
+def mapped_model(bsp: MappedBsp, model_index: int) -> Buffers:
+    """pack_model(bsp.model(i), 2, True), straight from lump arrays"""
+    model = bsp.MODELS[model_index]
+    meshes = bsp.MESHES[model["first_mesh"]:model["first_mesh"] + model["num_meshes"]]
+    material_sorts = bsp.MATERIAL_SORTS[meshes["material_sort"]]
+    num_corners = meshes["num_triangles"].astype(np.int64) * 3
+    # MESH_INDICES -> per-corner vertex indices
+    mesh_starts = np.cumsum(num_corners) - num_corners
+    corner_offsets = np.arange(num_corners.sum()) - np.repeat(mesh_starts, num_corners)
+    vertex_indices = (
+        bsp.MESH_INDICES[np.repeat(meshes["first_mesh_index"], num_corners) + corner_offsets]
+        + np.repeat(material_sorts["vertex_offset"], num_corners))
+    corner_lumps = np.repeat(meshes["flags"] & 0x600, num_corners)
+    positions = np.empty((len(vertex_indices), 3), dtype=np.float32)
+    uvs = np.zeros((2, len(vertex_indices), 2), dtype=np.float32)
+    colours = np.empty((len(vertex_indices), 4), dtype=np.float32)
+    all_positions = rfn.structured_to_unstructured(bsp.VERTICES)
+    for flags, lump_name in vertex_lumps.items():
+        mask = corner_lumps == flags
+        if not mask.any():
+            continue
+        vertices = getattr(bsp, lump_name)[vertex_indices[mask]]
+        fields = vertices.dtype.names
+        positions[mask] = all_positions[vertices["position_index"]]
+        uvs[0][mask] = vertices["albedo_uv"]
+        if "lightmap_uv" in fields:  # Apex Legends
+            uvs[1][mask] = vertices["lightmap_uv"]
+        elif "lightmap" in fields:
+            uvs[1][mask] = vertices["lightmap"]["uv"]
+        if "colour" in fields:
+            colours[mask] = vertices["colour"] / 255
+        else:
+            colours[mask] = magenta
+    # materials, in order of first use
+    texture_data_names = bsp.texture_data_names()
+    mesh_materials = [texture_data_names[i] for i in material_sorts["texture_data"]]
+    materials = {name: i for i, name in enumerate(dict.fromkeys(mesh_materials))}
+    material_ids = np.repeat(
+        np.array([materials[name] for name in mesh_materials], dtype=np.int32),
+        meshes["num_triangles"])
+    return positions, uvs, colours, material_ids, list(materials)
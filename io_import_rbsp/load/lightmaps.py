@@ -0,0 +1,180 @@
+import json
+import os
+from typing import List
+
+import bpy
+from bpy.types import Image
+import numpy as np
+
+from .mapped import MappedBsp
+
+
+lightmap_lumps = {
+    "LIGHTMAP_DATA_SKY": "sky",
+    "LIGHTMAP_DATA_REAL_TIME_LIGHTS": "rtl"}
+# ^ {"LUMP_NAME": "image suffix"}
+
+texel_bytes = 4  # RGBA8888
+
+# NOTE: bump whenever decode_pages output changes
+FORMAT_VERSION = 1
+
+
+def lightmap_sizes(bsp) -> np.ndarray:
+    """int64 (num_headers, 2) width & height of each LightmapHeader"""
+    headers = getattr(bsp, "LIGHTMAP_HEADERS", list())
+    if isinstance(headers, np.ndarray):  # MappedBsp
+        return np.column_stack([headers["width"], headers["height"]]).astype(np.int64)
+    return np.array([(header.width, header.height) for header in headers], dtype=np.int64).reshape(-1, 2)
+
+
+def raw_lump(bsp, lump_name: str) -> memoryview:
+    if isinstance(bsp, MappedBsp):
+        return bsp.lump_bytes(lump_name)
+    return memoryview(bytes(getattr(bsp, lump_name, b"")))
+
+
+def decode_pages(data: memoryview, sizes: np.ndarray) -> List[List[np.ndarray]]:
+    """lightmap lump -> [[float32 (height, width, 4) page]] for each header
+    rows are flipped for blender; None if the lump doesn't fit the headers
+    NOTE: pages per header are inferred from the lump size (2 sky & 1 rtl for Titanfall 2)"""
+    texels = sizes[:, 0] * sizes[:, 1]
+    header_bytes = int(texels.sum()) * texel_bytes
+    if header_bytes == 0 or len(data) == 0 or len(data) % header_bytes != 0:
+        return None
+    num_pages = len(data) // header_bytes
+    # pages are stored header by header
+    page_bytes = np.repeat(texels * texel_bytes, num_pages)
+    page_starts = np.cumsum(page_bytes) - page_bytes
+    raw = np.frombuffer(data, dtype=np.uint8)
+    out = list()
+    for i, (width, height) in enumerate(sizes):
+        pages = list()
+        for j in range(num_pages):
+            start = page_starts[i * num_pages + j]
+            page = raw[start:start + width * height * texel_bytes].reshape(height, width, texel_bytes)
+            pages.append(page[::-1].astype(np.float32) / 255)
+        out.append(pages)
+    return out
+
+
+def cache_folder(filepath: str) -> str:
+    """decoded lightmaps are cached next to the .bsp"""
+    base_path = os.path.splitext(filepath)[0]
+    return f"{base_path}_lightmaps"
+
+
+def source_stamp(bsp, filepath: str) -> str:
+    """changes whenever the .bsp or a lightmap .bsp_lump changes"""
+    paths = [filepath, *(
+        f"{filepath}.{bsp.branch.LUMP[lump_name].value:04x}.bsp_lump"
+        for lump_name in ("LIGHTMAP_HEADERS", *lightmap_lumps))]
+    return "|".join([str(FORMAT_VERSION), *(
+        f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+        for path, stat in ((path, os.stat(path)) for path in paths if os.path.exists(path)))])
+
+
+def image_name(bsp, header_index: int, suffix: str, page_index: int) -> str:
+    return f"{bsp.filename}.lightmap{header_index:03d}.{suffix}{page_index}"
+
+
+def all_lightmaps(bsp, filepath: str, use_cache: bool = True) -> List[Image]:
+    """one image per lightmap page; see the "Lightmap Index" face attribute
+    use_cache: reuse / save pages as .png in cache_folder(filepath)"""
+    folder = cache_folder(filepath)
+    manifest_path = os.path.join(folder, "manifest.json")
+    stamp = source_stamp(bsp, filepath)
+    if use_cache and os.path.exists(manifest_path):
+        try:
+            with open(manifest_path) as manifest_file:
+                manifest = json.load(manifest_file)
+            if manifest["stamp"] == stamp:
+                return [
+                    load_image(os.path.join(folder, f"{name}.png"), name)
+                    for name in manifest["images"]]
+        except (OSError, KeyError, ValueError, RuntimeError):
+            pass  # stale / corrupt; decode again
+    images = decode_lightmaps(bsp)
+    if use_cache and len(images) > 0:
+        try:
+            save_images(images, folder, stamp)
+        except (OSError, RuntimeError):
+            pass  # read-only folder; still imported, just not cached
+    return images
+
+
+def decode_lightmaps(bsp) -> List[Image]:
+    sizes = lightmap_sizes(bsp)
+    out = list()
+    for lump_name, suffix in lightmap_lumps.items():
+        headers = decode_pages(raw_lump(bsp, lump_name), sizes)
+        if headers is None:
+            continue  # missing, or a layout we don't know yet
+        for i, pages in enumerate(headers):
+            for j, page in enumerate(pages):
+                height, width = page.shape[:2]
+                name = image_name(bsp, i, suffix, j)
+                image = bpy.data.images.get(name)
+                if image is None or tuple(image.size) != (width, height):
+                    image = bpy.data.images.new(name, width, height, alpha=True)
+                image.pixels.foreach_set(page.ravel())
+                image["lightmap_index"] = i
+                out.append(image)
+    return out
+
+
+def save_images(images: List[Image], folder: str, stamp: str):
+    os.makedirs(folder, exist_ok=True)
+    for image in images:
+        image.filepath_raw = os.path.join(folder, f"{image.name}.png")
+        image.file_format = "PNG"
+        image.save()
+    manifest = {"stamp": stamp, "images": [image.name for image in images]}
+    with open(os.path.join(folder, "manifest.json"), "w") as manifest_file:
+        json.dump(manifest, manifest_file)
+
+
+def load_image(filepath: str, name: str) -> Image:
+    image = bpy.data.images.load(filepath, check_existing=True)
+    image.reload()  # in case the .png was replaced
+    image.name = name
+    image["lightmap_index"] = int(name.rpartition(".lightmap")[2].partition(".")[0])
+    return image
+
+
+def lightmap_indices(bsp, model_index: int, merged: bool = False) -> np.ndarray:
+    """int32 LightmapHeader index of each triangle; -1 if unlit
+    merged: triangles grouped by material, like bsp_tool's Model.merge_meshes"""
+    model = bsp.MODELS[model_index]
+    if isinstance(bsp, MappedBsp):
+        meshes = bsp.MESHES[model["first_mesh"]:model["first_mesh"] + model["num_meshes"]]
+        material_sorts = bsp.MATERIAL_SORTS[meshes["material_sort"]]
+        lightmap_field = "lightmap_index" if "lightmap_index" in material_sorts.dtype.names else "lightmap_header"
+        num_triangles = meshes["num_triangles"].astype(np.int64)
+        mesh_lightmaps = material_sorts[lightmap_field].astype(np.int32)
+        mesh_materials = material_sorts["texture_data"]
+    else:
+        # NOTE: geometry.Material normalises names; merge_meshes groups by that name
+        meshes = [
+            bsp.MESHES[i]
+            for i in range(model.first_mesh, model.first_mesh + model.num_meshes)]
+        material_sorts = [bsp.MATERIAL_SORTS[mesh.material_sort] for mesh in meshes]
+        num_triangles = np.array([mesh.num_triangles for mesh in meshes], dtype=np.int64)
+        mesh_lightmaps = np.array([
+            getattr(material_sort, "lightmap_index", getattr(material_sort, "lightmap_header", -1))
+            for material_sort in material_sorts], dtype=np.int32)
+        mesh_materials = np.array([
+            texture_data_name(bsp, material_sort.texture_data).lower().replace("\\", "/")
+            for material_sort in material_sorts])
+    if merged:  # stable sort meshes by first use of their material
+        _, first_uses, groups = np.unique(mesh_materials, return_index=True, return_inverse=True)
+        order = np.argsort(first_uses[groups.ravel()], kind="stable")
+        num_triangles, mesh_lightmaps = num_triangles[order], mesh_lightmaps[order]
+    return np.repeat(mesh_lightmaps, num_triangles)
+
+
+def texture_data_name(bsp, texture_data_index: int) -> str:
+    if hasattr(bsp, "texture_data_surface_name"):  # Apex Legends
+        return bsp.texture_data_surface_name(texture_data_index)
+    texture_data = bsp.TEXTURE_DATA[texture_data_index]
+    return bsp.TEXTURE_DATA_STRING_DATA[texture_data.name_index]
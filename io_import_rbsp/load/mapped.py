@@ -0,0 +1,243 @@
+# NOTE: no bpy imports! only bsp_tool & numpy
+from __future__ import annotations
+import mmap
+import os
+import struct
+from types import ModuleType
+from typing import Dict, List, NamedTuple, Tuple
+
+import bsp_tool
+from bsp_tool import valve
+from bsp_tool.branches import shared
+from bsp_tool.core import BitField
+from bsp_tool.core.common import split_format
+import numpy as np
+
+
+numpy_codes = {
+    "b": "i1", "B": "u1", "h": "i2", "H": "u2", "i": "i4", "I": "u4",
+    "l": "i4", "L": "u4", "q": "i8", "Q": "u8", "e": "f2", "f": "f4",
+    "d": "f8", "?": "?", "c": "S1"}
+# ^ {"struct code": "numpy code"}
+
+entity_lumps = (
+    "ENTITIES", "ENTITIES_env", "ENTITIES_fx",
+    "ENTITIES_script", "ENTITIES_snd", "ENTITIES_spawn")
+
+
+def code_dtype(code: str, endian: str) -> np.dtype:
+    if code.endswith("s"):  # "16s" etc.
+        return np.dtype(f"S{code[:-1] or 1}")
+    return np.dtype(f"{endian}{numpy_codes[code]}")
+
+
+def field_dtype(mapping, codes: Tuple[str], endian: str) -> Tuple[np.dtype, int]:
+    """bsp_tool attribute mapping -> (dtype, num_codes consumed)"""
+    if mapping is None:
+        return code_dtype(codes[0], endian), 1
+    if isinstance(mapping, (int, list)):
+        length = mapping if isinstance(mapping, int) else len(mapping)
+        if len(set(codes[:length])) == 1:
+            return np.dtype((code_dtype(codes[0], endian), (length,))), length
+        mapping = {str(i): None for i in range(length)}  # mixed types
+    fields, consumed = list(), 0
+    for name, child_mapping in mapping.items():
+        dtype, length = field_dtype(child_mapping, codes[consumed:], endian)
+        fields.append((name, dtype))
+        consumed += length
+    return np.dtype(fields), consumed
+
+
+def lump_dtype(LumpClass, endianness: str = "little") -> np.dtype:
+    """bsp_tool LumpClass -> equivalent numpy dtype; None if unsupported"""
+    endian = {"little": "<", "big": ">"}[endianness]
+    if issubclass(LumpClass, BitField):
+        return None
+    codes = split_format(LumpClass._format)
+    if hasattr(LumpClass, "_mapping"):  # MappedArray
+        mapping = LumpClass._mapping
+        if isinstance(mapping, list):
+            mapping = {name: None for name in mapping}
+    elif hasattr(LumpClass, "__slots__") and len(LumpClass.__slots__) != 0:  # Struct
+        arrays = getattr(LumpClass, "_arrays", dict())
+        mapping = {name: arrays.get(name, None) for name in LumpClass.__slots__}
+    else:  # int / float subclass; e.g. shared.UnsignedShorts
+        return code_dtype(codes[0], endian)
+    dtype, consumed = field_dtype(mapping, codes, endian)
+    assert consumed == len(codes), f"couldn't map {LumpClass.__name__}._format"
+    assert dtype.itemsize == struct.calcsize(f"{endian}{LumpClass._format}")
+    return dtype
+
+
+class LumpHeader(NamedTuple):
+    offset: int
+    length: int
+    version: int
+    fourCC: int  # uncompressed size; 0 if uncompressed
+
+
+class MappedBsp:
+    """RespawnBsp w/ memory-mapped lumps; each lump is decoded on first access"""
+    branch: ModuleType
+    folder: str
+    filename: str
+    endianness: str = "little"
+    version: int  # or (major, minor) for Apex Legends Season 11+
+    headers: Dict[str, LumpHeader]
+    file: mmap.mmap
+    lump_files: Dict[str, mmap.mmap]
+    # ^ {"LUMP_NAME": .bsp_lump}
+    folder_files: Dict[str, str]
+    # ^ {"filename.lower()": "filename"}
+
+    def __init__(self, filepath: str):
+        self.folder, self.filename = os.path.split(filepath)
+        self.headers = dict()
+        self.lump_files = dict()
+        with open(filepath, "rb") as bsp_file:
+            self.file = mmap.mmap(bsp_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.folder_files = {
+            filename.lower(): filename
+            for filename in os.listdir(self.folder or ".")}
+
+    def __repr__(self) -> str:
+        descriptor = f"'{self.filename}' {self.branch.__name__.split('.')[-1]}"
+        return f"<{self.__class__.__name__} {descriptor} @ 0x{id(self):016X}>"
+
+    def __getattr__(self, name: str):
+        """decode lumps on first access, like bsp_tool.RespawnBsp attributes"""
+        if name.startswith("_") or "branch" not in self.__dict__:
+            raise AttributeError(name)
+        if name in entity_lumps:
+            value = self.entities(name)
+        elif name == "GAME_LUMP":
+            value = self.game_lump()
+        elif name in self.branch.SPECIAL_LUMP_CLASSES:
+            version = self.headers[name].version
+            SpecialLumpClass = self.branch.SPECIAL_LUMP_CLASSES[name][version]
+            value = SpecialLumpClass.from_bytes(bytes(self.lump_bytes(name)))
+        elif name in self.branch.LUMP.__members__:
+            value = self.array(name)
+        else:
+            raise AttributeError(f"{self.__class__.__name__} has no attribute '{name}'")
+        setattr(self, name, value)  # cache
+        return value
+
+    def external_file(self, filename: str) -> str:
+        """case-insensitive path to a file next to the .bsp; None if missing"""
+        filename = self.folder_files.get(filename.lower(), None)
+        if filename is not None:
+            return os.path.join(self.folder, filename)
+
+    def lump_bytes(self, name: str) -> memoryview:
+        """raw lump, without copying (unless compressed)"""
+        if name in self.lump_files:
+            return memoryview(self.lump_files[name])
+        header = self.headers[name]
+        if header.length == 0 or header.offset + header.length > len(self.file):
+            return memoryview(b"")
+        raw_lump = memoryview(self.file)[header.offset:header.offset + header.length]
+        if header.fourCC != 0:  # compressed
+            return memoryview(valve.decompress(bytes(raw_lump)))
+        return raw_lump
+
+    def array(self, name: str) -> np.ndarray:
+        """zero-copy structured view of a lump"""
+        version = self.headers[name].version
+        if name in self.branch.LUMP_CLASSES:
+            LumpClass = self.branch.LUMP_CLASSES[name][version]
+        else:
+            LumpClass = self.branch.BASIC_LUMP_CLASSES[name][version]
+        dtype = lump_dtype(LumpClass, self.endianness)
+        if dtype is None:
+            raise NotImplementedError(f"can't map {LumpClass.__name__} to numpy")
+        raw_lump = self.lump_bytes(name)
+        return np.frombuffer(raw_lump, dtype=dtype, count=len(raw_lump) // dtype.itemsize)
+
+    def entities(self, name: str) -> shared.Entities:
+        if name == "ENTITIES":
+            return shared.Entities.from_bytes(bytes(self.lump_bytes(name)))
+        base_filename = self.filename.rpartition(".")[0]
+        ent_file = self.external_file(f"{base_filename}_{name.partition('_')[2]}.ent")
+        if ent_file is None:
+            return shared.Entities()
+        with open(ent_file, "rb") as entity_file:
+            entity_file.readline()  # "ENTITIES01"
+            return shared.Entities.from_bytes(entity_file.read())
+
+    def game_lump(self) -> valve.GameLump:
+        if "GAME_LUMP" in self.lump_files:
+            # NOTE: external child lump offsets are relative to the .bsp header
+            header = self.headers["GAME_LUMP"]
+            return valve.GameLump.from_stream(
+                self.lump_files["GAME_LUMP"], self, sub_offset=header.offset)
+        header = self.headers["GAME_LUMP"]
+        return valve.GameLump.from_stream(self.file, self, header.offset, header.length)
+
+    def search_all_entities(self, **search: Dict[str, str]) -> Dict[str, List[Dict[str, str]]]:
+        """search_all_entities(key="value") -> {"LUMP": [{"key": "value", ...}]}"""
+        out = dict()
+        for lump_name in entity_lumps:
+            results = getattr(self, lump_name).search(**search)
+            if len(results) != 0:
+                out[lump_name] = results
+        return out
+
+    def texture_data_names(self) -> List[str]:
+        """material name of each TEXTURE_DATA; normalised like bsp_tool's geometry.Material"""
+        name_indices = self.TEXTURE_DATA["name_index"]
+        if "SURFACE_NAMES" in self.branch.LUMP.__members__:  # Apex Legends
+            surface_names = bytes(self.lump_bytes("SURFACE_NAMES"))
+            names = [
+                surface_names[i:].lstrip(b"\0").partition(b"\0")[0].decode()
+                for i in name_indices]
+        else:
+            names = [self.TEXTURE_DATA_STRING_DATA[i] for i in name_indices]
+        return [name.lower().replace("\\", "/") for name in names]
+
+    def close(self):
+        """drop cached lumps & unmap files"""
+        if "branch" in self.__dict__:  # not set if from_file failed
+            for name in [*entity_lumps, "GAME_LUMP", *self.branch.LUMP.__members__]:
+                self.__dict__.pop(name, None)
+        for mapped_file in [self.file, *self.lump_files.values()]:
+            try:
+                mapped_file.close()
+            except BufferError:
+                pass  # a lump view is still alive; unmapped when collected
+
+    @classmethod
+    def from_file(cls, filepath: str) -> MappedBsp:
+        try:
+            out = cls(filepath)
+        except ValueError:  # can't mmap an empty file
+            raise RuntimeError(f"{os.path.basename(filepath)} is not a RespawnBsp! file is empty")
+        try:
+            file_magic, version, revision, lump_count = struct.unpack_from("<4s3I", out.file, 0)
+        except struct.error:
+            out.close()
+            raise RuntimeError(f"{out.filename} is not a RespawnBsp! file is too short")
+        if file_magic != b"rBSP":
+            out.close()
+            raise RuntimeError(f"{out.filename} is not a RespawnBsp! file_magic is incorrect")
+        if version > 0xFFFF:  # Apex Legends Season 11+
+            version = (version & 0xFFFF, version >> 16)  # major, minor
+        out.version = version
+        out.revision = revision
+        try:
+            out.branch = bsp_tool.branches.identify[(file_magic, version)]
+        except KeyError:
+            out.close()
+            raise RuntimeError(f"{out.filename} has an unknown rBSP version: {version}")
+        for lump in out.branch.LUMP:
+            out.headers[lump.name] = LumpHeader(
+                *struct.unpack_from("<4I", out.file, 16 + 16 * lump.value))
+            # .bsp_lump files override the .bsp
+            for extension in ("bsp_lump", "bsp_lump.client"):
+                lump_file = out.external_file(f"{out.filename}.{lump.value:04x}.{extension}")
+                if lump_file is not None and os.path.getsize(lump_file) != 0:
+                    with open(lump_file, "rb") as external_lump:
+                        out.lump_files[lump.name] = mmap.mmap(
+                            external_lump.fileno(), 0, access=mmap.ACCESS_READ)
+                    break
+        return out
@@ -1,12 +1,17 @@
 __all__ = [
-    "complete", "matl", "utils", "vmt", "wld",
+    "complete", "decode", "groups", "images", "matl", "prefetch", "utils",
+    "vmt", "wld",
     "all_materials",
     "placeholder", "search",
     "MATL", "VMT",
     "WorldMaterial"]
 
 from . import complete
+from . import decode
+from . import groups
+from . import images
 from . import matl
+from . import prefetch
 from . import utils
 from . import vmt
 from . import wld
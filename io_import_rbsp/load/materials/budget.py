@@ -0,0 +1,43 @@
+"""pick a mip for each texture to fit a resolution cap / memory budget"""
+import heapq
+from typing import Dict, Hashable
+
+from .decode import Surface, mip_size
+
+
+def image_bytes(surface: Surface, mip: int) -> int:
+    """blender's pixel buffer; 4 bytes per pixel, or 16 for float images"""
+    width, height = mip_size(surface.width, surface.height, mip)
+    return width * height * (16 if surface.format == "RGBA16F" else 4)
+
+
+def capped_mip(surface: Surface, max_size: int) -> int:
+    """first mip w/ neither side over max_size; 0 if max_size is 0"""
+    mip = 0
+    if max_size > 0:
+        while max(mip_size(surface.width, surface.height, mip)) > max(max_size, 1):
+            mip += 1
+    return mip
+
+
+def choose_mips(surfaces: Dict[Hashable, Surface], max_size: int = 0, budget: int = 0) -> Dict[Hashable, int]:
+    """{key: Surface} -> {key: mip}
+    max_size: largest width or height; 0 for no cap
+    budget: total bytes of image pixels; 0 for no budget
+    NOTE: the largest texture is halved until everything fits"""
+    mips = {key: capped_mip(surface, max_size) for key, surface in surfaces.items()}
+    if budget <= 0:
+        return mips
+    total = sum(image_bytes(surfaces[key], mip) for key, mip in mips.items())
+    heap = [(-image_bytes(surfaces[key], mip), key) for key, mip in mips.items()]
+    heapq.heapify(heap)
+    while total > budget and len(heap) > 0:
+        _, key = heapq.heappop(heap)
+        surface, mip = surfaces[key], mips[key]
+        if mip_size(surface.width, surface.height, mip) == (1, 1):
+            continue  # can't get any smaller
+        old_bytes, new_bytes = image_bytes(surface, mip), image_bytes(surface, mip + 1)
+        mips[key] = mip + 1
+        total += new_bytes - old_bytes
+        heapq.heappush(heap, (-new_bytes, key))
+    return mips
@@ -1,15 +1,51 @@
+from typing import Dict
+
 import bpy
 
+from . import images, matl, vmt
 from .wld import WorldMaterial
+from ..utils import run, scaled, Steps
 # from .fix import FixMaterial
 
 
-def all_materials():
+def placeholders():
     for material in bpy.data.materials:
         if "is_placeholder" not in material:
             continue  # already loaded
         if "asset_path" not in material:
             continue  # not one of our placeholders
+        yield material
+
+
+def texture_files(asset_path: str, shader_type: str) -> Dict[str, str]:
+    """{texture asset_path: "full path"} WorldMaterial.nodeify would load"""
+    files = vmt.texture_files(asset_path)
+    if len(files) > 0:  # nodeify tries .vmt first
+        return files
+    json_ = matl.read_json(asset_path, shader_type)
+    return matl.texture_files(json_) if json_ is not None else dict()
+
+
+def all_materials(*args, **kwargs):
+    """material_steps, all at once"""
+    run(material_steps(*args, **kwargs))
+
+
+def material_steps(max_workers: int = 4, max_size: int = 0, budget: int = 0) -> Steps:
+    """yields as textures are decoded, then as each material is made
+    max_workers: textures decoded in parallel, before any nodes are made
+    max_size: largest texture width or height; 0 for full resolution
+    budget: MiB of new texture pixels; larger textures use smaller mips to fit"""
+    files = dict()
+    for material in placeholders():
+        shader_type = material.get("shader_type", None)
+        if shader_type == "wld":
+            files.update(texture_files(material["asset_path"], shader_type))
+    # NOTE: nodeify finds these in the image_registry
+    yield from scaled(images.load_image_steps(files, max_workers, max_size, budget * 2 ** 20), 0, 0.8)
+    materials = list(placeholders())
+    for i, material in enumerate(materials):
+        yield 0.8 + i / len(materials) / 5
         shader_type = material.get("shader_type", None)
         if shader_type == "wld":
             WorldMaterial.nodeify(material)
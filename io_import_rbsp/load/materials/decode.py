@@ -0,0 +1,342 @@
+# NOTE: no bpy imports! only numpy; runs on texture pool threads
+import struct
+from typing import Callable, Dict, List, NamedTuple, Tuple
+
+import numpy as np
+
+
+class Decoded(NamedTuple):
+    width: int
+    height: int
+    mip: int  # 0 is full resolution
+    pixels: np.ndarray  # float32 (height, width, 4) RGBA; bottom row first, like bpy
+    is_float: bool  # HDR; needs a float_buffer image
+
+
+class Surface(NamedTuple):
+    format: str  # key of formats
+    width: int  # of mip 0
+    height: int
+    mips: List[int]  # offset of each mip; mips[0] is full resolution
+
+
+# block decoders: uint8 (num_blocks, block_bytes) -> float32 (num_blocks, 16, 4)
+
+
+def rgb565(colours: np.ndarray) -> np.ndarray:
+    """uint16 (n,) -> float32 (n, 3)"""
+    return np.stack([
+        (colours >> 11) & 0x1F,
+        (colours >> 5) & 0x3F,
+        colours & 0x1F], axis=-1) / np.array([31, 63, 31], dtype=np.float32)
+
+
+def colour_blocks(blocks: np.ndarray, punchthrough: bool = False, always_four: bool = False) -> np.ndarray:
+    """BC1 colour; c0 <= c1 picks 3 colours + black
+    punchthrough: that black is transparent (BC1A)
+    always_four: BC2 & BC3 colour blocks ignore endpoint order"""
+    endpoints = blocks[:, 0:4].copy().view("<u2")  # (n, 2)
+    indices = blocks[:, 4:8].copy().view("<u4")[:, 0]
+    c0, c1 = rgb565(endpoints[:, 0]), rgb565(endpoints[:, 1])
+    four_colour = (endpoints[:, 0] > endpoints[:, 1])[:, np.newaxis]
+    if always_four:
+        four_colour = np.ones_like(four_colour)
+    palette = np.empty((len(blocks), 4, 4), dtype=np.float32)
+    palette[:, 0, :3] = c0
+    palette[:, 1, :3] = c1
+    palette[:, 2, :3] = np.where(four_colour, (2 * c0 + c1) / 3, (c0 + c1) / 2)
+    palette[:, 3, :3] = np.where(four_colour, (c0 + 2 * c1) / 3, 0)
+    palette[:, :, 3] = 1
+    if punchthrough:
+        palette[:, 3, 3] = np.where(four_colour[:, 0], 1, 0)
+    selectors = (indices[:, np.newaxis] >> (2 * np.arange(16, dtype=np.uint32))) & 3
+    return np.take_along_axis(palette, selectors[..., np.newaxis].astype(np.int64), axis=1)
+
+
+def channel_blocks(blocks: np.ndarray, signed: bool = False) -> np.ndarray:
+    """BC4 / BC3 alpha; uint8 (n, 8) -> float32 (n, 16)
+    signed: SNORM endpoints (-127 to 127); remapped to 0-1 like UNORM"""
+    if signed:
+        # NOTE: -128 is clamped to -127
+        lo, hi = -127, 127
+        endpoints = np.maximum(blocks[:, :2].view(np.int8), lo)
+    else:
+        lo, hi = 0, 255
+        endpoints = blocks[:, :2]
+    a0, a1 = endpoints[:, 0].astype(np.float32), endpoints[:, 1].astype(np.float32)
+    eight = (a0 > a1)[:, np.newaxis]
+    steps = np.arange(1, 7, dtype=np.float32)
+    lerp8 = (a0[:, np.newaxis] * (7 - steps) + a1[:, np.newaxis] * steps) / 7
+    lerp6 = (a0[:, np.newaxis] * (5 - steps[:4]) + a1[:, np.newaxis] * steps[:4]) / 5
+    six = np.concatenate([lerp6, np.full((len(blocks), 1), lo), np.full((len(blocks), 1), hi)], axis=1)
+    palette = np.concatenate([a0[:, np.newaxis], a1[:, np.newaxis], np.where(eight, lerp8, six)], axis=1)
+    bits = np.zeros(len(blocks), dtype=np.uint64)
+    for i in range(6):  # 48 bits of 3-bit selectors
+        bits |= blocks[:, 2 + i].astype(np.uint64) << np.uint64(8 * i)
+    selectors = (bits[:, np.newaxis] >> (3 * np.arange(16, dtype=np.uint64))) & np.uint64(7)
+    return (np.take_along_axis(palette, selectors.astype(np.int64), axis=1) - lo) / (hi - lo)
+
+
+def bc1(blocks: np.ndarray) -> np.ndarray:
+    return colour_blocks(blocks, punchthrough=False)
+
+
+def bc1a(blocks: np.ndarray) -> np.ndarray:
+    return colour_blocks(blocks, punchthrough=True)
+
+
+def bc2(blocks: np.ndarray) -> np.ndarray:
+    out = colour_blocks(blocks[:, 8:], always_four=True)
+    alpha = blocks[:, :8].copy().view("<u8")[:, 0]
+    out[..., 3] = ((alpha[:, np.newaxis] >> (4 * np.arange(16, dtype=np.uint64))) & np.uint64(0xF)) / 15
+    return out
+
+
+def bc3(blocks: np.ndarray) -> np.ndarray:
+    out = colour_blocks(blocks[:, 8:], always_four=True)
+    out[..., 3] = channel_blocks(blocks[:, :8])
+    return out
+
+
+def bc4(blocks: np.ndarray, signed: bool = False) -> np.ndarray:
+    red = channel_blocks(blocks, signed)
+    return np.stack([red, red, red, np.ones_like(red)], axis=-1)
+
+
+def bc4s(blocks: np.ndarray) -> np.ndarray:
+    return bc4(blocks, signed=True)
+
+
+def bc5(blocks: np.ndarray, signed: bool = False) -> np.ndarray:
+    """tangent-space normals; blue is rebuilt from red & green"""
+    red, green = channel_blocks(blocks[:, :8], signed), channel_blocks(blocks[:, 8:], signed)
+    x, y = red * 2 - 1, green * 2 - 1
+    blue = np.sqrt(np.clip(1 - x * x - y * y, 0, 1)) / 2 + 0.5
+    return np.stack([red, green, blue, np.ones_like(red)], axis=-1)
+
+
+def bc5s(blocks: np.ndarray) -> np.ndarray:
+    return bc5(blocks, signed=True)
+
+
+block_formats: Dict[str, Tuple[int, Callable]] = {
+    "BC1": (8, bc1), "BC1A": (8, bc1a), "BC2": (16, bc2),
+    "BC3": (16, bc3), "BC4": (8, bc4), "BC4S": (8, bc4s),
+    "BC5": (16, bc5), "BC5S": (16, bc5s)}
+# ^ {"format": (block_bytes, decoder)}
+
+texel_formats: Dict[str, Tuple[str, Tuple[int, ...]]] = {
+    "RGBA8888": ("4u1", (0, 1, 2, 3)),
+    "ABGR8888": ("4u1", (3, 2, 1, 0)),
+    "ARGB8888": ("4u1", (1, 2, 3, 0)),
+    "BGRA8888": ("4u1", (2, 1, 0, 3)),
+    "BGRX8888": ("4u1", (2, 1, 0, -1)),
+    "RGB888": ("3u1", (0, 1, 2, -1)),
+    "BGR888": ("3u1", (2, 1, 0, -1)),
+    "I8": ("1u1", (0, 0, 0, -1)),
+    "IA88": ("2u1", (0, 0, 0, 1)),
+    "A8": ("1u1", (-1, -1, -1, 0)),
+    "RGBA16F": ("4<f2", (0, 1, 2, 3))}
+# ^ {"format": ("channels & numpy type", RGBA source channels; -1 is 1.0)}
+
+
+def mip_bytes(format: str, width: int, height: int) -> int:
+    if format in block_formats:
+        block_bytes = block_formats[format][0]
+        return max(1, (width + 3) // 4) * max(1, (height + 3) // 4) * block_bytes
+    type_ = texel_formats[format][0]
+    return width * height * int(type_[0]) * np.dtype(type_[1:]).itemsize
+
+
+def mip_size(width: int, height: int, mip: int) -> Tuple[int, int]:
+    return max(1, width >> mip), max(1, height >> mip)
+
+
+def decode_mip(data: memoryview, format: str, width: int, height: int) -> np.ndarray:
+    """one mip -> float32 (height, width, 4); top row first"""
+    if format in block_formats:
+        block_bytes, decoder = block_formats[format]
+        blocks_wide, blocks_high = max(1, (width + 3) // 4), max(1, (height + 3) // 4)
+        blocks = np.frombuffer(data, dtype=np.uint8, count=blocks_wide * blocks_high * block_bytes)
+        texels = decoder(blocks.reshape(-1, block_bytes)).astype(np.float32)
+        # (blocks_high, blocks_wide, 4 rows, 4 columns, RGBA) -> rows of texels
+        texels = texels.reshape(blocks_high, blocks_wide, 4, 4, 4).transpose(0, 2, 1, 3, 4)
+        return texels.reshape(blocks_high * 4, blocks_wide * 4, 4)[:height, :width]
+    type_, sources = texel_formats[format]
+    num_channels, scalar = int(type_[0]), np.dtype(type_[1:])
+    texels = np.frombuffer(data, dtype=scalar, count=width * height * num_channels)
+    texels = texels.reshape(height, width, num_channels)
+    scale = 255 if scalar == np.uint8 else 1
+    out = np.ones((height, width, 4), dtype=np.float32)
+    for channel, source in enumerate(sources):
+        if source != -1:
+            out[..., channel] = texels[..., source] / scale
+    return out
+
+
+# VTF
+
+
+vtf_formats = {
+    0: "RGBA8888", 1: "ABGR8888", 2: "RGB888", 3: "BGR888", 5: "I8", 6: "IA88",
+    8: "A8", 11: "ARGB8888", 12: "BGRA8888", 13: "BC1", 14: "BC2", 15: "BC3",
+    16: "BGRX8888", 20: "BC1A", 24: "RGBA16F", 37: "BC5", 38: "BC4"}
+# ^ {IMAGE_FORMAT: "format"}; see Source SDK imageformat.h
+
+vtf_header = struct.Struct("<4s2II2HI2H4x3f4xfiBiBBH3xI8x")
+# ^ 7.3+; older headers stop early (after low_res_height or depth)
+
+
+def parse_vtf(data: memoryview, header_only: bool = False) -> Surface:
+    """first frame, face & slice of each mip; None if unsupported
+    header_only: data is just the header; don't check for truncation"""
+    if bytes(data[:4]) != b"VTF\0":
+        return None
+    padded = bytes(data[:vtf_header.size]).ljust(vtf_header.size, b"\0")
+    (_, major, minor, header_size, width, height, flags, frames, first_frame,
+     *reflectivity, bumpmap_scale, format_index, num_mips, low_res_format_index,
+     low_res_width, low_res_height, depth, num_resources) = vtf_header.unpack(padded)
+    format = vtf_formats.get(format_index, None)
+    if format is None:
+        return None
+    version = (major, minor)
+    if version < (7, 2):
+        depth = 1
+    depth = max(depth, 1)
+    num_faces = 1
+    if flags & 0x4000:  # TEXTUREFLAGS_ENVMAP
+        # NOTE: before 7.5, first_frame == -1 means a 7th (spheremap) face
+        num_faces = 7 if version < (7, 5) and first_frame == 0xFFFF else 6
+    high_res_offset = None
+    if version >= (7, 3):
+        for i in range(num_resources):
+            tag, resource_offset = struct.unpack_from("<3s1xI", data, vtf_header.size + i * 8)
+            if tag == b"\x30\0\0":  # high res image
+                high_res_offset = resource_offset
+    if high_res_offset is None:  # follows the low res thumbnail
+        low_res_format = vtf_formats.get(low_res_format_index, None)
+        low_res_bytes = 0
+        if low_res_format is not None and low_res_width * low_res_height != 0:
+            low_res_bytes = mip_bytes(low_res_format, low_res_width, low_res_height)
+        high_res_offset = header_size + low_res_bytes
+    # NOTE: mips are stored smallest first; each holds every frame, face & slice
+    mip_offsets = [0] * num_mips
+    offset = high_res_offset
+    for mip in reversed(range(num_mips)):
+        mip_offsets[mip] = offset
+        mip_width, mip_height = mip_size(width, height, mip)
+        mip_depth = max(1, depth >> mip)
+        offset += frames * num_faces * mip_depth * mip_bytes(format, mip_width, mip_height)
+    if offset > len(data) and not header_only:
+        return None  # truncated
+    return Surface(format, width, height, mip_offsets)
+
+
+# DDS
+
+
+dds_four_ccs = {
+    b"DXT1": "BC1A", b"DXT2": "BC2", b"DXT3": "BC2", b"DXT4": "BC3", b"DXT5": "BC3",
+    b"ATI1": "BC4", b"BC4U": "BC4", b"BC4S": "BC4S",
+    b"ATI2": "BC5", b"BC5U": "BC5", b"BC5S": "BC5S"}
+
+dxgi_formats = {
+    10: "RGBA16F", 28: "RGBA8888", 29: "RGBA8888", 71: "BC1A", 72: "BC1A",
+    74: "BC2", 75: "BC2", 77: "BC3", 78: "BC3", 80: "BC4", 81: "BC4S",
+    83: "BC5", 84: "BC5S", 87: "BGRA8888", 88: "BGRX8888", 91: "BGRA8888", 93: "BGRX8888"}
+# ^ {DXGI_FORMAT: "format"}; no BC6H / BC7 yet
+
+
+def parse_dds(data: memoryview, header_only: bool = False) -> Surface:
+    """first surface of each mip; None if unsupported
+    header_only: data is just the header; don't check for truncation"""
+    if bytes(data[:4]) != b"DDS " or len(data) < 128:
+        return None
+    height, width = struct.unpack_from("<2I", data, 12)
+    num_mips = max(1, struct.unpack_from("<I", data, 28)[0])
+    pixel_flags, four_cc, bit_count, red_mask, green_mask, blue_mask, alpha_mask = struct.unpack_from(
+        "<I4s5I", data, 80)
+    offset = 128
+    if pixel_flags & 0x4:  # DDPF_FOURCC
+        if four_cc == b"DX10":
+            format = dxgi_formats.get(struct.unpack_from("<I", data, 128)[0], None)
+            offset += 20
+        else:
+            format = dds_four_ccs.get(four_cc, None)
+    elif pixel_flags & 0x40:  # DDPF_RGB
+        has_alpha = pixel_flags & 0x1 and alpha_mask != 0
+        format = {
+            (32, 0x00FF0000): "BGRA8888" if has_alpha else "BGRX8888",
+            (32, 0x000000FF): "RGBA8888",
+            (24, 0x00FF0000): "BGR888",
+            (24, 0x000000FF): "RGB888"}.get((bit_count, red_mask), None)
+    elif pixel_flags & 0x20000 and bit_count == 8:  # DDPF_LUMINANCE
+        format = "I8"
+    else:
+        format = None
+    if format is None:
+        return None
+    # NOTE: mips are stored largest first; later surfaces (cubemap faces, array slices) follow
+    mip_offsets = list()
+    for mip in range(num_mips):
+        mip_offsets.append(offset)
+        offset += mip_bytes(format, *mip_size(width, height, mip))
+    if offset > len(data) and not header_only:
+        return None  # truncated
+    return Surface(format, width, height, mip_offsets)
+
+
+def parse(data: memoryview, header_only: bool = False) -> Surface:
+    try:
+        if bytes(data[:4]) == b"VTF\0":
+            return parse_vtf(data, header_only)
+        return parse_dds(data, header_only)
+    except struct.error:  # truncated header
+        return None
+
+
+def probe_file(filepath: str) -> Surface:
+    """read just enough of a .vtf or .dds to know its size & format"""
+    with open(filepath, "rb") as texture_file:
+        data = texture_file.read(148)  # DDS w/ DX10 header
+        if data[:4] == b"VTF\0" and len(data) >= 16:
+            header_size = struct.unpack_from("<I", data, 12)[0]
+            data += texture_file.read(max(0, header_size - len(data)))
+    return parse(memoryview(data), header_only=True)
+
+
+def halve(pixels: np.ndarray) -> np.ndarray:
+    """box filter (height, width, 4) to the next mip; odd rows / columns are dropped"""
+    height, width = pixels.shape[:2]
+    if height > 1:
+        pixels = pixels[:height // 2 * 2].reshape(height // 2, 2, -1, 4).mean(axis=1)
+    if width > 1:
+        pixels = pixels[:, :width // 2 * 2].reshape(pixels.shape[0], width // 2, 2, 4).mean(axis=2)
+    return pixels
+
+
+def decode(data: memoryview, mip: int = 0) -> Decoded:
+    """.vtf or .dds bytes -> one mip; None if unsupported
+    NOTE: mips smaller than any stored are downsampled from the smallest"""
+    surface = parse(data)
+    if surface is None or len(surface.mips) == 0:
+        return None
+    mip = max(mip, 0)
+    stored_mip = min(mip, len(surface.mips) - 1)
+    width, height = mip_size(surface.width, surface.height, stored_mip)
+    pixels = decode_mip(data[surface.mips[stored_mip]:], surface.format, width, height)
+    for _ in range(mip - stored_mip):
+        pixels = halve(pixels)
+    height, width = pixels.shape[:2]
+    pixels = np.ascontiguousarray(pixels[::-1], dtype=np.float32)
+    return Decoded(width, height, mip, pixels, surface.format == "RGBA16F")
+
+
+errors = (OSError, ValueError, IndexError, struct.error)
+# ^ unreadable, truncated or malformed files; skip the texture, not the import
+
+
+def decode_file(filepath: str, mip: int = 0) -> Decoded:
+    with open(filepath, "rb") as texture_file:
+        data = texture_file.read()
+    return decode(memoryview(data), mip)
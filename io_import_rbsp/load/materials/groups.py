@@ -0,0 +1,180 @@
+from typing import Callable
+
+import bpy
+from bpy.types import ShaderNodeTree
+
+
+# NOTE: built once per .blend & shared by every material
+# -- delete a group from the .blend to rebuild it on the next import
+def node_group(name: str, builder: Callable[[ShaderNodeTree], None]) -> ShaderNodeTree:
+    if name in bpy.data.node_groups:
+        return bpy.data.node_groups[name]
+    tree = bpy.data.node_groups.new(name, "ShaderNodeTree")
+    builder(tree)
+    return tree
+
+
+def new_socket(tree, in_out: str, name: str, socket_type: str, default=None):
+    socket = tree.interface.new_socket(
+        name, in_out=in_out, socket_type=f"NodeSocket{socket_type}")
+    if default is not None:
+        socket.default_value = default
+    return socket
+
+
+def new_group_node(tree, group: ShaderNodeTree):
+    node = tree.nodes.new("ShaderNodeGroup")
+    node.node_tree = group
+    node.label = group.name
+    return node
+
+
+def input_output(tree, x: int = 600):
+    group_input = tree.nodes.new("NodeGroupInput")
+    group_input.location = (-x, 0)
+    group_output = tree.nodes.new("NodeGroupOutput")
+    group_output.location = (x, 0)
+    return group_input, group_output
+
+
+def new_mixer(tree, mode: str, fac: float = 1):
+    mix_node = tree.nodes.new("ShaderNodeMix")
+    mix_node.data_type = "RGBA"
+    mix_node.blend_type = mode
+    mix_node.inputs[0].default_value = fac
+    return mix_node
+
+
+# defaults match an unlinked Principled BSDF where possible
+grey = (0.8, 0.8, 0.8, 1.0)
+half = (0.5, 0.5, 0.5, 1.0)
+flat_normal = (0.5, 0.5, 1.0, 1.0)
+white = (1.0, 1.0, 1.0, 1.0)
+
+
+def build_albedo(tree):
+    """albedo x vertex colour"""
+    new_socket(tree, "INPUT", "Albedo", "Color", grey)
+    new_socket(tree, "OUTPUT", "Color", "Color")
+    group_input, group_output = input_output(tree)
+    vertex_colour = tree.nodes.new("ShaderNodeVertexColor")
+    colour_mix = new_mixer(tree, "MULTIPLY")
+    tree.links.new(vertex_colour.outputs["Color"], colour_mix.inputs["A"])
+    tree.links.new(group_input.outputs["Albedo"], colour_mix.inputs["B"])
+    tree.links.new(colour_mix.outputs["Result"], group_output.inputs["Color"])
+
+
+def build_gloss(tree):
+    """inverse of roughness"""
+    new_socket(tree, "INPUT", "Gloss", "Color", half)
+    new_socket(tree, "OUTPUT", "Roughness", "Float")
+    group_input, group_output = input_output(tree)
+    invert = tree.nodes.new("ShaderNodeInvert")
+    tree.links.new(group_input.outputs["Gloss"], invert.inputs["Color"])
+    tree.links.new(invert.outputs["Color"], group_output.inputs["Roughness"])
+
+
+def build_blend(tree):
+    """quick & dirty blend modulate approximation"""
+    new_socket(tree, "INPUT", "Blend Mask", "Color", half)
+    new_socket(tree, "OUTPUT", "Factor", "Float")
+    group_input, group_output = input_output(tree)
+    vertex_colour = tree.nodes.new("ShaderNodeVertexColor")
+    # quick & dirty blend math that looks good enough
+    mix_node = new_mixer(tree, "MIX")
+    add_node = new_mixer(tree, "ADD")
+    sub_node = new_mixer(tree, "SUBTRACT")
+    mask = group_input.outputs["Blend Mask"]
+    tree.links.new(vertex_colour.outputs["Alpha"], add_node.inputs["A"])
+    tree.links.new(mask, add_node.inputs["B"])
+    tree.links.new(vertex_colour.outputs["Alpha"], sub_node.inputs["A"])
+    tree.links.new(mask, sub_node.inputs["B"])
+    tree.links.new(vertex_colour.outputs["Alpha"], mix_node.inputs["Factor"])
+    tree.links.new(sub_node.outputs["Result"], mix_node.inputs["A"])
+    tree.links.new(add_node.outputs["Result"], mix_node.inputs["B"])
+    tree.links.new(mix_node.outputs["Result"], group_output.inputs["Factor"])
+
+
+layer_inputs = {
+    "Albedo": ("Color", grey),
+    "Alpha": ("Float", 1.0),
+    "Specular": ("Color", white),
+    "Gloss": ("Color", half),
+    "Normal": ("Color", flat_normal),
+    "Emission": ("Color", white),
+    "Emission Strength": ("Float", 0.0)}
+# ^ {"name": ("socket_type", default)}
+
+
+def build_layer(tree):
+    """one Principled BSDF fed by raw texture colours"""
+    for name, (socket_type, default) in layer_inputs.items():
+        new_socket(tree, "INPUT", name, socket_type, default)
+    new_socket(tree, "OUTPUT", "BSDF", "Shader")
+    group_input, group_output = input_output(tree)
+    shader = tree.nodes.new("ShaderNodeBsdfPrincipled")
+    albedo = new_group_node(tree, albedo_group())
+    gloss = new_group_node(tree, gloss_group())
+    normal_map = tree.nodes.new("ShaderNodeNormalMap")
+    links = [
+        (group_input, "Albedo", albedo, "Albedo"),
+        (albedo, "Color", shader, "Base Color"),
+        (group_input, "Alpha", shader, "Alpha"),
+        (group_input, "Specular", shader, "Specular Tint"),
+        (group_input, "Gloss", gloss, "Gloss"),
+        (gloss, "Roughness", shader, "Roughness"),
+        (group_input, "Normal", normal_map, "Color"),
+        (normal_map, "Normal", shader, "Normal"),
+        (group_input, "Emission", shader, "Emission Color"),
+        (group_input, "Emission Strength", shader, "Emission Strength"),
+        (shader, "BSDF", group_output, "BSDF")]
+    for out_node, out_slot, in_node, in_slot in links:
+        tree.links.new(out_node.outputs[out_slot], in_node.inputs[in_slot])
+
+
+def build_two_layer(tree):
+    """two layers mixed by a blend mask & vertex alpha (_bm_wld)"""
+    for name, (socket_type, default) in layer_inputs.items():
+        new_socket(tree, "INPUT", name, socket_type, default)
+    for name in ("Albedo", "Alpha", "Specular", "Gloss", "Normal"):
+        socket_type, default = layer_inputs[name]
+        new_socket(tree, "INPUT", f"{name} 2", socket_type, default)
+    new_socket(tree, "INPUT", "Blend Mask", "Color", half)
+    new_socket(tree, "OUTPUT", "Shader", "Shader")
+    group_input, group_output = input_output(tree)
+    layer_a = new_group_node(tree, layer_group())
+    layer_a.location = (0, 300)
+    layer_b = new_group_node(tree, layer_group())
+    layer_b.location = (0, -300)
+    for name in layer_inputs:
+        tree.links.new(group_input.outputs[name], layer_a.inputs[name])
+    for name in ("Albedo", "Alpha", "Specular", "Gloss", "Normal"):
+        tree.links.new(group_input.outputs[f"{name} 2"], layer_b.inputs[name])
+    blend = new_group_node(tree, blend_group())
+    mix_shader = tree.nodes.new("ShaderNodeMixShader")
+    mix_shader.location = (300, 0)
+    tree.links.new(group_input.outputs["Blend Mask"], blend.inputs["Blend Mask"])
+    tree.links.new(blend.outputs["Factor"], mix_shader.inputs["Fac"])
+    tree.links.new(layer_a.outputs["BSDF"], mix_shader.inputs[1])
+    tree.links.new(layer_b.outputs["BSDF"], mix_shader.inputs[2])
+    tree.links.new(mix_shader.outputs["Shader"], group_output.inputs["Shader"])
+
+
+def albedo_group() -> ShaderNodeTree:
+    return node_group("rBSP Albedo x Vertex Colour", build_albedo)
+
+
+def gloss_group() -> ShaderNodeTree:
+    return node_group("rBSP Gloss -> Roughness", build_gloss)
+
+
+def blend_group() -> ShaderNodeTree:
+    return node_group("rBSP Blend Modulate", build_blend)
+
+
+def layer_group() -> ShaderNodeTree:
+    return node_group("rBSP World Layer", build_layer)
+
+
+def two_layer_group() -> ShaderNodeTree:
+    return node_group("rBSP World Blend", build_two_layer)
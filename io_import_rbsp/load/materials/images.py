@@ -0,0 +1,177 @@
+"""decoded .vtf & .dds -> bpy images; no temporary files"""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import os
+from typing import Dict
+
+import bpy
+from bpy.app.handlers import persistent
+from bpy.types import Image
+
+from . import budget, decode
+from .utils import clear_registries, image_registry
+from ..utils import run, Steps
+
+
+def new_image(name: str, decoded: decode.Decoded) -> Image:
+    image = bpy.data.images.new(
+        name, decoded.width, decoded.height, alpha=True, float_buffer=decoded.is_float)
+    image.pixels.foreach_set(decoded.pixels.ravel())
+    return image
+
+
+def add_image(asset_path: str, filepath: str, decoded: decode.Decoded, mip: int = 0) -> Image:
+    """create & register; None if blender can't load it either
+    mip: for files we can't decode; blender scales the full image down"""
+    if decoded is not None:
+        image = new_image(os.path.basename(filepath), decoded)
+        image["mip"] = decoded.mip
+    elif filepath.lower().endswith(".dds"):  # e.g. BC7 or malformed; let blender try
+        try:
+            image = bpy.data.images.load(filepath)
+        except RuntimeError:
+            return None  # blender can't read it either
+        image["mip"] = mip
+        if mip > 0:
+            image.scale(*decode.mip_size(*image.size, mip))
+    else:
+        return None  # unsupported .vtf format
+    image["asset_path"] = asset_path
+    image["source_path"] = filepath
+    image_registry.add(image)
+    return image
+
+
+def load_image(filepath: str, asset_path: str, max_size: int = 0) -> Image:
+    """decode on this thread
+    max_size: largest width or height; 0 for full resolution"""
+    mip = 0
+    if max_size > 0:
+        surface = probe(filepath)
+        if surface is not None:
+            mip = budget.capped_mip(surface, max_size)
+    try:
+        decoded = decode.decode_file(filepath, mip)
+    except decode.errors:
+        decoded = None
+    return add_image(asset_path, filepath, decoded, mip)
+
+
+def load_images(*args, **kwargs) -> Dict[str, Image]:
+    """load_image_steps, all at once"""
+    return run(load_image_steps(*args, **kwargs))
+
+
+def load_image_steps(files: Dict[str, str], max_workers: int = 4,
+                     max_size: int = 0, budget_bytes: int = 0) -> Steps:
+    """{asset_path: filepath} -> {asset_path: Image}; decoded in parallel
+    yields as each image is made
+    max_size: largest width or height; 0 for full resolution
+    budget_bytes: total bytes of new images' pixels; 0 for no budget
+    NOTE: bpy isn't thread-safe; images are made on this thread as results arrive"""
+    out = dict()
+    queue = list()
+    for asset_path, filepath in files.items():
+        image = image_registry.get(asset_path)
+        if image is not None:
+            out[asset_path] = image
+        else:
+            queue.append((asset_path, filepath))
+    if len(queue) == 0:
+        return out
+    num_images = len(queue)
+    # NOTE: if closed early, only decodes in flight are waited for
+    with ThreadPoolExecutor(max_workers, thread_name_prefix="rbsp_decode") as pool:
+        mips = dict()
+        # ^ {asset_path: mip}
+        if max_size > 0 or budget_bytes > 0:
+            surfaces = dict(zip(
+                [asset_path for asset_path, filepath in queue],
+                pool.map(probe, [filepath for asset_path, filepath in queue])))
+            mips = budget.choose_mips({
+                asset_path: surface
+                for asset_path, surface in surfaces.items()
+                if surface is not None}, max_size, budget_bytes)
+        pending = dict()
+        # ^ {Future[Decoded]: (asset_path, filepath, mip)}
+        queue.reverse()  # pop in order
+        while len(queue) > 0 or len(pending) > 0:
+            # NOTE: decoded pixels are float32; only keep a few in flight at once
+            while len(queue) > 0 and len(pending) < max_workers * 2:
+                asset_path, filepath = queue.pop()
+                mip = mips.get(asset_path, 0)
+                pending[pool.submit(decode.decode_file, filepath, mip)] = (asset_path, filepath, mip)
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                asset_path, filepath, mip = pending.pop(future)
+                try:
+                    decoded = future.result()
+                except decode.errors:
+                    decoded = None  # add_image falls back to blender's loader, or skips it
+                image = add_image(asset_path, filepath, decoded, mip)
+                if image is not None:
+                    out[asset_path] = image
+            yield 1 - (len(queue) + len(pending)) / num_images
+    return out
+
+
+def probe(filepath: str) -> decode.Surface:
+    try:
+        return decode.probe_file(filepath)
+    except decode.errors:
+        return None
+
+
+def upgrade(image: Image) -> bool:
+    """reload a reduced image at full resolution; False if already full or unreadable"""
+    if image.get("mip", 0) == 0 or "source_path" not in image:
+        return False
+    if image.source == "FILE" and image.packed_file is None:  # scaled down by blender
+        image.reload()
+    else:
+        try:
+            decoded = decode.decode_file(image["source_path"])
+        except decode.errors:
+            return False
+        if decoded is None:
+            return False
+        image.scale(decoded.width, decoded.height)
+        image.pixels.foreach_set(decoded.pixels.ravel())
+        if image.packed_file is not None:
+            image.pack()  # replace the reduced pixels
+    image["mip"] = 0
+    return True
+
+
+def is_decoded(image: Image) -> bool:
+    return "source_path" in image and image.source == "GENERATED"
+
+
+@persistent
+def pack_images(dummy):
+    """keep pixels blender can't reload in the .blend; .vtf & reduced mips"""
+    for image in bpy.data.images:
+        if is_decoded(image) and image.packed_file is None:
+            if image["source_path"].lower().endswith(".vtf") or image.get("mip", 0) > 0:
+                image.pack()
+
+
+@persistent
+def relink_images(dummy):
+    """full resolution .dds are saved w/o pixels; blender can reload them from the file"""
+    for image in bpy.data.images:
+        if is_decoded(image) and image.packed_file is None:
+            if os.path.exists(image["source_path"]):
+                image.filepath = image["source_path"]
+                image.source = "FILE"
+
+
+def register():
+    bpy.app.handlers.save_pre.append(pack_images)
+    bpy.app.handlers.load_post.append(relink_images)
+    bpy.app.handlers.load_post.append(clear_registries)
+
+
+def unregister():
+    bpy.app.handlers.save_pre.remove(pack_images)
+    bpy.app.handlers.load_post.remove(relink_images)
+    bpy.app.handlers.load_post.remove(clear_registries)
@@ -1,30 +1,70 @@
 from __future__ import annotations
+from concurrent.futures import Future
 import json
 import os
-from typing import Dict
+from typing import Dict, Tuple
 
 import bpy
 from bpy.types import ImageTexture
 
-from .utils import search, Slot
+from . import images
+from .utils import image_registry, search, Slot
+
+
+prefetched: Dict[Tuple[str, str], Future] = dict()
+# ^ {(asset_path, type_): Future[json_]}; see prefetch.py
+
+
+def dds_asset_path(asset_path: str) -> str:
+    assert asset_path.endswith(".rpak")
+    return f"{asset_path[:-5]}.dds"
 
 
 # NOTE: if RSX does not export all mips, filenames might not match
-def load_dds(asset_dir: str, asset_path: str) -> ImageTexture:
-    textures = [
-        texture.get("asset_path", None)
-        for texture in bpy.data.images]
-    if asset_path in textures:
-        texture_index = textures.index(asset_path)
-        return bpy.data.images[texture_index]
+def load_dds(asset_dir: str, asset_path: str, max_size: int = 0) -> ImageTexture:
+    """max_size: largest width or height; smaller mips are used to fit"""
+    texture = image_registry.get(asset_path)
+    if texture is not None:
+        return texture
 
     full_path = search(asset_dir, asset_path)
     if full_path is None:
         return None  # file not found
 
-    texture = bpy.data.images.load(full_path)
-    texture["asset_path"] = asset_path
-    return texture
+    return images.load_image(full_path, asset_path, max_size)
+
+
+def read_json(asset_path: str, type_: str) -> Dict:
+    """MATL .json; None if not found
+    NOTE: kept in prefetched until MATL.from_path"""
+    key = (asset_path, type_)
+    if key not in prefetched:
+        rsx_folder = bpy.context.scene.rbsp_prefs.rsx_folder
+        search_folder = os.path.join(rsx_folder, "exported_files/material")
+        json_path = search(search_folder, f"{asset_path}_{type_}.json")
+        future = Future()
+        if json_path is None:
+            future.set_result(None)
+        else:
+            with open(json_path) as json_file:
+                future.set_result(json.load(json_file))
+        prefetched[key] = future
+    return prefetched[key].result()
+
+
+def texture_files(json_: Dict) -> Dict[str, str]:
+    """{".dds asset_path": "full path"} that MATL.from_json would load"""
+    rsx_folder = bpy.context.scene.rbsp_prefs.rsx_folder
+    search_folder = os.path.join(rsx_folder, "exported_files")
+    out = dict()
+    for asset_path in json_.get("$textures", dict()).values():
+        if not asset_path.endswith(".rpak"):
+            continue  # GUID
+        dds_path = dds_asset_path(asset_path)
+        full_path = search(search_folder, dds_path)
+        if full_path is not None:
+            out[dds_path] = full_path
+    return out
 
 
 class MATL:
@@ -32,6 +72,8 @@ class MATL:
     rsx_folder: str
     textures: Dict[Slot, ImageTexture]
     # ^ {Slot.ALBEDO: ImageTexture}
+    max_size: int = 0
+    # ^ largest texture width or height; 0 for full resolution
 
     def __init__(self):
         self.rsx_folder = bpy.context.scene.rbsp_prefs.rsx_folder
@@ -39,20 +81,17 @@ class MATL:
 
     def load_texture(self, slot: Slot, asset_path: str):
         search_folder = os.path.join(self.rsx_folder, "exported_files")
-        assert asset_path.endswith(".rpak")
-        asset_path = f"{asset_path[:-5]}.dds"
-        texture = load_dds(search_folder, asset_path)
+        texture = load_dds(search_folder, dds_asset_path(asset_path), self.max_size)
         if texture is not None:
             self.textures[slot] = texture
         # TODO: error texture w/ asset path
 
     @classmethod
     def from_path(cls, asset_path: str, type_: str) -> MATL:
-        rsx_folder = bpy.context.scene.rbsp_prefs.rsx_folder
-        search_folder = os.path.join(rsx_folder, "exported_files/material")
-        json_path = search(search_folder, f"{asset_path}_{type_}.json")
-        if json_path is not None:
-            return cls.from_file(json_path)
+        json_ = read_json(asset_path, type_)
+        del prefetched[(asset_path, type_)]
+        if json_ is not None:
+            return cls.from_json(json_)
 
     @classmethod
     def from_file(cls, filename: str) -> MATL:
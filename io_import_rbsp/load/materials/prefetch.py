@@ -0,0 +1,80 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import threading
+from typing import Dict, Set
+
+import bpy
+
+from . import matl
+from .utils import asset_index, search
+
+
+pool: ThreadPoolExecutor = None
+warmed: Set[str] = set()
+# ^ {".dds full path"}
+warmed_lock = threading.Lock()
+
+
+def warm(filepath: str):
+    """read a file & throw the bytes away; fills the OS file cache"""
+    with warmed_lock:
+        if filepath in warmed:
+            return
+        warmed.add(filepath)
+    try:
+        with open(filepath, "rb") as file:
+            while len(file.read(2 ** 20)) != 0:
+                pass
+    except OSError:
+        pass  # bpy.data.images.load can report it later
+
+
+def read_matl(exported_files: str, asset_path: str, type_: str, warm_textures: bool) -> Dict:
+    """MATL.from_path w/o touching bpy; runs on pool threads"""
+    material_folder = os.path.join(exported_files, "material")
+    json_path = search(material_folder, f"{asset_path}_{type_}.json")
+    if json_path is None:
+        return None
+    with open(json_path) as json_file:
+        json_ = json.load(json_file)
+    if warm_textures:
+        for texture_path in json_.get("$textures", dict()).values():
+            if not texture_path.endswith(".rpak"):
+                continue  # GUID or unexpected path; MATL.load_texture will decide
+            dds_path = search(exported_files, matl.dds_asset_path(texture_path))
+            if dds_path is not None:
+                warm(dds_path)
+    return json_
+
+
+def start(type_: str = "wld", max_workers: int = 4, warm_textures: bool = True):
+    """start reading MATL .json for every placeholder of type_"""
+    global pool
+    rsx_folder = bpy.context.scene.rbsp_prefs.rsx_folder
+    exported_files = os.path.join(rsx_folder, "exported_files")
+    if not os.path.isdir(exported_files):
+        return  # nothing to prefetch
+    asset_index(exported_files)  # build on this thread, not the pool
+    if pool is None:
+        pool = ThreadPoolExecutor(max_workers, thread_name_prefix="rbsp_prefetch")
+    for material in bpy.data.materials:
+        if "is_placeholder" not in material or "asset_path" not in material:
+            continue  # not one of our placeholders
+        if material.get("shader_type", None) != type_:
+            continue
+        key = (material["asset_path"], type_)
+        if key not in matl.prefetched:
+            matl.prefetched[key] = pool.submit(
+                read_matl, exported_files, *key, warm_textures)
+
+
+def stop():
+    """drop unused results & stop the pool"""
+    global pool
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+        pool = None
+    matl.prefetched.clear()
+    with warmed_lock:
+        warmed.clear()
@@ -2,9 +2,13 @@ from __future__ import annotations
 
 import enum
 import os
+import threading
+import time
+from typing import Any, Callable, Dict, List
 
 import bpy
-from bpy.types import Material
+from bpy.app.handlers import persistent
+from bpy.types import ID, Material
 
 
 tool_colours = {
@@ -46,35 +50,200 @@ class Slot(enum.Enum):
     SPECULAR_2 = 26
 
 
+class AssetIndex:
+    """case-insensitive lookup of every file & folder under folder"""
+    folder: str
+    paths: Dict[str, str]
+    # ^ {"lower/case/relative/path": "/full/Case/Sensitive/Path"}
+    mtimes: Dict[str, int]
+    # ^ {"/full/folder/path": st_mtime_ns}
+    build_time: float  # seconds
+    hits: int
+    misses: int
+    lock: threading.Lock  # guards hits & misses; prefetch threads search too
+
+    def __init__(self, folder: str):
+        self.folder = os.path.normpath(folder)
+        self.paths = dict()
+        self.mtimes = dict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        start = time.perf_counter()
+        self.scan()
+        self.build_time = time.perf_counter() - start
+
+    def __repr__(self) -> str:
+        descriptor = f'"{self.folder}" {len(self.paths)} paths'
+        return f"<{self.__class__.__name__} {descriptor} @ 0x{id(self):016X}>"
+
+    def scan(self):
+        folders = [(self.folder, "")]
+        while len(folders) > 0:
+            folder, prefix = folders.pop()
+            self.mtimes[folder] = os.stat(folder).st_mtime_ns
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    key = prefix + entry.name.lower()
+                    # NOTE: first case-insensitive match wins, like os.listdir order
+                    self.paths.setdefault(key, entry.path)
+                    if entry.is_dir():
+                        folders.append((entry.path, f"{key}/"))
+
+    def is_stale(self) -> bool:
+        """has any indexed folder gained or lost files?"""
+        for folder, mtime in self.mtimes.items():
+            try:
+                if os.stat(folder).st_mtime_ns != mtime:
+                    return True
+            except FileNotFoundError:
+                return True
+        return False
+
+    def find(self, filename: str) -> str:
+        path = self.paths.get(filename.replace("\\", "/").lower(), None)
+        with self.lock:
+            if path is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return path
+
+    def reset_counts(self):
+        with self.lock:
+            self.hits, self.misses = 0, 0
+
+
+indices: Dict[str, AssetIndex] = dict()
+# ^ {"/full/folder/path": AssetIndex}
+indices_lock = threading.RLock()
+# ^ guards indices; held while a missing index is built, so it's only built once
+
+
+def asset_index(folder: str) -> AssetIndex:
+    """index for folder, or the indexed folder it's inside of"""
+    folder = os.path.normpath(folder)
+    with indices_lock:
+        for root, index in indices.items():
+            if folder == root or folder.startswith(root + os.sep):
+                return index
+        # replace any indices inside this folder
+        for root in [r for r in indices if r.startswith(folder + os.sep)]:
+            del indices[root]
+        indices[folder] = AssetIndex(folder)
+        return indices[folder]
+
+
+def index_assets(*folders: List[str]) -> List[AssetIndex]:
+    """(re)build stale indices & reset hit / miss counts; once per import"""
+    out = list()
+    for folder in folders:
+        if not os.path.isdir(folder):
+            continue
+        folder = os.path.normpath(folder)
+        with indices_lock:
+            if folder in indices and indices[folder].is_stale():
+                del indices[folder]
+            index = asset_index(folder)
+        if index not in out:  # rsx & vpk folders could overlap
+            index.reset_counts()
+            out.append(index)
+    return out
+
+
 # NOTE: assumes "/" path separator in filename
 def search(folder: str, filename: str) -> str:
     if not os.path.isdir(folder):
         return None  # dead end
-    steps = filename.split("/")
-    target = steps[0].lower()
-    for filename in os.listdir(folder):
-        if filename.lower() == target:
-            if len(steps) > 1:  # 1 layer searched
-                next_folder = "/".join([folder, filename])
-                next_filename = "/".join(steps[1:])
-                return search(next_folder, next_filename)
-            else:
-                return os.path.join(folder, filename)  # full match!
-    return None  # file not found
+    index = asset_index(folder)
+    relative_folder = os.path.relpath(os.path.normpath(folder), index.folder)
+    if relative_folder != ".":
+        filename = "/".join([relative_folder.replace(os.sep, "/"), filename])
+    return index.find(filename)
+
+
+class Registry:
+    """O(1) lookups into a bpy.data collection by custom properties"""
+    collection: str  # e.g. "materials"
+    datablocks: Dict[Any, ID]
+    # ^ {key_of(datablock): datablock}
+    is_seeded: bool
+
+    def __init__(self, collection: str, key_of: Callable[[ID], Any]):
+        self.collection = collection
+        self.key_of = key_of
+        self.datablocks = dict()
+        self.is_seeded = False
+
+    def __repr__(self) -> str:
+        descriptor = f"bpy.data.{self.collection} {len(self.datablocks)} keys"
+        return f"<{self.__class__.__name__} {descriptor} @ 0x{id(self):016X}>"
+
+    def seed(self):
+        """index existing datablocks; once per import"""
+        self.datablocks = dict()
+        for datablock in getattr(bpy.data, self.collection):
+            if "asset_path" not in datablock:
+                continue  # not one of ours
+            self.datablocks.setdefault(self.key_of(datablock), datablock)
+        self.is_seeded = True
+
+    def clear(self):
+        """forget every datablock; re-seeded on the next get"""
+        self.datablocks = dict()
+        self.is_seeded = False
+
+    def get(self, key: Any) -> ID:
+        if not self.is_seeded:
+            self.seed()
+        datablock = self.datablocks.get(key, None)
+        if datablock is None:
+            return None
+        # NOTE: datablocks can be removed or edited between imports
+        try:
+            if self.key_of(datablock) == key:
+                return datablock
+        except ReferenceError:
+            pass  # removed
+        del self.datablocks[key]
+        return None
+
+    def add(self, datablock: ID):
+        self.datablocks[self.key_of(datablock)] = datablock
+
+
+material_registry = Registry(
+    "materials",
+    lambda material: (material.get("asset_path", None), material.get("shader_type", None)))
+
+image_registry = Registry(
+    "images",
+    lambda image: image.get("asset_path", None))
+
+
+def seed_registries():
+    material_registry.seed()
+    image_registry.seed()
+
+
+@persistent
+def clear_registries(dummy):
+    """File > Open & File > New invalidate every datablock we hold"""
+    material_registry.clear()
+    image_registry.clear()
 
 
 def placeholder(asset_path: str, shader_type: str, palette=tool_colours) -> Material:
     """make a placeholder material to be loaded later"""
-    materials = {
-        (material.get("asset_path", None), material.get("shader_type", None)): material
-        for material in bpy.data.materials}
-    if (asset_path, shader_type) in materials:
-        return materials[(asset_path, shader_type)]
+    material = material_registry.get((asset_path, shader_type))
+    if material is not None:
+        return material
     # create new material w/ name, asset_path & shader_type
     folder, filename = os.path.split(asset_path)
     material = bpy.data.materials.new(filename)
     material["asset_path"] = asset_path
     material["shader_type"] = shader_type
+    material_registry.add(material)
     # asset_path -> viewport colour & alpha
     *colour, alpha = palette.get(
         asset_path, (0.8, 0.8, 0.8, 1.0))
@@ -1,24 +1,89 @@
 from __future__ import annotations
 import os
-from typing import Dict
+import re
+from typing import Dict, Tuple
 
 import bpy
 from bpy.types import ImageTexture
 
-from .utils import search, Slot
+from . import images
+from .utils import image_registry, search, Slot
 
 
-# TODO: .vtf -> blender texture
-# -- can we load .dds from bytes?
-# -- link temporary files?
-def load_vtf(asset_dir: str, asset_path: str) -> ImageTexture:
-    raise NotImplementedError()
-    # texture_path = search(asset_dir, f"{asset_path}.vtf")
-    # image = PIL.Image.frombytes(vtf.mipmaps[...])
-    # texture = bpy.data.images.new(
-    #     texture_path, width=image.width, height=image.height)
-    # pixel_array = np.asarray(image.convert("RGBA"), dtype=np.float32)
-    # texture.pixels[::] = (pixel_array / 255).ravel()
+vmt_slots = {
+    "$basetexture": Slot.ALBEDO,
+    "$bumpmap": Slot.NORMAL,
+    "$basetexture2": Slot.ALBEDO_2,
+    "$bumpmap2": Slot.NORMAL_2,
+    "$blendmodulatetexture": Slot.BLEND}
+# ^ {"$parameter": Slot}
+
+token_pattern = re.compile(r'"([^"]*)"|([{}])|([^\s{}"]+)')
+# ^ "quoted string" | brace | bare word
+
+
+def parse_vmt(text: str) -> Tuple[str, Dict[str, str]]:
+    """KeyValues text -> ("shader", {"$parameter": "value"})
+    NOTE: only top-level parameters; Proxies etc. are skipped"""
+    text = re.sub(r"//[^\n]*", "", text)
+    tokens = [
+        (match.lastindex == 2, match.group(match.lastindex))
+        for match in token_pattern.finditer(text)]
+    if len(tokens) == 0:
+        return None, dict()
+    shader = tokens[0][1].lower()
+    parameters = dict()
+    depth, key = 0, None
+    for is_brace, token in tokens[1:]:
+        if is_brace:
+            depth += 1 if token == "{" else -1
+            key = None  # a block, not a value
+        elif depth != 1:
+            continue  # inside a nested block
+        elif key is None:
+            key = token.lower()
+        else:
+            parameters.setdefault(key, token)
+            key = None
+    return shader, parameters
+
+
+def vtf_asset_path(asset_path: str) -> str:
+    asset_path = asset_path.replace("\\", "/").lower()
+    return f"{asset_path}.vtf"
+
+
+def load_vtf(asset_dir: str, asset_path: str, max_size: int = 0) -> ImageTexture:
+    """max_size: largest width or height; smaller mips are used to fit"""
+    vtf_path = vtf_asset_path(asset_path)
+    texture = image_registry.get(vtf_path)
+    if texture is not None:
+        return texture
+
+    full_path = search(asset_dir, vtf_path)
+    if full_path is None:
+        return None  # file not found
+
+    return images.load_image(full_path, vtf_path, max_size)
+
+
+def texture_files(asset_path: str) -> Dict[str, str]:
+    """{".vtf asset_path": "full path"} that VMT.from_path would load"""
+    vpk_folder = bpy.context.scene.rbsp_prefs.vpk_folder
+    search_folder = os.path.join(vpk_folder, "materials")
+    vmt_path = search(search_folder, f"{asset_path}.vmt")
+    if vmt_path is None:
+        return dict()
+    with open(vmt_path, errors="replace") as vmt_file:
+        shader, parameters = parse_vmt(vmt_file.read())
+    out = dict()
+    for parameter in vmt_slots:
+        if parameter in parameters:
+            vtf_path = vtf_asset_path(parameters[parameter])
+            full_path = search(search_folder, vtf_path)
+            if full_path is not None:
+                out[vtf_path] = full_path
+    return out
 
 
 class VMT:
@@ -26,6 +91,8 @@ class VMT:
     vpk_folder: str
     textures: Dict[Slot, ImageTexture]
     # ^ {Slot.ALBEDO: ImageTexture}
+    max_size: int = 0
+    # ^ largest texture width or height; 0 for full resolution
     # TODO: shader type -> node maker
 
     def __init__(self):
@@ -34,7 +101,7 @@ class VMT:
 
     def load_texture(self, slot: Slot, asset_path: str) -> ImageTexture:
         search_folder = os.path.join(self.vpk_folder, "materials")
-        texture = load_vtf(search_folder, asset_path)
+        texture = load_vtf(search_folder, asset_path, self.max_size)
         if texture is not None:
             self.textures[slot] = texture
         # TODO: error texture w/ asset path
@@ -48,14 +115,15 @@ class VMT:
             return cls.from_file(vmt_path)
 
     @classmethod
-    def from_file(cls, filename: str):
-        raise NotImplementedError()
-        # vmt = bite.Vmt.from_file(vmt_path)
-        # return cls.from_vmt(vmt)
+    def from_file(cls, filename: str) -> VMT:
+        with open(filename, errors="replace") as vmt_file:
+            return cls.from_vmt(parse_vmt(vmt_file.read()))
 
     @classmethod
-    def from_vmt(cls, vmt) -> VMT:
-        raise NotImplementedError()
+    def from_vmt(cls, vmt: Tuple[str, Dict[str, str]]) -> VMT:
         out = cls()
-        # $baseTexture -> out.load_texture(Slot.ALBEDO, ...)
+        shader, parameters = vmt
+        for parameter, slot in vmt_slots.items():
+            if parameter in parameters:
+                out.load_texture(slot, parameters[parameter])
         return out
@@ -3,14 +3,37 @@ from typing import Dict
 
 from bpy.types import ImageTexture, Material, Node
 
+from . import groups
 from .utils import Slot
 from .matl import MATL
+from .vmt import VMT
+
+
+# {Slot: ("group input", "Alpha group input")}
+group_inputs = {
+    Slot.ALBEDO: ("Albedo", "Alpha"),
+    Slot.ALBEDO_2: ("Albedo 2", "Alpha 2"),
+    Slot.SPECULAR: ("Specular", None),
+    Slot.SPECULAR_2: ("Specular 2", None),
+    Slot.GLOSS: ("Gloss", None),
+    Slot.GLOSS_2: ("Gloss 2", None),
+    Slot.NORMAL: ("Normal", None),
+    Slot.NORMAL_2: ("Normal 2", None),
+    Slot.BLEND: ("Blend Mask", None),
+    Slot.ILLUMINATION: ("Emission", "Emission Strength"),
+    Slot.OPACITY: ("Alpha", None)}
+
+srgb_slots = (
+    Slot.ALBEDO, Slot.ALBEDO_2, Slot.GLOSS, Slot.GLOSS_2,
+    Slot.ILLUMINATION, Slot.SPECULAR, Slot.SPECULAR_2)
 
 
 class WorldMaterial:
     """generic level geometry shader constructor"""
     material: Material
     textures: Dict[Slot, ImageTexture]
+    use_node_groups: bool = True
+    # ^ False: build every node per-material (slower, for comparison)
 
     def __init__(self):
         self.material = None
@@ -129,6 +152,9 @@ class WorldMaterial:
         return mix_shader
 
     def make_nodes(self):
+        if self.use_node_groups:
+            self.make_group_nodes()
+            return
         self.material.use_nodes = True
         shader_a, frame_a = self.setup_shader_a()
         if Slot.BLEND in self.textures:  # _bm_wld
@@ -168,6 +194,38 @@ class WorldMaterial:
         # TODO: organisation pass (set node locations)
         # TODO: make locations relative to links
 
+    def make_group_nodes(self):
+        """image nodes -> one shared group node -> Material Output"""
+        self.material.use_nodes = True
+        nodes = self.material.node_tree.nodes
+        nodes.remove(nodes["Principled BSDF"])
+        output = nodes["Material Output"]
+        output.location = (300, 0)
+        shader = self.add_node("ShaderNodeGroup")
+        if Slot.BLEND in self.textures:  # _bm_wld
+            shader.node_tree = groups.two_layer_group()
+        else:
+            shader.node_tree = groups.layer_group()
+        self.link_nodes(shader, 0, output, "Surface")
+        for i, (slot, texture) in enumerate(self.textures.items()):
+            if slot == Slot.DETAIL_NORMAL:
+                map_node = self.add_normal(texture)
+                self.link_nodes(map_node, "Normal", output, "Displacement")
+                continue
+            elif slot not in group_inputs:
+                continue  # NOTE: skipping unimplemented slots
+            colour_input, alpha_input = group_inputs[slot]
+            if colour_input not in shader.inputs:
+                continue  # _2 slot w/o a blend mask
+            texture_node = self.add_texture(
+                texture, colour_input, slot in srgb_slots)
+            texture_node.location = (-400, -300 * i)
+            self.link_nodes(texture_node, "Color", shader, colour_input)
+            if alpha_input is not None:
+                self.link_nodes(texture_node, "Alpha", shader, alpha_input)
+            if slot == Slot.OPACITY:
+                self.material.blend_method = "BLEND"
+
     @classmethod
     def nodeify(cls, material: Material):
         out = cls()
@@ -177,11 +235,11 @@ class WorldMaterial:
         # -- "wld" for .bsp geo; "fix" for .mdl geo
 
         # try for vmt material (r1 & r2 [RARE])
-        # vmt = VMT.from_path(asset_path)
-        # if vmt is not None:  # .vmt found
-        #     out.textures = vmt.textures
-        #     out.make_nodes()
-        #     return out.material
+        vmt = VMT.from_path(asset_path)
+        if vmt is not None:  # .vmt found
+            out.textures = vmt.textures
+            out.make_nodes()
+            return out.material
 
         # try for rpak material (r2 & r5)
         matl = MATL.from_path(asset_path, "wld")
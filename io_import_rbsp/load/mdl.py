@@ -0,0 +1,50 @@
+# NOTE: no bpy imports! worker processes import this module
+import os
+from typing import Tuple
+
+from ass.scene.valve import Mdl
+
+from . import cache
+from .buffers import Buffers, pack_model
+
+
+Payload = Tuple[str, str, Buffers]
+# ^ (model_name, asset_path, buffers)
+
+max_lod = 7  # .vvd holds up to 8 lods
+
+
+def lod_of(model_name: str) -> int:
+    """e.g. "name.lod2" -> 2"""
+    return int(model_name.rpartition(".lod")[2])
+
+
+def parse_model(filepath: str, cache_folder: str = None, lod: int = 0) -> Payload:
+    """.mdl -> lod vertex buffers; None if the .mdl can't be used"""
+    if filepath is None:
+        return None  # search() FileNotFound
+    if cache_folder is None:
+        return convert_model(filepath, lod)
+    payload = cache.load_payload(cache_folder, filepath, lod)
+    if payload is cache.MISS:
+        payload = convert_model(filepath, lod)
+        cache.save_payload(cache_folder, filepath, lod, payload)
+    return payload
+
+
+def convert_model(filepath: str, lod: int = 0) -> Payload:
+    mdl = Mdl.from_file(filepath)
+    try:
+        mdl.parse()
+    except Exception:
+        return None  # failed to parse
+    base_name = os.path.splitext(mdl.filename)[0]
+    # NOTE: falls back to the least detailed lod the .mdl has
+    model_name = next((
+        f"{base_name}.lod{i}"
+        for i in range(lod, -1, -1)
+        if f"{base_name}.lod{i}" in mdl.models), None)
+    if model_name is None:
+        return None  # no meshes
+    # NOTE: uv0 only, no vertex colour
+    return (model_name, mdl.name, pack_model(mdl.models[model_name]))
@@ -0,0 +1,132 @@
+import contextlib
+import csv
+import json
+import sys
+import time
+from typing import Dict, List, Tuple
+
+import bpy
+
+
+datablock_types = ("objects", "meshes", "materials", "images", "collections")
+
+
+def datablock_counts() -> Dict[str, int]:
+    return {
+        name: len(getattr(bpy.data, name))
+        for name in datablock_types}
+
+
+def peak_rss() -> int:
+    """peak resident set size of this process, in bytes"""
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        ctypes.windll.psapi.GetProcessMemoryInfo(
+            process, ctypes.byref(counters), counters.cb)
+        return counters.PeakWorkingSetSize
+    import resource
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # NOTE: linux reports KiB, macOS reports bytes
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+class Profiler:
+    """per-stage timings & datablock counts for one import"""
+    stages: List[Tuple[str, float]]
+    # ^ [("stage/sub-stage", seconds)]
+    counts_before: Dict[str, int]
+    counts_after: Dict[str, int]
+    start: float
+    duration: float  # seconds
+    peak_rss: int  # bytes
+
+    def __init__(self):
+        self.stages = list()
+        self.counts_before = datablock_counts()
+        self.counts_after = dict()
+        self.start = time.perf_counter()
+        self.duration = 0
+        self.peak_rss = 0
+
+    def __repr__(self) -> str:
+        descriptor = f"{len(self.stages)} stages, {self.duration:.2f}s"
+        return f"<{self.__class__.__name__} {descriptor} @ 0x{id(self):016X}>"
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append((name, time.perf_counter() - start))
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.start
+        self.counts_after = datablock_counts()
+        self.peak_rss = peak_rss()
+
+    @property
+    def created(self) -> Dict[str, int]:
+        return {
+            name: self.counts_after[name] - self.counts_before[name]
+            for name in datablock_types}
+
+    def summary(self) -> List[str]:
+        """one line per top-level stage, then totals"""
+        out = [
+            f"{name}: {seconds:.2f}s"
+            for name, seconds in self.stages
+            if "/" not in name]
+        out.append("created " + ", ".join(
+            f"{count} {name}"
+            for name, count in self.created.items()))
+        out.append(f"peak RSS: {self.peak_rss / 2 ** 30:.2f} GiB")
+        return out
+
+    def as_json(self) -> Dict:
+        return {
+            "duration": self.duration,
+            "stages": [
+                {"name": name, "seconds": seconds}
+                for name, seconds in self.stages],
+            "created": self.created,
+            "peak_rss": self.peak_rss}
+
+    def save_json(self, filename: str):
+        with open(filename, "w") as json_file:
+            json.dump(self.as_json(), json_file, indent=2)
+
+    def save_csv(self, filename: str):
+        with open(filename, "w", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(("stage", "seconds"))
+            writer.writerows(self.stages)
+            writer.writerow(("total", self.duration))
+
+
+current: Profiler = None  # set by ImportRBSP.execute
+
+
+def stage(name: str):
+    """time a block if an import is being profiled"""
+    if current is None:
+        return contextlib.nullcontext()
+    return current.stage(name)
@@ -1,16 +1,22 @@
+import concurrent.futures
+import hashlib
 import itertools
-import math
+import multiprocessing
 import os
+import sys
+from typing import Dict, List, Sequence, Tuple
 
 import bpy
-import mathutils
+import numpy as np
 
-from bpy.types import Collection, Mesh
+from bpy.types import Collection, GeometryNodeTree, Mesh, Object
 
-from ass.scene.valve import Mdl
-
-from .geometry import get_base_uv
-from .materials import placeholder, search
+from . import profiler
+from .materials import search
+from .mdl import Payload, lod_of, max_lod, parse_model
+from .soup import TriangleSoup
+from .update import Changes, clear_collection, match, move_objects, remove_objects
+from .utils import ObjectBatch, run, scaled, Steps
 # TODO: _fix material node assembler
 # -- for now, props will just use placeholders
 
@@ -19,108 +25,417 @@ from .materials import placeholder, search
 # foliage > ...
 # auto-hide large collections (> 1000 props)
 
+crowd_size = 256
+# ^ models placed more often than this get a shorter lod0 radius (foliage etc.)
+
+max_windows_workers = 61
+# ^ ProcessPoolExecutor raises ValueError for more on Windows (WaitForMultipleObjects limit)
+
+
+def as_empties(*args, **kwargs):
+    """empty_steps, all at once"""
+    run(empty_steps(*args, **kwargs))
 
-def as_empties(bsp, prop_collection: Collection):
+
+def empty_steps(bsp, prop_collection: Collection, update: bool = False) -> Steps:
     """Requires all models to be extracted beforehand"""
-    for prop in bsp.GAME_LUMP.sprp.props:
-        prop_object = bpy.data.objects.new(
-            bsp.GAME_LUMP.sprp.model_names[prop.model_name], None)
-        prop_object.empty_display_type = "SPHERE"
-        prop_object.empty_display_size = 64
-        prop_object.location = tuple(prop.origin)
-        radians = list(map(math.radians, prop.angles))
-        prop_object.rotation_euler = mathutils.Euler(
-            (radians[2], radians[0], radians[1]), "YZX")
-        prop_object.scale = (prop.scale,) * 3
-        prop_collection.objects.link(prop_object)
-
-
-def static_props(bsp, prop_collection: Collection):
+    model_names = bsp.GAME_LUMP.sprp.model_names
+    origins, angles, scales, model_indices = prop_columns(bsp.GAME_LUMP.sprp.props)
+    placements = prop_placements(origins, angles, scales)
+    identities = [model_names[model_index] for model_index in model_indices]
+    fingerprints = prop_fingerprints(identities, placements)
+    old_objects, changes = prop_changes(prop_collection, identities, fingerprints, update)
+    apply_prop_changes(old_objects, changes, fingerprints, placements)
+    yield from place_prop_steps(
+        prop_collection, changes.added, identities, dict(),
+        identities, fingerprints, placements)
+
+
+def static_props(*args, **kwargs):
+    """static_prop_steps, all at once"""
+    run(static_prop_steps(*args, **kwargs))
+
+
+def static_prop_steps(bsp, prop_collection: Collection, max_workers: int = 0, cache_folder: str = None,
+                      lod: int = 0, lod_distance: float = 2048, focus: Sequence[float] = (0, 0, 0),
+                      update: bool = False) -> Steps:
+    """yields as models are parsed & objects are made
+    lod=-1 picks each prop's lod w/ prop_lods
+    update: reuse objects & meshes from a previous import; see update.match"""
+    model_names = bsp.GAME_LUMP.sprp.model_names
+    origins, angles, scales, model_indices = prop_columns(bsp.GAME_LUMP.sprp.props)
+    lods = prop_lods(origins, model_indices, lod, lod_distance, focus)
+    placements = prop_placements(origins, angles, scales)
+    identities = [
+        f"{model_names[model_index]}.lod{model_lod}"
+        for model_index, model_lod in zip(model_indices, lods)]
+    fingerprints = prop_fingerprints(identities, placements)
+    old_objects, changes = prop_changes(prop_collection, identities, fingerprints, update)
+    # only load models we don't already have a mesh for
+    meshes = {
+        old_objects[i]["identity"]: old_objects[i].data
+        for row, i in (*changes.kept, *changes.moved)
+        if old_objects[i].data is not None}
+    # ^ {identity: mesh}
+    missing = [row for row in changes.added if identities[row] not in meshes]
+    if len(missing) > 0:
+        keys, key_indices = lod_keys(model_indices[missing], lods[missing])
+        key_meshes = yield from scaled(prop_mesh_steps(bsp, keys, max_workers, cache_folder), 0, 0.8)
+        if key_meshes is None:
+            return  # no vpk folder
+        for row, key_index in zip(missing, key_indices):
+            meshes[identities[row]] = key_meshes[key_index]
+
+    with profiler.stage("props/objects"):
+        apply_prop_changes(old_objects, changes, fingerprints, placements)
+        names = [
+            os.path.basename(model_names[model_index]).lower()
+            for model_index in model_indices]
+        yield from scaled(place_prop_steps(
+            prop_collection, changes.added, names, meshes,
+            identities, fingerprints, placements), 0.8, 1)
+
+
+def prop_placements(origins: np.ndarray, angles: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    """prop_columns -> float32 (num_props, 3, 3) location, XYZ euler radians & scale"""
+    rotations = np.radians(angles)[:, [2, 0, 1]]  # roll, pitch, yaw
+    scales = np.repeat(scales[:, np.newaxis], 3, axis=1)
+    return np.stack([origins, rotations, scales], axis=1).astype(np.float32)
+
+
+def prop_fingerprints(identities: List[str], placements: np.ndarray) -> List[str]:
+    """identity + placement of each prop; see update.match"""
+    return [
+        f"{identity} {placement.tobytes().hex()}"
+        for identity, placement in zip(identities, placements)]
+
+
+def prop_changes(prop_collection: Collection, identities: List[str], fingerprints: List[str],
+                 update: bool = False) -> Tuple[List[Object], Changes]:
+    """match props against objects from a previous import; every prop is added if not update"""
+    if not update:
+        return list(), Changes(list(), list(), list(range(len(identities))), list())
+    old_objects = [
+        prop_object
+        for prop_object in prop_collection.objects
+        if "fingerprint" in prop_object]
+    changes = match(
+        [prop_object["fingerprint"] for prop_object in old_objects],
+        [prop_object["identity"] for prop_object in old_objects],
+        fingerprints, identities)
+    return old_objects, changes
+
+
+def apply_prop_changes(old_objects: List[Object], changes: Changes, fingerprints: List[str],
+                       placements: np.ndarray):
+    """move & remove objects from a previous import"""
+    moved_rows = [row for row, i in changes.moved]
+    moved = [old_objects[i] for row, i in changes.moved]
+    move_objects(moved, *placements[moved_rows].transpose(1, 0, 2))
+    for prop_object, row in zip(moved, moved_rows):
+        prop_object["fingerprint"] = fingerprints[row]
+    remove_objects([old_objects[i] for i in changes.removed])
+
+
+def place_prop_steps(prop_collection: Collection, rows: List[int], names: List[str], meshes: Dict[str, Mesh],
+                     identities: List[str], fingerprints: List[str], placements: np.ndarray,
+                     batch_size: int = 1024) -> Steps:
+    """one object per row; props w/o a mesh are empties
+    yields after every batch_size objects"""
+    with ObjectBatch(prop_collection) as batch:
+        for i, row in enumerate(rows):
+            if i % batch_size == 0:
+                yield i / len(rows)
+            mesh = meshes.get(identities[row], None)
+            prop_object = batch.new(names[row], mesh)
+            if mesh is None:
+                prop_object.empty_display_type = "SPHERE"
+                prop_object.empty_display_size = 64
+            prop_object["identity"] = identities[row]
+            prop_object["fingerprint"] = fingerprints[row]
+        batch.locations, batch.rotations, batch.scales = placements[rows].transpose(1, 0, 2)
+
+
+def instances(*args, **kwargs):
+    """instance_steps, all at once"""
+    run(instance_steps(*args, **kwargs))
+
+
+def instance_steps(bsp, prop_collection: Collection, max_workers: int = 0, cache_folder: str = None,
+                   lod: int = 0, lod_distance: float = 2048, focus: Sequence[float] = (0, 0, 0),
+                   update: bool = False) -> Steps:
+    """one point cloud for all props, instanced w/ geometry nodes
+    update: the previous import is kept if no prop has changed, otherwise it's rebuilt"""
+    origins, quaternions, scales, model_indices = prop_transforms(bsp.GAME_LUMP.sprp.props)
+    lods = prop_lods(origins, model_indices, lod, lod_distance, focus)
+    digest = hashlib.sha1("\0".join(bsp.GAME_LUMP.sprp.model_names).encode("utf-8"))
+    for array in (origins, quaternions, scales, model_indices, lods):
+        digest.update(np.ascontiguousarray(array))
+    fingerprint = digest.hexdigest()
+    if update:
+        if any(
+                points_object.get("fingerprint") == fingerprint
+                for points_object in prop_collection.objects):
+            return  # unchanged
+        clear_collection(prop_collection)
+    keys, key_indices = lod_keys(model_indices, lods)
+    meshes = yield from scaled(prop_mesh_steps(bsp, keys, max_workers, cache_folder), 0, 0.9)
+    if meshes is None:
+        return  # no vpk folder
+    model_names = bsp.GAME_LUMP.sprp.model_names
+
+    # NOTE: Collection Info sorts separate children alphabetically
+    # -- zero-padded index prefix keeps instance index == key index
+    models_collection = bpy.data.collections.new("prop models")
+    models_collection.hide_viewport = True
+    models_collection.hide_render = True
+    prop_collection.children.link(models_collection)
+    for i, ((model_index, model_lod), mesh) in enumerate(zip(keys, meshes)):
+        name = os.path.basename(model_names[model_index]).lower()
+        model_object = bpy.data.objects.new(f"{i:05d} {name}", mesh)
+        # NOTE: missing models become empties & instance nothing
+        models_collection.objects.link(model_object)
+
+    points = bpy.data.meshes.new(f"{bsp.filename} props")
+    points.vertices.add(len(origins))
+    points.vertices.foreach_set("co", origins.ravel())
+    attributes = {
+        "model_index": ("INT", key_indices),
+        "rotation": ("QUATERNION", quaternions),
+        "scale": ("FLOAT", scales)}
+    for name, (type_, values) in attributes.items():
+        attribute = points.attributes.new(name, type_, "POINT")
+        attribute.data.foreach_set("value", values.ravel())
+    points.update()
+
+    points_object = bpy.data.objects.new(points.name, points)
+    points_object["identity"] = "instances"
+    points_object["fingerprint"] = fingerprint
+    node_group = instancer_node_group()
+    modifier = points_object.modifiers.new("Prop Instances", "NODES")
+    modifier.node_group = node_group
+    models_socket = node_group.interface.items_tree["Models"]
+    modifier[models_socket.identifier] = models_collection
+    prop_collection.objects.link(points_object)
+
+
+def prop_columns(props) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """bulk StaticProp -> (origins, angles, scales, model_indices); angles in degrees"""
+    num_props = len(props)
+    packed = np.fromiter(
+        itertools.chain.from_iterable(
+            (*prop.origin, *prop.angles, prop.scale, prop.model_name)
+            for prop in props),
+        dtype=np.float64,
+        count=num_props * 8).reshape(-1, 8)
+    origins = packed[:, 0:3].astype(np.float32)
+    angles = packed[:, 3:6]
+    scales = packed[:, 6].astype(np.float32)
+    model_indices = packed[:, 7].astype(np.int32)
+    return origins, angles, scales, model_indices
+
+
+def prop_transforms(props) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """bulk StaticProp -> (origins, quaternions, scales, model_indices)"""
+    origins, angles, scales, model_indices = prop_columns(props)
+    quaternions = xyz_quaternions(angles).astype(np.float32)
+    return origins, quaternions, scales, model_indices
+
+
+def prop_lods(origins: np.ndarray, model_indices: np.ndarray, lod: int = 0,
+              lod_distance: float = 2048, focus: Sequence[float] = (0, 0, 0)) -> np.ndarray:
+    """int32 lod per prop; lod=-1 picks by distance from focus & model crowding
+
+    lod0 within lod_distance of focus, +1 lod each time the distance doubles
+    models placed more than crowd_size times get a proportionally smaller radius"""
+    if lod >= 0:
+        return np.full(len(origins), min(lod, max_lod), dtype=np.int32)
+    distances = np.linalg.norm(origins - np.asarray(focus, dtype=np.float32), axis=1)
+    crowds = np.bincount(model_indices)[model_indices]
+    radii = lod_distance / np.sqrt(np.maximum(crowds / crowd_size, 1))
+    lods = np.ceil(np.log2(np.maximum(distances / radii, 1)))
+    return np.clip(lods, 0, max_lod).astype(np.int32)
+
+
+def lod_keys(model_indices: np.ndarray, lods: np.ndarray) -> Tuple[List[Tuple[int, int]], np.ndarray]:
+    """-> ([(model_index, lod)], key index of each prop)"""
+    codes = model_indices.astype(np.int64) * (max_lod + 1) + lods
+    unique_codes, key_indices = np.unique(codes, return_inverse=True)
+    keys = [divmod(int(code), max_lod + 1) for code in unique_codes]
+    return keys, key_indices.ravel().astype(np.int32)
+
+
+def quaternion_multiply(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    aw, ax, ay, az = a.T
+    bw, bx, by, bz = b.T
+    return np.stack([
+        aw * bw - ax * bx - ay * by - az * bz,
+        aw * bx + ax * bw + ay * bz - az * by,
+        aw * by - ax * bz + ay * bw + az * bx,
+        aw * bz + ax * by - ay * bx + az * bw], axis=-1)
+
+
+def xyz_quaternions(angles: np.ndarray) -> np.ndarray:
+    """(pitch, yaw, roll) degrees -> (w, x, y, z)
+
+    matches rotation_euler = (roll, pitch, yaw) in the default "XYZ" mode; see prop_placements"""
+    half_pitch, half_yaw, half_roll = (np.radians(angles) / 2).T
+    zero = np.zeros_like(half_pitch)
+    x = np.stack([np.cos(half_roll), np.sin(half_roll), zero, zero], axis=-1)
+    y = np.stack([np.cos(half_pitch), zero, np.sin(half_pitch), zero], axis=-1)
+    z = np.stack([np.cos(half_yaw), zero, zero, np.sin(half_yaw)], axis=-1)
+    # X first, then Y, then Z
+    return quaternion_multiply(z, quaternion_multiply(y, x))
+
+
+def instancer_node_group() -> GeometryNodeTree:
+    """instance a collection's children on points, picked by model_index"""
+    name = "rBSP Prop Instancer"
+    if name in bpy.data.node_groups:
+        return bpy.data.node_groups[name]
+    node_group = bpy.data.node_groups.new(name, "GeometryNodeTree")
+    interface = node_group.interface
+    interface.new_socket("Geometry", in_out="INPUT", socket_type="NodeSocketGeometry")
+    interface.new_socket("Models", in_out="INPUT", socket_type="NodeSocketCollection")
+    interface.new_socket("Geometry", in_out="OUTPUT", socket_type="NodeSocketGeometry")
+
+    nodes = node_group.nodes
+    links = node_group.links
+    group_input = nodes.new("NodeGroupInput")
+    group_input.location = (-600, 0)
+    group_output = nodes.new("NodeGroupOutput")
+    group_output.location = (300, 0)
+    collection_info = nodes.new("GeometryNodeCollectionInfo")
+    collection_info.location = (-300, 200)
+    collection_info.transform_space = "ORIGINAL"
+    collection_info.inputs["Separate Children"].default_value = True
+    collection_info.inputs["Reset Children"].default_value = True
+    instancer = nodes.new("GeometryNodeInstanceOnPoints")
+    instancer.inputs["Pick Instance"].default_value = True
+
+    links.new(group_input.outputs["Geometry"], instancer.inputs["Points"])
+    links.new(group_input.outputs["Models"], collection_info.inputs["Collection"])
+    links.new(collection_info.outputs["Instances"], instancer.inputs["Instance"])
+    attributes = {
+        "model_index": ("INT", "Instance Index"),
+        "rotation": ("QUATERNION", "Rotation"),
+        "scale": ("FLOAT", "Scale")}
+    for i, (attribute_name, (data_type, socket)) in enumerate(attributes.items()):
+        named_attribute = nodes.new("GeometryNodeInputNamedAttribute")
+        named_attribute.location = (-300, -100 - i * 150)
+        named_attribute.data_type = data_type
+        named_attribute.inputs["Name"].default_value = attribute_name
+        links.new(named_attribute.outputs["Attribute"], instancer.inputs[socket])
+    links.new(instancer.outputs["Instances"], group_output.inputs["Geometry"])
+    return node_group
+
+
+def prop_meshes(*args, **kwargs) -> List[Mesh]:
+    """prop_mesh_steps, all at once"""
+    return run(prop_mesh_steps(*args, **kwargs))
+
+
+def prop_mesh_steps(bsp, keys: List[Tuple[int, int]], max_workers: int = 0, cache_folder: str = None) -> Steps:
+    """one mesh per (model_index, lod) key; None if vpk_folder is invalid
+    yields as .mdl files are parsed, then as meshes are made"""
     vpk_folder = bpy.context.scene.rbsp_prefs.vpk_folder
     if not os.path.isdir(vpk_folder):
-        return
-    meshes = [
-        load_model(model_path(vpk_folder, model_name))
-        for model_name in bsp.GAME_LUMP.sprp.model_names]
-
-    for prop in bsp.GAME_LUMP.sprp.props:
-        mesh = meshes[prop.model_name]
-        path = bsp.GAME_LUMP.sprp.model_names[prop.model_name]
-        name = os.path.basename(path).lower()
-        prop_object = bpy.data.objects.new(name, mesh)
-        if mesh is None:
-            prop_object.empty_display_type = "SPHERE"
-            prop_object.empty_display_size = 64
-        prop_object.location = tuple(prop.origin)
-        radians = list(map(math.radians, prop.angles))
-        prop_object.rotation_euler = mathutils.Euler(
-            (radians[2], radians[0], radians[1]), "YZX")
-        prop_object.scale = (prop.scale,) * 3
-        prop_collection.objects.link(prop_object)
+        return None
+    model_names = bsp.GAME_LUMP.sprp.model_names
+    model_filepaths = {
+        model_index: model_path(vpk_folder, model_names[model_index])
+        for model_index in sorted({model_index for model_index, lod in keys})}
+    filepaths = [model_filepaths[model_index] for model_index, lod in keys]
+    with profiler.stage("props/parse"):
+        payloads = yield from scaled(parse_model_steps(
+            filepaths, max_workers, cache_folder, [lod for model_index, lod in keys]), 0, 0.5)
+    with profiler.stage("props/meshes"):
+        # NOTE: missing lods fall back to the same mesh; only make it once
+        meshes = dict()
+        # ^ {(filepath, model_name): mesh}
+        out = list()
+        for i, (filepath, payload) in enumerate(zip(filepaths, payloads)):
+            yield 0.5 + i / len(filepaths) / 2
+            if payload is None:
+                out.append(None)
+                continue
+            mesh_key = (filepath, payload[0])
+            if mesh_key not in meshes:
+                meshes[mesh_key] = model_mesh(payload)
+            out.append(meshes[mesh_key])
+        return out
 
 
 def model_path(vpk_folder: str, asset_path: str) -> str:
-    filepath = os.path.join(vpk_folder, asset_path)
-    if os.path.exists(filepath):
-        return filepath  # case-senstive match
-    else:  # try for case-insensitive match
-        return search(vpk_folder, asset_path)
+    return search(vpk_folder, asset_path)  # case-insensitive
 
 
-def load_model(filepath: str) -> Mesh:
-    if filepath is None:
-        return  # search() FileNotFound
-    mdl = Mdl.from_file(filepath)
-    try:
-        mdl.parse()
-    except Exception:
-        return None  # failed to parse
-    base_name = os.path.splitext(mdl.filename)[0]
-    model_name = f"{base_name}.lod0"
-    model = mdl.models[model_name]
+def load_model(filepath: str, cache_folder: str = None, lod: int = 0) -> Mesh:
+    return model_mesh(parse_model(filepath, cache_folder, lod))
+
+
+def model_mesh(payload: Payload) -> Mesh:
+    if payload is None:
+        return None  # file not found / failed to parse
+    model_name, asset_path, buffers = payload
     # ass.Model -> Blender Mesh
-    vertex_materials = [
-        (vertex, mesh.material)
-        for mesh in model.meshes
-        for polygon in mesh.polygons
-        for vertex in polygon.vertices]
-    if len(vertex_materials) != 0:
-        vertices, materials = zip(*vertex_materials)
-    else:  # model w/ no geo
-        vertices, materials = list(), list()
-    assert len(vertices) % 3 == 0, "not a triangle soup"
-    indices = list(itertools.chain([
-        (i + 2, i + 1, i + 0)
-        for i in range(0, len(vertices), 3)]))
-
-    mesh = bpy.data.meshes.new(model_name)
-    mesh.from_pydata(
-        [vertex.position for vertex in vertices],
-        list(),  # auto-generate edges
-        indices,
-        shade_flat=False)
-
-    # NOTE: uv0 only, no vertex colour
-    base_uv = mesh.uv_layers.new(name="base")
-    base_uv.data.foreach_set(
-        "uv",
-        list(itertools.chain(*[
-            get_base_uv(vertices, index)
-            for tri in indices
-            for index in tri])))
-
-    material_indices = dict()
-    for material in {sub_mesh.material for sub_mesh in model.meshes}:
-        blender_material = placeholder(material.name, "fix")
-        mesh.materials.append(blender_material)
-        material_indices[material.name] = len(mesh.materials) - 1
-
-    # assign materials
-    mesh.polygons.foreach_set(
-        "material_index", [
-            material_indices[materials[tri[0]].name]
-            for tri in indices])
-
-    mesh.update()
-    mesh["asset_path"] = mdl.name
+    mesh = TriangleSoup(*buffers).as_mesh(model_name, "fix")
+    mesh["asset_path"] = asset_path
+    mesh["lod"] = lod_of(model_name)  # swap back to lod0 w/ asset_path
     return mesh
+
+
+# NOTE: worker processes can't import bpy, so they can't run our __init__.py
+# -- stub our parent packages so only bpy-free modules get imported
+stub_packages = """
+import sys
+import types
+for name, path in packages.items():
+    package = types.ModuleType(name)
+    package.__path__ = path
+    sys.modules[name] = package
+"""
+
+
+def parse_models(*args, **kwargs) -> List[Payload]:
+    """parse_model_steps, all at once"""
+    return run(parse_model_steps(*args, **kwargs))
+
+
+def parse_model_steps(filepaths: List[str], max_workers: int = 0, cache_folder: str = None,
+                      lods: List[int] = None) -> Steps:
+    """.mdl parsing process pool; max_workers=0 for one per CPU core
+    yields as each model is parsed, returns [Payload]"""
+    cache_folders = itertools.repeat(cache_folder)
+    if lods is None:
+        lods = [0] * len(filepaths)
+    if max_workers == 0:
+        max_workers = os.cpu_count() or 1
+    max_workers = min(max_workers, len(filepaths))
+    if sys.platform == "win32":
+        max_workers = min(max_workers, max_windows_workers)
+    out = list()
+    if max_workers <= 1:
+        for payload in map(parse_model, filepaths, cache_folders, lods):
+            out.append(payload)
+            yield len(out) / len(filepaths)
+        return out
+    parents = parse_model.__module__.split(".")[:-1]
+    packages = {
+        name: list(sys.modules[name].__path__)
+        for name in (
+            ".".join(parents[:i + 1])
+            for i in range(len(parents)))}
+    pool = concurrent.futures.ProcessPoolExecutor(
+        max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=exec,
+        initargs=(stub_packages, {"packages": packages}))
+    chunksize = max(1, len(filepaths) // (max_workers * 4))
+    try:
+        for payload in pool.map(parse_model, filepaths, cache_folders, lods, chunksize=chunksize):
+            out.append(payload)
+            yield len(out) / len(filepaths)
+    finally:  # don't wait for models we no longer need if closed early
+        pool.shutdown(wait=len(out) == len(filepaths), cancel_futures=True)
+    return out
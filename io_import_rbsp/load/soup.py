@@ -0,0 +1,111 @@
+from __future__ import annotations
+import hashlib
+from typing import List, Sequence
+
+import bpy
+from bpy.types import Mesh
+import numpy as np
+
+from .buffers import pack_model
+from .materials import placeholder
+
+
+class TriangleSoup:
+    """contiguous vertex buffers for a bsp_tool / ass Model"""
+    positions: np.ndarray  # float32 (num_vertices, 3)
+    uvs: np.ndarray  # float32 (num_uvs, num_vertices, 2); not V-flipped
+    colours: np.ndarray  # float32 (num_vertices, 4); None if not packed
+    material_ids: np.ndarray  # int32 (num_triangles,)
+    materials: List[str]
+    # ^ [material.name]; indexed by material_ids
+    lightmaps: np.ndarray  # int32 (num_triangles,) LightmapHeader index; None if unknown
+
+    def __init__(self, positions, uvs, colours, material_ids, materials, lightmaps=None):
+        self.positions = positions
+        self.uvs = uvs
+        self.colours = colours
+        self.material_ids = material_ids
+        self.materials = materials
+        self.lightmaps = lightmaps
+
+    def __repr__(self) -> str:
+        descriptor = f"{len(self)} triangles, {len(self.materials)} materials"
+        return f"<{self.__class__.__name__} {descriptor}>"
+
+    def __len__(self) -> int:
+        return len(self.material_ids)
+
+    @classmethod
+    def from_model(cls, model, num_uvs: int = 1, colours: bool = False) -> TriangleSoup:
+        return cls(*pack_model(model, num_uvs, colours))
+
+    def content_hash(self) -> str:
+        """identical geometry & materials -> identical digest"""
+        digest = hashlib.sha1()
+        for array in (self.positions, self.uvs, self.colours, self.material_ids, self.lightmaps):
+            if array is not None:
+                digest.update(np.ascontiguousarray(array))
+        digest.update("\0".join(self.materials).encode("utf-8"))
+        return digest.hexdigest()
+
+    @property
+    def centroids(self) -> np.ndarray:
+        """float32 (num_triangles, 3)"""
+        return self.positions.reshape(-1, 3, 3).mean(axis=1)
+
+    def subset(self, triangles: np.ndarray) -> TriangleSoup:
+        """copy of some triangles; unused materials are dropped"""
+        corners = (triangles[:, np.newaxis] * 3 + np.arange(3)).ravel()
+        used, material_ids = np.unique(self.material_ids[triangles], return_inverse=True)
+        return TriangleSoup(
+            self.positions[corners],
+            self.uvs[:, corners],
+            self.colours[corners] if self.colours is not None else None,
+            material_ids.ravel().astype(np.int32),
+            [self.materials[i] for i in used],
+            self.lightmaps[triangles] if self.lightmaps is not None else None)
+
+    @property
+    def loop_vertices(self) -> np.ndarray:
+        """reversed winding order: (i + 2, i + 1, i + 0)"""
+        num_vertices = len(self.positions)
+        return np.arange(num_vertices, dtype=np.int32).reshape(-1, 3)[:, ::-1].ravel()
+
+    def as_mesh(self, name: str, shader_type: str, uv_names: Sequence[str] = ("base",)) -> Mesh:
+        """one loop per vertex; materials are placeholders"""
+        num_loops = len(self.positions)
+        loop_vertices = self.loop_vertices
+
+        mesh = bpy.data.meshes.new(name)
+        mesh.vertices.add(num_loops)
+        mesh.vertices.foreach_set("co", self.positions.ravel())
+        mesh.loops.add(num_loops)
+        mesh.loops.foreach_set("vertex_index", loop_vertices)
+        mesh.polygons.add(len(self))
+        mesh.polygons.foreach_set(
+            "loop_start", np.arange(0, num_loops, 3, dtype=np.int32))
+        mesh.update(calc_edges=True)  # auto-generate edges
+
+        for uv_name, uvs in zip(uv_names, self.uvs):
+            loop_uvs = uvs[loop_vertices]  # copy
+            loop_uvs[:, 1] = 1 - loop_uvs[:, 1]  # flip V for blender
+            uv_layer = mesh.uv_layers.new(name=uv_name)
+            uv_layer.data.foreach_set("uv", loop_uvs.ravel())
+
+        if self.colours is not None:
+            vertex_colour = mesh.vertex_colors.new(name="Colour")
+            vertex_colour.data.foreach_set(
+                "color", self.colours[loop_vertices].ravel())
+
+        for material in self.materials:
+            mesh.materials.append(placeholder(material, shader_type))
+
+        # assign materials
+        mesh.polygons.foreach_set("material_index", self.material_ids)
+
+        if self.lightmaps is not None:
+            lightmap_index = mesh.attributes.new(
+                name="Lightmap Index", type="INT", domain="FACE")
+            lightmap_index.data.foreach_set("value", self.lightmaps)
+        mesh.update()
+        return mesh
@@ -0,0 +1,110 @@
+# NOTE: no bpy imports! only numpy
+from __future__ import annotations
+import itertools
+import json
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+Entity = Dict[str, str]
+# ^ {"key": "value"}
+
+placement_keys = ("origin", "angles", "pitch")
+# ^ moving an entity only changes these keyvalues
+
+
+def entity_blocks(bsp) -> Dict[str, List[Entity]]:
+    """{"block_name": entities}; also the names of each entity collection"""
+    return {
+        "bsp": bsp.ENTITIES,
+        "env": bsp.ENTITIES_env,
+        "fx": bsp.ENTITIES_fx,
+        "script": bsp.ENTITIES_script,
+        "sound": bsp.ENTITIES_snd,
+        "spawn": bsp.ENTITIES_spawn}
+
+
+def parse_vectors(values: List[str], width: int = 3) -> np.ndarray:
+    """["x y z", ...] -> float32 (len(values), width); one conversion for every value
+    falls back to parsing each value if any are malformed (-> zeroes)"""
+    split_values = [value.split() for value in values]
+    # NOTE: only the total is checked by reshape; "1 2 3 4" & "5 6" would shift every later row
+    if all(len(axes) == width for axes in split_values):
+        try:
+            return np.array(
+                list(itertools.chain.from_iterable(split_values)),
+                dtype=np.float32).reshape(len(values), width)
+        except ValueError:
+            pass  # not a number
+    out = np.zeros((len(values), width), dtype=np.float32)
+    for i, axes in enumerate(split_values):
+        try:
+            out[i] = [float(axis) for axis in axes]
+        except ValueError:
+            pass  # wrong number of axes / not a number
+    return out
+
+
+def identity(entity: Entity) -> str:
+    """compact JSON of keyvalues, w/o placement; same for a moved entity"""
+    return json.dumps(
+        {key: value for key, value in entity.items() if key not in placement_keys},
+        separators=(",", ":"))
+
+
+class EntityTable:
+    """columns for every entity in every block; parsed once per import"""
+    entities: List[Entity]
+    block_ranges: Dict[str, Tuple[int, int]]
+    # ^ {"block_name": (first_row, end_row)}
+    classnames: List[str]  # editorclass, if it has one
+    names: List[str]  # targetname, or classname
+    origins: np.ndarray  # float32 (num_entities, 3)
+    angles: np.ndarray  # float32 (num_entities, 3) radians; (pitch, yaw, roll)
+
+    def __init__(self, blocks: Dict[str, List[Entity]]):
+        self.entities = list()
+        self.block_ranges = dict()
+        for block_name, entities in blocks.items():
+            first_row = len(self.entities)
+            self.entities.extend(entities)
+            self.block_ranges[block_name] = (first_row, len(self.entities))
+        self.classnames = [
+            entity.get("editorclass", entity.get("classname", None))
+            for entity in self.entities]
+        self.names = [
+            entity.get("targetname", classname)
+            for entity, classname in zip(self.entities, self.classnames)]
+        self.origins = parse_vectors([
+            entity.get("origin", "0 0 0")
+            for entity in self.entities])
+        self.angles = np.radians(parse_vectors([
+            entity.get("angles", "0 0 0")
+            for entity in self.entities]))
+        # NOTE: "pitch" overrides angles & is inverted
+        pitched = [i for i, entity in enumerate(self.entities) if "pitch" in entity]
+        pitches = parse_vectors([self.entities[i]["pitch"] for i in pitched], 1)
+        self.angles[pitched, 0] = np.radians(-pitches[:, 0])
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} {len(self)} entities in {len(self.block_ranges)} blocks>"
+
+    def __len__(self) -> int:
+        return len(self.entities)
+
+    @classmethod
+    def from_bsp(cls, bsp) -> EntityTable:
+        return cls(entity_blocks(bsp))
+
+    @property
+    def rotations(self) -> np.ndarray:
+        """float32 (num_entities, 3) XYZ euler; (roll, pitch, yaw)"""
+        return self.angles[:, [2, 0, 1]]
+
+    def keyvalues(self, row: int) -> str:
+        """compact JSON of one entity; stored as a single custom property"""
+        return json.dumps(self.entities[row], separators=(",", ":"))
+
+    def identity(self, row: int) -> str:
+        return identity(self.entities[row])
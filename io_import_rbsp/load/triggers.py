@@ -1,15 +1,16 @@
-import collections
-import re
-from typing import Dict, List, Tuple
+import hashlib
+from typing import List
 
-import bmesh
 import bpy
 from bpy.types import Mesh
-import mathutils
+import numpy as np
 
+from .brushes import bounds_only, convex_hulls, entity_brushes
 from .entities import Entity
-from .entities import editorclass_of, name_of, set_location
-from .utils import change_collection
+from .entities import editorclass_of, name_of
+from .table import EntityTable
+from .update import update_entities
+from .utils import ObjectBatch, run, Steps
 
 
 purple = (0.527, 0.006, 1.000)
@@ -56,132 +57,107 @@ trigger_colours = {
     "trigger_teleporter": blue}
 
 
-def all_triggers(bsp, ent_collections):
-    entity_blocks = {
-        "bsp": bsp.ENTITIES,
-        "env": bsp.ENTITIES_env,
-        "fx": bsp.ENTITIES_fx,
-        "script": bsp.ENTITIES_script,
-        "sound": bsp.ENTITIES_snd,
-        "spawn": bsp.ENTITIES_spawn}
-    for block_name, entities in entity_blocks.items():
-        entity_collection = ent_collections[block_name]
-        for entity in entities:
-            classname = editorclass_of(entity)
-            if classname not in trigger_colours:
-                continue  # not a trigger, skip
-            trigger_object = bpy.data.objects.new(
-                name_of(entity), trigger_brushes(entity))
-            set_location(trigger_object, entity)
-            # NOTE: iirc triggers never have angles
-            for field in entity:
-                trigger_object[field] = entity[field]
-            change_collection(trigger_object, entity_collection)
-    # TODO: handle parenting based on entity keyvalues
+def all_triggers(*args, **kwargs):
+    """trigger_steps, all at once"""
+    run(trigger_steps(*args, **kwargs))
 
 
-def trigger_brushes(entity: Entity, palette=trigger_colours) -> Mesh:
-    if "*trigger_brush_mins" in entity:  # Apex brush entity (starcoll)
-        # TODO: move to a starcoll parser
-        return None  # skip
-    # get brush planes
-    pattern_plane_key = re.compile(r"\*trigger_brush_([0-9]+)_plane_([0-9]+)")
-    brushes = collections.defaultdict(lambda: collections.defaultdict(list))
-    # ^ {brush_index: {plane_index: " ".join(map(str, (*normal, distance)))}}
-    for key in entity.keys():
-        match = pattern_plane_key.match(key)
-        if match is not None:
-            brush_index, plane_index = map(int, match.groups())
-            *normal, distance = map(float, entity[key].split())
-            normal = mathutils.Vector(normal)
-            brushes[brush_index][plane_index] = (normal, distance)
+def trigger_steps(bsp, ent_collections, update: bool = False, batch_size: int = 256) -> Steps:
+    """yields after solving every brush, then every batch_size objects
+    update: reuse objects from a previous import of this map; only changes are rebuilt"""
+    table = EntityTable.from_bsp(bsp)
+    rows = [
+        row
+        for row, classname in enumerate(table.classnames)
+        if classname in trigger_colours]
+    meshes = dict()
+    # ^ {brush_hash(entity): mesh}; identical volumes share a mesh
+    block_rows = dict()
+    # ^ {"block_name": [row]}; rows still to be made
+    for block_name, (first_row, end_row) in table.block_ranges.items():
+        block_rows[block_name] = [row for row in rows if first_row <= row < end_row]
+        if update:
+            block_rows[block_name] = update_entities(table, block_rows[block_name], [
+                blender_object
+                for blender_object in ent_collections[block_name].objects
+                if "keyvalues" in blender_object and blender_object.type == "MESH"],
+                rotations=False)
+            # reuse the meshes of triggers that are still in the map
+            for blender_object in ent_collections[block_name].objects:
+                if blender_object.type == "MESH" and "content_hash" in blender_object.data:
+                    meshes[blender_object.data["content_hash"]] = blender_object.data
+    digests = {
+        row: brush_hash(table.entities[row])
+        for new_rows in block_rows.values()
+        for row in new_rows}
+    unique_triggers = dict()
+    # ^ {digest: entity}
+    for row, digest in digests.items():
+        if digest not in meshes:
+            unique_triggers.setdefault(digest, table.entities[row])
+    # solve every new trigger's brushes at once
+    for digest, mesh in zip(unique_triggers, trigger_meshes(list(unique_triggers.values()))):
+        if mesh is not None:
+            mesh["content_hash"] = digest
+        meshes[digest] = mesh
+    yield 0.5
+    num_objects = max(1, len(digests))
+    num_done = 0
+    for block_name, rows in block_rows.items():
+        with ObjectBatch(ent_collections[block_name]) as batch:
+            for row in rows:
+                trigger_object = batch.new(table.names[row], meshes[digests[row]])
+                trigger_object["keyvalues"] = table.keyvalues(row)
+                num_done += 1
+                if num_done % batch_size == 0:
+                    yield 0.5 + num_done / num_objects / 2
+            # NOTE: iirc triggers never have angles
+            batch.locations = table.origins[rows]
+    # TODO: handle parenting based on entity keyvalues
 
-    vertices: Dict[mathutils.Vector, bmesh.types.BMVert] = dict()
-    # ^ {(x, y, z): BMVert(...)}
 
-    # adapted from vmf_tool.solid.from_namespace by QtPyHammer-devs
-    # https://github.com/QtPyHammer-devs/vmf_tool/blob/master/vmf_tool/solid.py
-    bm = bmesh.new()
-    for brush_index, brush in brushes.items():
-        for plane_index, plane in brush.items():
-            normal, distance = plane
-            # make base polygon
-            if abs(normal.z) != 1:
-                non_parallel = mathutils.Vector((0, 0, -1))
-            else:
-                non_parallel = mathutils.Vector((0, -1, 0))
-            local_y = mathutils.Vector.cross(non_parallel, normal).normalized()
-            local_x = mathutils.Vector.cross(local_y, normal).normalized()
-            center = normal * distance
-            radius = 10 ** 7
-            polygon = [
-                center + ((-local_x + local_y) * radius),
-                center + ((local_x + local_y) * radius),
-                center + ((local_x + -local_y) * radius),
-                center + ((-local_x + -local_y) * radius)]
-            # slice by other planes
-            for other_plane_index, other_plane in brushes[brush_index].items():
-                if other_plane_index == plane_index:
-                    continue  # skip self
-                polygon = clip(polygon, other_plane)["back"]
-            # append polygon to bmesh
-            polygon = list(map(mathutils.Vector.freeze, polygon))
-            # remove duplicate points
-            polygon = list(sorted(
-                set(polygon),
-                key=lambda vertex: polygon.index(vertex)))
-            for vertex in polygon:
-                if vertex not in vertices:
-                    vertices[vertex] = bm.verts.new(vertex)
-            if len(polygon) >= 3:
-                try:  # HACKY FIX
-                    bm.faces.new([
-                        vertices[vertex]
-                        for vertex in reversed(polygon)])
-                except ValueError:
-                    pass  # "face already exists"
-    mesh_data_name = name_of(entity)
-    mesh_data = bpy.data.meshes.new(mesh_data_name)
-    bm.to_mesh(mesh_data)
-    bm.free()
-    mesh_data.update()
-    classname = entity.get("editorclass", entity["classname"])
-    if classname not in bpy.data.materials:
-        trigger_material = bpy.data.materials.new(classname)
-        colour = palette.get(classname, (0.944, 0.048, 0.004))  # default: red
-        trigger_material.diffuse_color = (*colour, 0.25)
-        trigger_material.blend_method = "BLEND"
-    trigger_material = bpy.data.materials[classname]
-    mesh_data.materials.append(trigger_material)
-    # mesh_data has no faces?
-    return mesh_data
+def brush_hash(entity: Entity) -> str:
+    """identical brushes & material -> identical digest"""
+    digest = hashlib.sha1(editorclass_of(entity).encode("utf-8"))
+    for key in sorted(key for key in entity if key.startswith("*trigger_brush_")):
+        digest.update(f"{key} {entity[key]}\n".encode("utf-8"))
+    return digest.hexdigest()
 
 
-Plane = Tuple[mathutils.Vector, float]
-Polygon = List[mathutils.Vector]
+def trigger_brushes(entity: Entity, palette=trigger_colours) -> Mesh:
+    return trigger_meshes([entity], palette)[0]
 
 
-# adapted from Sledge by LogicAndTrick (archived)
-# https://github.com/LogicAndTrick/sledge/blob/master/Sledge.DataStructures/Geometric/Precision/Polygon.cs
-def clip(polygon: Polygon, plane: Plane) -> Dict[str, Polygon]:
-    normal, distance = plane
-    split = {"back": [], "front": []}
-    # NOTE: polygon's winding order is preserved
-    for i, A in enumerate(polygon):
-        B = polygon[(i + 1) % len(polygon)]  # next point
-        A_distance = mathutils.Vector.dot(normal, A) - distance
-        B_distance = mathutils.Vector.dot(normal, B) - distance
-        A_behind = round(A_distance, 6) < 0
-        B_behind = round(B_distance, 6) < 0
-        if A_behind:
-            split["back"].append(A)
-        else:  # A is in front of the clipping plane
-            split["front"].append(A)
-        # does the edge AB intersect the clipping plane?
-        if (A_behind and not B_behind) or (B_behind and not A_behind):
-            t = A_distance / (A_distance - B_distance)
-            cut_point = mathutils.Vector(A).lerp(mathutils.Vector(B), t)
-            split["back"].append(cut_point)
-            split["front"].append(cut_point)
-            # ^ won't one of these points be added twice?
-    return split
+def trigger_meshes(entities: List[Entity], palette=trigger_colours) -> List[Mesh]:
+    """one mesh per trigger; all brushes are decoded & solved in one batch"""
+    planes, plane_brushes, entity_brush_ranges = entity_brushes(entities)
+    vertices, vertex_brushes, loops, face_sizes, face_brushes = convex_hulls(planes, plane_brushes)
+    vertices = vertices.astype(np.float32)
+    loops = loops.astype(np.int32)
+    loop_bounds = np.concatenate([[0], np.cumsum(face_sizes)]).astype(np.int32)
+    out = list()
+    for entity, brush_range in zip(entities, entity_brush_ranges):
+        # NOTE: hulls are sorted by brush, so each trigger is a contiguous slice
+        first_vertex, end_vertex = np.searchsorted(vertex_brushes, brush_range)
+        first_face, end_face = np.searchsorted(face_brushes, brush_range)
+        first_loop, end_loop = loop_bounds[first_face], loop_bounds[end_face]
+        mesh_data = bpy.data.meshes.new(name_of(entity))
+        mesh_data.vertices.add(end_vertex - first_vertex)
+        mesh_data.vertices.foreach_set("co", vertices[first_vertex:end_vertex].ravel())
+        mesh_data.loops.add(end_loop - first_loop)
+        mesh_data.loops.foreach_set("vertex_index", loops[first_loop:end_loop] - first_vertex)
+        mesh_data.polygons.add(end_face - first_face)
+        mesh_data.polygons.foreach_set("loop_start", loop_bounds[first_face:end_face] - first_loop)
+        mesh_data.update(calc_edges=True)
+        if bounds_only(entity):
+            mesh_data["bounds_only"] = True  # bounding box of a starcoll trigger, not its volume
+        classname = entity.get("editorclass", entity["classname"])
+        if classname not in bpy.data.materials:
+            trigger_material = bpy.data.materials.new(classname)
+            colour = palette.get(classname, (0.944, 0.048, 0.004))  # default: red
+            trigger_material.diffuse_color = (*colour, 0.25)
+            trigger_material.blend_method = "BLEND"
+        trigger_material = bpy.data.materials[classname]
+        mesh_data.materials.append(trigger_material)
+        out.append(mesh_data)
+    return out
@@ -0,0 +1,110 @@
+"""re-importing a map updates its existing collection in place"""
+import json
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+import bpy
+from bpy.types import Collection, Object
+import numpy as np
+
+from .table import EntityTable, identity
+
+
+class Changes(NamedTuple):
+    kept: List[Tuple[int, int]]  # (new_row, old_index); identical
+    moved: List[Tuple[int, int]]  # (new_row, old_index); same identity, new placement
+    added: List[int]  # new_row; nothing to reuse
+    removed: List[int]  # old_index; no longer in the map
+
+
+id_collections = {
+    "MESH": "meshes",
+    "LIGHT": "lights",
+    "SPEAKER": "speakers"}
+# ^ {ID.id_type: "bpy.data attribute"}
+
+
+def match(old_fingerprints: Sequence[str], old_identities: Sequence[str],
+          new_fingerprints: Sequence[str], new_identities: Sequence[str]) -> Changes:
+    """pair each new row w/ an object from a previous import
+    fingerprint: everything that was imported; identity: everything but placement"""
+    unclaimed = dict()
+    # ^ {fingerprint: [old_index]}; popped in ascending order
+    for i in reversed(range(len(old_fingerprints))):
+        unclaimed.setdefault(old_fingerprints[i], list()).append(i)
+    kept, unmatched = list(), list()
+    for row, fingerprint in enumerate(new_fingerprints):
+        if len(unclaimed.get(fingerprint, ())) > 0:
+            kept.append((row, unclaimed[fingerprint].pop()))
+        else:
+            unmatched.append(row)
+    spare = dict()
+    # ^ {identity: [old_index]}
+    for i in sorted((i for indices in unclaimed.values() for i in indices), reverse=True):
+        spare.setdefault(old_identities[i], list()).append(i)
+    moved, added = list(), list()
+    for row in unmatched:
+        if len(spare.get(new_identities[row], ())) > 0:
+            moved.append((row, spare[new_identities[row]].pop()))
+        else:
+            added.append(row)
+    removed = sorted(i for indices in spare.values() for i in indices)
+    return Changes(kept, moved, added, removed)
+
+
+def move_objects(objects: List[Object], locations: np.ndarray,
+                 rotations: np.ndarray = None, scales: np.ndarray = None):
+    """objects[i] gets locations[i] etc."""
+    for i, blender_object in enumerate(objects):
+        blender_object.location = locations[i]
+        if rotations is not None:
+            blender_object.rotation_euler = rotations[i]
+        if scales is not None:
+            blender_object.scale = scales[i]
+
+
+def remove_objects(objects: List[Object]):
+    """delete objects & any object data only they used"""
+    object_data = {
+        blender_object.data.as_pointer(): blender_object.data
+        for blender_object in objects
+        if blender_object.data is not None}
+    for blender_object in objects:
+        bpy.data.objects.remove(blender_object)
+    for data in object_data.values():
+        if data.users == 0 and data.id_type in id_collections:
+            getattr(bpy.data, id_collections[data.id_type]).remove(data)
+
+
+def clear_collection(collection: Collection):
+    """delete everything in a collection & its children; keeps the collection itself"""
+    for child in list(collection.children):
+        clear_collection(child)
+        bpy.data.collections.remove(child)
+    remove_objects(list(collection.objects))
+
+
+def existing_objects(collection: Collection, key: str) -> Dict[int, List[Object]]:
+    """{blender_object[key]: [blender_object]} for objects w/ that custom property"""
+    out = dict()
+    for blender_object in collection.objects:
+        if key in blender_object:
+            out.setdefault(blender_object[key], list()).append(blender_object)
+    return out
+
+
+def update_entities(table: EntityTable, rows: List[int], objects: List[Object],
+                    rotations: bool = True) -> List[int]:
+    """move & remove objects w/ "keyvalues" from a previous import -> rows still to be made"""
+    old_keyvalues = [blender_object["keyvalues"] for blender_object in objects]
+    changes = match(
+        old_keyvalues, [identity(json.loads(keyvalues)) for keyvalues in old_keyvalues],
+        [table.keyvalues(row) for row in rows], [table.identity(row) for row in rows])
+    moved_rows = [rows[row] for row, i in changes.moved]
+    moved = [objects[i] for row, i in changes.moved]
+    move_objects(
+        moved, table.origins[moved_rows],
+        table.rotations[moved_rows] if rotations else None)
+    for blender_object, row in zip(moved, moved_rows):
+        blender_object["keyvalues"] = table.keyvalues(row)
+    remove_objects([objects[i] for i in changes.removed])
+    return [rows[row] for row in changes.added]
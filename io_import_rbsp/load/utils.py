@@ -1,11 +1,123 @@
-from typing import Any
+from __future__ import annotations
+from typing import Any, Generator, List, Set
 
-from bpy.types import Collection
+import bpy
+from bpy.types import Collection, Object
+import numpy as np
 
 
-def change_collection(blender_object: Any, collection: Collection):
-    # move to entity_collection
-    linked_collections = blender_object.users_collection
-    for collection in linked_collections:
-        collection.objects.unlink(blender_object)
-    collection.objects.link(blender_object)
+Steps = Generator[float, None, Any]
+# ^ yields fraction done (0-1) between chunks of work; returns a result
+
+
+def run(steps: Steps) -> Any:
+    """do all the work of steps at once"""
+    while True:
+        try:
+            next(steps)
+        except StopIteration as stop:
+            return stop.value
+
+
+def scaled(steps: Steps, start: float, end: float) -> Steps:
+    """yield from steps w/ progress mapped onto start-end; returns steps' result"""
+    try:
+        while True:
+            try:
+                fraction = next(steps)
+            except StopIteration as stop:
+                return stop.value
+            yield start + (end - start) * fraction
+    finally:
+        steps.close()  # if we were closed early
+
+
+cleanup_types = (
+    "objects", "meshes", "lights", "speakers", "materials", "images", "node_groups", "collections")
+# ^ bpy.data collections an import adds to
+
+
+def session_uids() -> Set[int]:
+    """every datablock an import might make, before it starts"""
+    return {
+        datablock.session_uid
+        for name in cleanup_types
+        for datablock in getattr(bpy.data, name)}
+
+
+def remove_new_datablocks(before: Set[int]) -> int:
+    """undo a partial import; -> how many datablocks were removed"""
+    new = [
+        datablock
+        for name in cleanup_types
+        for datablock in getattr(bpy.data, name)
+        if datablock.session_uid not in before]
+    bpy.data.batch_remove(new)
+    return len(new)
+
+
+def set_transforms(collection: Collection, first: int, locations: np.ndarray,
+                   rotations: np.ndarray = None, scales: np.ndarray = None):
+    """bulk location, rotation_euler & scale for collection.objects[first:]
+    NOTE: collection.objects is in the order objects were linked"""
+    objects = collection.objects
+    attributes = {"location": locations, "rotation_euler": rotations, "scale": scales}
+    for attribute, values in attributes.items():
+        if values is None:
+            continue
+        buffer = np.empty(len(objects) * 3, dtype=np.float32)
+        objects.foreach_get(attribute, buffer)
+        buffer[first * 3:] = values.ravel()
+        objects.foreach_set(attribute, buffer)
+
+
+class ObjectBatch:
+    """make many objects, then link each to collection exactly once
+
+    with ObjectBatch(collection) as batch:
+        for ...:
+            batch.new(name, object_data)
+        batch.locations = ...  # float (len(batch), 3); same for rotations & scales
+    # ^ linked & transformed in bulk on exit; removed if an exception is raised"""
+    collection: Collection
+    objects: List[Object]
+    locations: np.ndarray  # None leaves the default
+    rotations: np.ndarray  # XYZ euler radians
+    scales: np.ndarray
+
+    def __init__(self, collection: Collection):
+        self.collection = collection
+        self.objects = list()
+        self.locations = None
+        self.rotations = None
+        self.scales = None
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} {len(self)} objects -> {self.collection.name!r}>"
+
+    def __len__(self) -> int:
+        return len(self.objects)
+
+    def __enter__(self) -> ObjectBatch:
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.link()
+        else:  # don't leave orphans behind
+            for blender_object in self.objects:
+                bpy.data.objects.remove(blender_object)
+            self.objects = list()
+
+    def new(self, name: str, object_data=None) -> Object:
+        blender_object = bpy.data.objects.new(name, object_data)
+        self.objects.append(blender_object)
+        return blender_object
+
+    def link(self):
+        # NOTE: depsgraph relations are only tagged here; nothing is evaluated until we return
+        first = len(self.collection.objects)
+        link = self.collection.objects.link
+        for blender_object in self.objects:
+            link(blender_object)
+        set_transforms(self.collection, first, self.locations, self.rotations, self.scales)
@@ -1,6 +1,9 @@
 import bpy
 from bpy.props import StringProperty
 
+from .load import cache
+from .load.materials import images
+
 
 class Preferences(bpy.types.PropertyGroup):
     rsx_folder: StringProperty(
@@ -11,6 +14,52 @@ class Preferences(bpy.types.PropertyGroup):
     # -- need command line extraction tools
 
 
+def mdl_cache_folder() -> str:
+    return bpy.utils.extension_path_user(__package__, path="mdl_cache", create=True)
+
+
+class ReportMDLCache(bpy.types.Operator):
+    """Report how many converted .mdl files are cached"""
+    bl_idname = "io_import_rbsp.mdl_cache_report"
+    bl_label = "Report .mdl Cache"
+
+    def execute(self, context):
+        num_files, num_bytes = cache.stats(mdl_cache_folder())
+        self.report(
+            {"INFO"}, f"{num_files} cached .mdl files ({num_bytes / 2 ** 20:.1f} MiB)")
+        return {"FINISHED"}
+
+
+class ClearMDLCache(bpy.types.Operator):
+    """Delete all converted .mdl files from the cache"""
+    bl_idname = "io_import_rbsp.mdl_cache_clear"
+    bl_label = "Clear .mdl Cache"
+
+    def execute(self, context):
+        num_files = cache.clear(mdl_cache_folder())
+        self.report({"INFO"}, f"deleted {num_files} cached .mdl files")
+        return {"FINISHED"}
+
+
+class FullResolutionTextures(bpy.types.Operator):
+    """Reload textures of the selected objects' materials at full resolution"""
+    bl_idname = "io_import_rbsp.full_resolution_textures"
+    bl_label = "Full Resolution Textures"
+    bl_options = {"REGISTER", "UNDO"}
+
+    def execute(self, context):
+        textures = {
+            node.image.as_pointer(): node.image
+            for blender_object in context.selected_objects
+            for slot in blender_object.material_slots
+            if slot.material is not None and slot.material.node_tree is not None
+            for node in slot.material.node_tree.nodes
+            if node.type == "TEX_IMAGE" and node.image is not None}
+        num_upgraded = sum(images.upgrade(texture) for texture in textures.values())
+        self.report({"INFO"}, f"{num_upgraded} textures reloaded at full resolution")
+        return {"FINISHED"}
+
+
 class SCENE_PT_ReSourceAssetFolders(bpy.types.Panel):
     """Creates a Panel in the scene context of the properties editor"""
     bl_label = "Titanfall Engine Assets"
@@ -23,10 +72,17 @@ class SCENE_PT_ReSourceAssetFolders(bpy.types.Panel):
         layout = self.layout
         layout.prop(context.scene.rbsp_prefs, "rsx_folder")
         layout.prop(context.scene.rbsp_prefs, "vpk_folder")
+        row = layout.row()
+        row.operator(ReportMDLCache.bl_idname)
+        row.operator(ClearMDLCache.bl_idname)
+        layout.operator(FullResolutionTextures.bl_idname)
 
 
 classes = (
     Preferences,
+    ReportMDLCache,
+    ClearMDLCache,
+    FullResolutionTextures,
     SCENE_PT_ReSourceAssetFolders)
 
 